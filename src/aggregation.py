@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+from instrumentation import stage
+from result_cache import memoize
+
+NUMERIC_COLUMNS = ['prof_depth', 'mass', 'wted_temp', 'density', 'swe']
+STATISTICS = ['mean', 'median', 'count', 'std', 'min', 'max']
+GROUPINGS = ['year', 'month', 'samp_loc']
+DATE_PARTS = ['year', 'month', 'water_year', 'day_of_water_year']
+# Day numbers in compact frames (see compact.compact_frame) count from here.
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+def date_values(df):
+    '''
+    Sample dates of df as datetime64, from its date column or, for compact
+    frames, its int32 day numbers.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe, compact frame or a SampleSite df)
+
+    Returns
+    -------
+    pandas Series aligned with df
+    '''
+    if 'date' in df.columns:
+        return df['date']
+    days = df['day'].to_numpy().astype('timedelta64[D]')
+    return pd.Series((EPOCH + days).astype('datetime64[ns]'), index=df.index, name='date')
+
+def date_part(df, part):
+    '''
+    Year, month, water year (October through September, named for the
+    year it ends in) or day of the water year (0 on October 1st) of every
+    row, read from the cached column when df has one.
+
+    Parameters
+    ----------
+    df: dataframe
+    part: str
+        'year', 'month', 'water_year' or 'day_of_water_year'.
+
+    Returns
+    -------
+    pandas Series aligned with df, named part
+    '''
+    if part in df.columns:
+        return df[part]
+    dates = date_values(df).dt
+    if part == 'year':
+        return dates.year.rename('year')
+    if part == 'month':
+        return dates.month.rename('month')
+    if part == 'water_year':
+        return (dates.year + (dates.month >= 10)).rename('water_year')
+    if part == 'day_of_water_year':
+        water_year = date_part(df, 'water_year').to_numpy().astype(np.int64)
+        october = (water_year - 1971).astype('datetime64[Y]').astype('datetime64[M]') + 9
+        days = date_values(df).to_numpy().astype('datetime64[D]') - october.astype('datetime64[D]')
+        return pd.Series(days.astype(np.int64), index=df.index, name='day_of_water_year')
+    raise ValueError('part must be one of {}, got {!r}'.format(DATE_PARTS, part))
+
+def _group_key(df, by):
+    '''
+    Build the second grouping key (year, month or sample location) for df.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    by: str
+        One of 'year', 'month', 'water_year' or 'samp_loc'.
+
+    Returns
+    -------
+    pandas Series aligned with df
+    '''
+    if by in DATE_PARTS:
+        return date_part(df, by)
+    if by == 'samp_loc':
+        return df['samp_loc']
+    raise ValueError('by must be one of {}, got {!r}'.format(GROUPINGS, by))
+
+@memoize
+@stage()
+def aggregate(df, by='year', columns=('swe',), stats=STATISTICS, site_col='local_site'):
+    '''
+    Compute summary statistics of numeric columns by site x year, site x month
+    or site x sample location in a single groupby pass.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe or a SampleSite df)
+    by: str
+        'year', 'month', 'water_year' or 'samp_loc'.
+    columns: list of str
+        Numeric columns to summarize.
+    stats: list of str
+        Any of 'mean', 'median', 'count', 'std', 'min', 'max'.
+    site_col: str or None
+        Column holding the site name, None to pool all sites together.
+
+    Returns
+    -------
+    Tidy dataframe with one row per group and one '<column>_<stat>' column
+    per summary, e.g. swe_mean, swe_count.
+    '''
+    keys = [_group_key(df, by)]
+    if site_col is not None:
+        keys.insert(0, df[site_col])
+    # observed=True keeps categorical keys (compact frames) from producing
+    # every unobserved site/location combination.
+    out = df.groupby(keys, sort=True, observed=True)[list(columns)].agg(list(stats))
+    out.columns = ['{}_{}'.format(col, stat) for col, stat in out.columns]
+    return out.reset_index()
+
+def year_range(df, part='year'):
+    '''
+    Years spanned by the data, first through last sample year inclusive.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    part: str
+        'year' or 'water_year'.
+
+    Returns
+    -------
+    numpy array of ints
+    '''
+    years = date_part(df, part)
+    if len(years) == 0:
+        return np.array([], dtype=int)
+    return np.arange(years.min(), years.max() + 1)
+
+@memoize
+@stage()
+def aggregate_matrix(df, by='year', column='swe', stat='mean', site_col='local_site', keys=None):
+    '''
+    Pivot one summary statistic into a site x key matrix.
+
+    Years missing from a site (or months, for by='month') are filled with NaN
+    so every site shares the same columns.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    by: str
+        'year', 'month', 'water_year' or 'samp_loc'.
+    column: str
+        Numeric column to summarize.
+    stat: str
+        Statistic to pivot.
+    site_col: str
+        Column holding the site name.
+    keys: array-like or None
+        Column labels to reindex to. Defaults to the data's year range for
+        by='year' or 'water_year' and 1-12 for by='month'.
+
+    Returns
+    -------
+    pandas DataFrame indexed by site
+    '''
+    tidy = aggregate(df, by=by, columns=[column], stats=[stat], site_col=site_col)
+    matrix = tidy.pivot(index=site_col, columns=by, values='{}_{}'.format(column, stat))
+    if isinstance(matrix.index, pd.CategoricalIndex):
+        matrix.index = matrix.index.astype(object)
+    if keys is None:
+        if by in ('year', 'water_year'):
+            keys = year_range(df, by)
+        elif by == 'month':
+            keys = np.arange(1, 13)
+    if keys is not None:
+        matrix = matrix.reindex(columns=keys)
+    return matrix
+
+@memoize
+@stage()
+def mean_series(df, by='year', column='swe', keys=None):
+    '''
+    Mean of a column for every year (or month) of df, pooled over all sites.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe or a SampleSite df)
+    by: str
+        'year', 'month' or 'water_year'.
+    column: str
+        Numeric column to average.
+    keys: array-like or None
+        Index to reindex to, defaults to the data's year range or 1-12.
+
+    Returns
+    -------
+    pandas Series indexed by year or month, NaN where there are no samples
+    '''
+    tidy = aggregate(df, by=by, columns=[column], stats=['mean'], site_col=None)
+    series = tidy.set_index(by)['{}_mean'.format(column)]
+    if keys is None:
+        keys = np.arange(1, 13) if by == 'month' else year_range(df, by)
+    return series.reindex(keys)
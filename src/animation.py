@@ -0,0 +1,245 @@
+import io
+import os
+import struct
+import numpy as np
+import imageio
+from PIL import Image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib.pyplot as plt
+from instrumentation import stage
+
+# imageio 2.16+ keeps the old reading API under imageio.v2.
+_imread = getattr(imageio, 'v2', imageio).imread
+
+def read_image(path):
+    '''
+    Read an image file into a numpy array, e.g. a map background.
+    '''
+    return _imread(path)
+
+def figure_to_array(fig, dpi=None):
+    '''
+    Render a matplotlib figure to an RGB array in memory, no PNG round trip.
+
+    Parameters
+    ----------
+    fig: matplotlib figure
+    dpi: int or None
+        Defaults to the figure's own dpi.
+
+    Returns
+    -------
+    uint8 numpy array, shape (height, width, 3)
+    '''
+    if dpi is not None:
+        fig.set_dpi(dpi)
+    canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+def frame_array(frame, dpi=None, close_figures=True):
+    '''
+    One animation frame as an RGB(A) array.
+
+    Parameters
+    ----------
+    frame: str, numpy array or matplotlib figure
+        Image file path, image array or a figure to render.
+    dpi: int or None
+        Render dpi for figures.
+    close_figures: bool
+        Close figures once rendered so pyplot doesn't keep them alive.
+
+    Returns
+    -------
+    numpy array
+    '''
+    if isinstance(frame, (str, os.PathLike)):
+        return read_image(frame)
+    if isinstance(frame, Figure):
+        array = figure_to_array(frame, dpi)
+        if close_figures:
+            plt.close(frame)
+        return array
+    return np.asarray(frame)
+
+def _gif_parts(data):
+    '''
+    Split a single frame GIF (as Pillow writes it) into its size, color
+    table, color table size bits, interlace flag and LZW image data.
+    '''
+    width, height, packed = struct.unpack('<HHB', data[6:11])
+    pos = 13
+    palette, bits = b'', packed & 7
+    if packed & 0x80:
+        palette = data[pos:pos + 3 * 2 ** (bits + 1)]
+        pos += len(palette)
+    while data[pos] == 0x21:
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    if data[pos] != 0x2C:
+        raise ValueError('unexpected GIF block {:#x}'.format(data[pos]))
+    image_packed = data[pos + 9]
+    pos += 10
+    if image_packed & 0x80:
+        bits = image_packed & 7
+        palette = data[pos:pos + 3 * 2 ** (bits + 1)]
+        pos += len(palette)
+    return (width, height), palette, bits, image_packed & 0x40, data[pos:-1]
+
+class _GifStream(object):
+    '''
+    Minimal GIF89a writer that encodes and writes each frame as it arrives.
+
+    Each frame is quantized by Pillow on its own and stored with a local
+    color table, so nothing about earlier frames is kept in memory.
+    '''
+    def __init__(self, path, duration, loop):
+        self.fp = open(path, 'wb')
+        self.duration = duration
+        self.loop = loop
+        self.size = None
+        self.count = 0
+
+    def append_data(self, array):
+        image = Image.fromarray(np.ascontiguousarray(array)).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format='GIF', interlace=False)
+        size, palette, bits, interlace, data = _gif_parts(buffer.getvalue())
+        if self.size is None:
+            self.size = size
+            self.fp.write(b'GIF89a' + struct.pack('<HHBBB', size[0], size[1], 0, 0, 0))
+            if self.loop is not None:
+                self.fp.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', self.loop) + b'\x00')
+        elif size != self.size:
+            raise ValueError('frame {} is {}x{}, the animation is {}x{}'.format(self.count, size[0], size[1],
+                                                                                self.size[0], self.size[1]))
+        duration = self.duration
+        if isinstance(duration, (list, tuple)):
+            duration = duration[min(self.count, len(duration) - 1)]
+        delay = int(round(duration * 100))
+        self.fp.write(b'\x21\xf9\x04\x04' + struct.pack('<H', delay) + b'\x00\x00')
+        self.fp.write(b'\x2c' + struct.pack('<HHHHB', 0, 0, size[0], size[1], 0x80 | interlace | bits))
+        self.fp.write(palette)
+        self.fp.write(data)
+        self.count += 1
+
+    def close(self):
+        if not self.fp.closed:
+            self.fp.write(b'\x3b')
+            self.fp.close()
+
+class AnimationWriter(object):
+    '''
+    Write frames to a GIF (or any format imageio can stream, e.g. .mp4 with
+    imageio-ffmpeg) one at a time, so memory stays at one frame however long
+    the animation is.
+
+    Use as a context manager:
+
+        with AnimationWriter('season.gif', duration=0.5) as writer:
+            for fig in figures:
+                writer.append(fig)
+    '''
+    def __init__(self, path, duration=0.5, loop=0, fps=None, dpi=None, close_figures=True):
+        '''
+        Parameters
+        ----------
+        path: str
+        duration: float or list of float
+            Seconds each frame is shown (GIF), a list gives per-frame delays.
+        loop: int or None
+            GIF loop count, 0 loops forever and None plays once.
+        fps: float or None
+            Frame rate for video formats, defaults to 1 / duration.
+        dpi: int or None
+            Render dpi for figure frames.
+        close_figures: bool
+        '''
+        self.path = path
+        self.dpi = dpi
+        self.close_figures = close_figures
+        self.frames = 0
+        if os.path.splitext(path)[1].lower() == '.gif':
+            # imageio's pillow GIF plugin holds every frame until close.
+            self._writer = _GifStream(path, duration, loop)
+        else:
+            if fps is None:
+                first = duration[0] if isinstance(duration, (list, tuple)) else duration
+                fps = 1.0 / first
+            self._writer = imageio.get_writer(path, mode='I', fps=fps)
+
+    def append(self, frame):
+        '''
+        Add one frame, see frame_array for accepted types.
+        '''
+        self._writer.append_data(frame_array(frame, self.dpi, self.close_figures))
+        self.frames += 1
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@stage(rows=lambda count, args, kwargs: count)
+def write_animation(frames, path, duration=0.5, loop=0, fps=None, dpi=None, close_figures=True):
+    '''
+    Stream an iterable of frames into an animation.
+
+    frames may be a generator, e.g. one that builds a figure per season, so
+    only the frame being written is ever in memory.
+
+    Parameters
+    ----------
+    frames: iterable of paths, arrays or matplotlib figures
+    path: str
+    duration, loop, fps, dpi, close_figures:
+        See AnimationWriter.
+
+    Returns
+    -------
+    Number of frames written
+    '''
+    with AnimationWriter(path, duration, loop, fps, dpi, close_figures) as writer:
+        for frame in frames:
+            writer.append(frame)
+    return writer.frames
+
+def season_frames(df, column='swe', stat='mean', figsize=(10, 6)):
+    '''
+    One bar chart figure per water year of each site's mean (or other
+    statistic) SWE, on shared axes so the frames animate cleanly. Figures
+    are made lazily, one per iteration.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    column: str
+    stat: str
+    figsize: (float, float)
+
+    Returns
+    -------
+    Generator of matplotlib figures
+    '''
+    from aggregation import aggregate_matrix
+    matrix = aggregate_matrix(df, by='water_year', column=column, stat=stat)
+    top = np.nanmax(matrix.to_numpy()) * 1.1 if matrix.size else 1.0
+    sites = list(matrix.index)
+    for water_year in matrix.columns:
+        fig = Figure(figsize=figsize)
+        ax = fig.subplots()
+        ax.bar(sites, matrix[water_year].fillna(0.0).to_numpy(), color='#3489eb')
+        ax.set_ylim(0, top)
+        ax.set_title('{} {} - water year {}'.format(stat.title(), column.upper(), water_year), fontsize=18)
+        ax.set_ylabel('SWE (m)', fontsize=14)
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout(pad=1)
+        yield fig
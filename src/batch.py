@@ -0,0 +1,143 @@
+import argparse
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+def expand_inputs(inputs):
+    '''
+    Resolve directories and glob patterns to a sorted list of csv files.
+
+    Parameters
+    ----------
+    inputs: list of str
+        Files, directories (every *.csv inside, recursively) or glob patterns.
+
+    Returns
+    -------
+    list of str
+    '''
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, '**', '*.csv'), recursive=True))
+        elif any(c in item for c in '*?['):
+            paths.update(glob.glob(item, recursive=True))
+        else:
+            paths.add(item)
+    return sorted(os.path.abspath(p) for p in paths)
+
+def dataset_names(paths):
+    '''
+    Short unique names for output folders, the file stem prefixed with its
+    parent folder when two inputs share a stem.
+    '''
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    names = []
+    for path, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            stem = '{}__{}'.format(os.path.basename(os.path.dirname(path)), stem)
+        names.append(stem)
+    return names
+
+def run_dataset(path, out_dir, name):
+    '''
+    Clean, partition, aggregate and fit trends for one csv, writing
+    yearly.csv, monthly.csv and trends.csv under out_dir/name.
+
+    Any exception is caught and reported in the returned status so one bad
+    file doesn't stop the batch.
+
+    Parameters
+    ----------
+    path: str
+    out_dir: str
+    name: str
+
+    Returns
+    -------
+    Dictionary describing the run
+    '''
+    from data_cleaning import clean_swe_df, create_object_list, get_site_summaries
+    from trends import site_trends
+
+    start = time.time()
+    status = {'dataset': name, 'path': path, 'status': 'ok', 'rows': 0, 'sites': 0,
+              'seconds': 0.0, 'error': ''}
+    try:
+        df = clean_swe_df(path)
+        sites = create_object_list(df)
+        target = os.path.join(out_dir, name)
+        os.makedirs(target, exist_ok=True)
+        get_site_summaries(df, by='year').to_csv(os.path.join(target, 'yearly.csv'), index=False)
+        get_site_summaries(df, by='month').to_csv(os.path.join(target, 'monthly.csv'), index=False)
+        site_trends(df).to_csv(os.path.join(target, 'trends.csv'))
+        status['rows'] = len(df)
+        status['sites'] = len(sites)
+    except Exception:
+        status['status'] = 'error'
+        status['error'] = traceback.format_exc()
+    status['seconds'] = round(time.time() - start, 3)
+    return status
+
+def run_batch(inputs, out_dir, workers=None):
+    '''
+    Run run_dataset over many csvs in a process pool and merge the results.
+
+    Writes out_dir/summary.csv (one row per input with its status) and
+    out_dir/trends_all.csv (every successful dataset's trend table).
+
+    Parameters
+    ----------
+    inputs: list of str
+        Files, directories or glob patterns, see expand_inputs.
+    out_dir: str
+    workers: int or None
+        Process count, defaults to os.cpu_count().
+
+    Returns
+    -------
+    Summary dataframe
+    '''
+    paths = expand_inputs(inputs)
+    names = dataset_names(paths)
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    if paths:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_dataset, p, out_dir, n): (p, n) for p, n in zip(paths, names)}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception:
+                    # The worker itself died, e.g. killed for running out of memory.
+                    path, name = futures[future]
+                    results.append({'dataset': name, 'path': path, 'status': 'error', 'rows': 0,
+                                    'sites': 0, 'seconds': 0.0, 'error': traceback.format_exc()})
+    summary = pd.DataFrame(results, columns=['dataset', 'path', 'status', 'rows', 'sites', 'seconds', 'error'])
+    summary = summary.sort_values('dataset').reset_index(drop=True)
+    summary.to_csv(os.path.join(out_dir, 'summary.csv'), index=False)
+
+    trends = []
+    for name in summary.loc[summary['status'] == 'ok', 'dataset']:
+        table = pd.read_csv(os.path.join(out_dir, name, 'trends.csv'))
+        table.insert(0, 'dataset', name)
+        trends.append(table)
+    if trends:
+        pd.concat(trends, ignore_index=True).to_csv(os.path.join(out_dir, 'trends_all.csv'), index=False)
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the SWE analysis over many snow survey csvs.')
+    parser.add_argument('inputs', nargs='+', help='csv files, directories or glob patterns')
+    parser.add_argument('--out', default='batch_results')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    summary = run_batch(args.inputs, args.out, args.workers)
+    print(summary.drop(columns=['path', 'error']).to_string(index=False))
+    failed = summary[summary['status'] != 'ok']
+    for _, row in failed.iterrows():
+        print('\n{} failed:\n{}'.format(row['dataset'], row['error']))
@@ -0,0 +1,171 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import data_cleaning
+from aggregation import aggregate, NUMERIC_COLUMNS
+from synthetic_data import write_swe_csv
+from trends import site_trends
+
+DEFAULT_SIZES = [2000, 20000, 200000, 2000000]
+# Results of `python src/benchmark.py --out benchmarks/baseline.json` at the
+# default sizes. Regenerate it on the machine you compare on after an
+# intended speed change; timings from other hardware only line up roughly.
+BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'baseline.json')
+
+def _render(fig):
+    fig.savefig(io.BytesIO(), format='png', dpi=80)
+    plt.close(fig)
+
+def pipeline_stages(csv_path):
+    '''
+    The benchmarked pipeline stages, in order. Each stage is a
+    (name, function) pair where function takes the previous stages' outputs
+    and returns a value for later stages.
+
+    Parameters
+    ----------
+    csv_path: str
+
+    Returns
+    -------
+    list of (str, callable)
+    '''
+    return [
+        ('clean_swe_df', lambda s: data_cleaning.clean_swe_df(csv_path)),
+        ('create_object_list', lambda s: data_cleaning.create_object_list(s['clean_swe_df'])),
+        ('yearly_mean_swe', lambda s: [o.yearly_mean_swe() for o in s['create_object_list']]),
+        ('monthly_mean_swe', lambda s: [o.monthly_mean_swe() for o in s['create_object_list']]),
+        ('aggregate_site_year', lambda s: aggregate(s['clean_swe_df'], by='year', columns=NUMERIC_COLUMNS)),
+        ('site_trends', lambda s: site_trends(s['clean_swe_df'])),
+        ('plot_yearly_mean_swe', lambda s: _render(data_cleaning.plot_yearly_mean_swe(s['yearly_mean_swe']))),
+        ('plot_monthly_mean_swe', lambda s: _render(data_cleaning.plot_monthly_mean_swe(s['monthly_mean_swe']))),
+        ('plot_all_sites', lambda s: _render(data_cleaning.plot_all_sites(
+            s['create_object_list'], [o.site_name for o in s['create_object_list']]))),
+        ('plot_all_sites_budget', lambda s: _render(data_cleaning.plot_all_sites(
+            s['create_object_list'], [o.site_name for o in s['create_object_list']], max_points=2000))),
+    ]
+
+def _run_stages(stages, measure_memory):
+    outputs = {}
+    timings = {}
+    for name, func in stages:
+        if measure_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        outputs[name] = func(outputs)
+        elapsed = time.perf_counter() - start
+        if measure_memory:
+            timings[name] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+        else:
+            timings[name] = elapsed
+    return timings
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeats=3, memory=True, skip=(), workdir=None, seed=0):
+    '''
+    Time (best of repeats) and memory-profile every pipeline stage on
+    synthetic data of each size.
+
+    Peak memory comes from a separate tracemalloc pass so tracing doesn't
+    inflate the timings.
+
+    Parameters
+    ----------
+    sizes: list of int
+        Row counts of the generated csvs.
+    repeats: int
+    memory: bool
+        Also record peak traced memory per stage.
+    skip: list of str
+        Stage names to leave out, e.g. plot_all_sites at large sizes.
+    workdir: str or None
+        Where to write the synthetic csvs, a temporary folder by default.
+    seed: int
+
+    Returns
+    -------
+    List of result dictionaries with stage, rows, seconds, peak_mb
+    '''
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for n_rows in sizes:
+            path = os.path.join(tmp, 'synthetic_{}.csv'.format(n_rows))
+            write_swe_csv(path, n_rows=n_rows, seed=seed)
+            stages = [(name, func) for name, func in pipeline_stages(path) if name not in skip]
+            runs = [_run_stages(stages, False) for _ in range(repeats)]
+            peaks = _run_stages(stages, True) if memory else {}
+            for name, _ in stages:
+                results.append({'stage': name, 'rows': n_rows,
+                                'seconds': min(run[name] for run in runs),
+                                'peak_mb': peaks.get(name)})
+    return results
+
+def environment():
+    return {'python': sys.version.split()[0], 'numpy': np.__version__, 'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__, 'machine': platform.machine(), 'system': platform.system(),
+            'cpus': os.cpu_count(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.01):
+    '''
+    Stages that got slower than the baseline by more than tolerance.
+
+    Parameters
+    ----------
+    results: list of dict (run_benchmarks output)
+    baseline: list of dict
+    tolerance: float
+        Allowed fractional slowdown.
+    min_seconds: float
+        Ignore differences smaller than this, timer noise on tiny inputs.
+
+    Returns
+    -------
+    List of dictionaries with stage, rows, baseline, seconds, ratio
+    '''
+    base = {(r['stage'], r['rows']): r['seconds'] for r in baseline}
+    regressions = []
+    for r in results:
+        before = base.get((r['stage'], r['rows']))
+        if before is None:
+            continue
+        if r['seconds'] > before * (1 + tolerance) and r['seconds'] - before > min_seconds:
+            regressions.append({'stage': r['stage'], 'rows': r['rows'], 'baseline': before,
+                                'seconds': r['seconds'], 'ratio': r['seconds'] / before})
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the SWE pipeline on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--skip', nargs='*', default=[])
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', nargs='?', const=BASELINE, default=None,
+                        help='compare against this results file, benchmarks/baseline.json when no path is given')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.repeats, not args.no_memory, args.skip)
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=1)
+    for r in results:
+        peak = '' if r['peak_mb'] is None else '{:10.1f} MB'.format(r['peak_mb'])
+        print('{:24} {:>10} {:10.4f} s {}'.format(r['stage'], r['rows'], r['seconds'], peak))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for r in regressions:
+            print('REGRESSION {stage} at {rows} rows: {baseline:.4f} s -> {seconds:.4f} s ({ratio:.2f}x)'.format(**r))
+        sys.exit(1 if regressions else 0)
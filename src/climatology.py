@@ -0,0 +1,285 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from aggregation import aggregate, date_part
+
+N_DAYS = 366
+QUANTILES = np.linspace(0.0, 1.0, 21)
+
+def _grid_percentile(values, grids, probs):
+    '''
+    Percentile (0-100) of each value within its own row of quantile grids,
+    by linear interpolation between grid points. Constant work per value
+    for a fixed grid size.
+
+    Parameters
+    ----------
+    values: array, shape (n,)
+    grids: array, shape (n, k), non-decreasing along each row
+    probs: array, shape (k,)
+
+    Returns
+    -------
+    array of floats, NaN where the value or the grid is missing
+    '''
+    k = len(probs)
+    with np.errstate(invalid='ignore'):
+        pos = (grids <= values[:, None]).sum(axis=1)
+    hi = np.clip(pos, 1, k - 1)
+    lo = hi - 1
+    rows = np.arange(len(values))
+    g_lo, g_hi = grids[rows, lo], grids[rows, hi]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(g_hi > g_lo, (values - g_lo) / (g_hi - g_lo), 0.5)
+    pct = 100.0 * (probs[lo] + np.clip(frac, 0.0, 1.0) * (probs[hi] - probs[lo]))
+    pct = np.where(values < grids[:, 0], 0.0, np.where(values > grids[:, -1], 100.0, pct))
+    missing = np.isnan(values) | np.isnan(grids[:, 0])
+    return np.where(missing, np.nan, pct)
+
+def _lookup(array, known, cells):
+    '''
+    array[cells] for the known rows, NaN for the rest.
+    '''
+    out = np.full((len(known),) + array.shape[len(cells):], np.nan)
+    out[known] = array[cells]
+    return out
+
+def _window_stats(doy, values, window, probs, min_count):
+    '''
+    mean/std/count and quantiles of values within +-window days of each
+    day of the water year, for one site's observations.
+    '''
+    order = np.argsort(doy, kind='stable')
+    doy, values = doy[order], values[order]
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    csq = np.concatenate([[0.0], np.cumsum(values ** 2)])
+    days = np.arange(N_DAYS)
+    lo = np.searchsorted(doy, days - window, side='left')
+    hi = np.searchsorted(doy, days + window, side='right')
+    count = hi - lo
+    safe = np.maximum(count, 1)
+    mean = (csum[hi] - csum[lo]) / safe
+    var = (csq[hi] - csq[lo] - safe * mean ** 2) / np.maximum(count - 1, 1)
+    std = np.sqrt(np.maximum(var, 0.0))
+    quantiles = np.full((N_DAYS, len(probs)), np.nan)
+    for d in np.flatnonzero(count >= min_count):
+        quantiles[d] = np.quantile(values[lo[d]:hi[d]], probs)
+    thin = count < min_count
+    mean[thin] = np.nan
+    std[thin] = np.nan
+    return mean, std, count, quantiles
+
+class Climatology(object):
+    '''
+    Per-site baselines of one measurement over a reference period, by water
+    year (season statistic) and by day of the water year (pooled over a
+    window of days), stored as arrays.
+
+    Building scans the history once. Scoring a row or season afterwards is
+    an array lookup plus a search over a fixed quantile grid, so "how does
+    this year compare" never rescans the archive.
+
+    Day baselines have shape (sites, 366) and day quantiles
+    (sites, 366, len(quantiles)); season baselines have shape (sites,) and
+    (sites, len(quantiles)).
+    '''
+    def __init__(self, sites, params, day, season):
+        self.sites = list(sites)
+        self.params = params
+        self.day = day
+        self.season = season
+        self.probs = np.asarray(params['quantiles'], dtype=float)
+        self._site_index = pd.Index(self.sites)
+
+    def __repr__(self):
+        return 'Climatology(column={!r}, sites={}, reference={})'.format(
+            self.params['column'], len(self.sites), self.params['reference'])
+
+    @classmethod
+    def build(cls, df, column='swe', reference=None, window=15, quantiles=QUANTILES, season_stat='mean',
+              min_count=5, site_col='local_site'):
+        '''
+        Compute baselines from a cleaned frame (csv or compact layout).
+
+        Parameters
+        ----------
+        df: dataframe (cleaned df_swe)
+        column: str
+        reference: (int, int) or None
+            First and last water year of the reference period, inclusive.
+            Defaults to every water year in df.
+        window: int
+            Days either side pooled into each day-of-water-year baseline.
+            Surveys are weeks apart, so single days are too sparse alone.
+        quantiles: array-like of floats in [0, 1]
+            Quantile grid stored per baseline. Percentiles are interpolated
+            on it, so a finer grid gives smoother scores.
+        season_stat: str
+            Statistic summarizing each site's water year, 'mean' or 'max'.
+        min_count: int
+            Baselines with fewer observations (days) or seasons are NaN.
+        site_col: str
+
+        Returns
+        -------
+        Climatology
+        '''
+        probs = np.asarray(quantiles, dtype=float)
+        water_year = date_part(df, 'water_year').to_numpy()
+        keep = df[site_col].notna().to_numpy() & df[column].notna().to_numpy()
+        if reference is not None:
+            keep &= (water_year >= reference[0]) & (water_year <= reference[1])
+        ref = df[keep]
+        reference = [int(water_year[keep].min()), int(water_year[keep].max())] if len(ref) else [None, None]
+
+        codes, sites = pd.factorize(ref[site_col], sort=True)
+        sites = list(sites)
+        doy = date_part(ref, 'day_of_water_year').to_numpy()
+        values = ref[column].to_numpy(dtype=float)
+        n = len(sites)
+        day = {'mean': np.full((n, N_DAYS), np.nan), 'std': np.full((n, N_DAYS), np.nan),
+               'count': np.zeros((n, N_DAYS), dtype=np.int64),
+               'quantiles': np.full((n, N_DAYS, len(probs)), np.nan)}
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(n + 1))
+        for i in range(n):
+            rows = order[bounds[i]:bounds[i + 1]]
+            day['mean'][i], day['std'][i], day['count'][i], day['quantiles'][i] = _window_stats(
+                doy[rows], values[rows], window, probs, min_count)
+
+        seasons = aggregate(ref, by='water_year', columns=[column], stats=[season_stat], site_col=site_col)
+        per_site = seasons.groupby(seasons[site_col].astype(object), sort=True)['{}_{}'.format(column, season_stat)]
+        season = {'mean': np.full(n, np.nan), 'std': np.full(n, np.nan), 'count': np.zeros(n, dtype=np.int64),
+                  'quantiles': np.full((n, len(probs)), np.nan)}
+        for site, stats in per_site:
+            i = sites.index(site)
+            stats = stats.dropna().to_numpy(dtype=float)
+            season['count'][i] = len(stats)
+            if len(stats) >= min_count:
+                season['mean'][i] = stats.mean()
+                season['std'][i] = stats.std(ddof=1)
+                season['quantiles'][i] = np.quantile(stats, probs)
+
+        params = {'column': column, 'reference': reference, 'window': window, 'quantiles': probs.tolist(),
+                  'season_stat': season_stat, 'min_count': min_count, 'site_col': site_col}
+        return cls(sites, params, day, season)
+
+    def _site_codes(self, labels):
+        return self._site_index.get_indexer(pd.Index(np.asarray(labels, dtype=object)))
+
+    def _score(self, values, mean, std, grids):
+        median = grids[:, np.searchsorted(self.probs, 0.5)] if 0.5 in self.probs else np.full(len(values), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {'clim_mean': mean, 'clim_median': median, 'anomaly': values - mean,
+                    'z_score': np.where(std > 0, (values - mean) / std, np.nan),
+                    'pct_of_median': np.where(median > 0, 100.0 * values / median, np.nan),
+                    'percentile': _grid_percentile(values, grids, self.probs)}
+
+    def score(self, df):
+        '''
+        Score observations against the day-of-water-year baselines.
+
+        Parameters
+        ----------
+        df: dataframe with the site column, date (or day) and the measurement
+
+        Returns
+        -------
+        Dataframe aligned with df: day_of_water_year, clim_mean, clim_median,
+        anomaly, z_score, pct_of_median and percentile. Rows for unknown
+        sites or thin baselines score NaN.
+        '''
+        site = self._site_codes(df[self.params['site_col']])
+        doy = np.clip(date_part(df, 'day_of_water_year').to_numpy(), 0, N_DAYS - 1)
+        values = df[self.params['column']].to_numpy(dtype=float)
+        known = site >= 0
+        cells = (site[known], doy[known])
+        out = self._score(values, _lookup(self.day['mean'], known, cells), _lookup(self.day['std'], known, cells),
+                          _lookup(self.day['quantiles'], known, cells))
+        out = dict({'day_of_water_year': doy}, **out)
+        return pd.DataFrame(out, index=df.index)
+
+    def score_seasons(self, df):
+        '''
+        Summarize each site's water years in df with the season statistic and
+        score them against the season baselines.
+
+        Parameters
+        ----------
+        df: dataframe (cleaned df_swe), e.g. just the latest season
+
+        Returns
+        -------
+        Tidy dataframe: site, water_year, value and the scores of score()
+        '''
+        column, stat, site_col = self.params['column'], self.params['season_stat'], self.params['site_col']
+        seasons = aggregate(df, by='water_year', columns=[column], stats=[stat], site_col=site_col)
+        seasons[site_col] = seasons[site_col].astype(object)
+        values = seasons['{}_{}'.format(column, stat)].to_numpy(dtype=float)
+        site = self._site_codes(seasons[site_col])
+        known = site >= 0
+        cells = (site[known],)
+        mean = _lookup(self.season['mean'], known, cells)
+        std = _lookup(self.season['std'], known, cells)
+        grids = _lookup(self.season['quantiles'], known, cells)
+        out = pd.DataFrame({site_col: seasons[site_col], 'water_year': seasons['water_year'], 'value': values})
+        for key, col in self._score(values, mean, std, grids).items():
+            out[key] = col
+        return out
+
+    def day_frame(self, site, stat='mean'):
+        '''
+        One site's day-of-water-year baseline as a Series (366 days), or its
+        quantile grid as a dataframe for stat='quantiles'.
+        '''
+        i = self.sites.index(site)
+        if stat == 'quantiles':
+            return pd.DataFrame(self.day['quantiles'][i], columns=self.probs)
+        return pd.Series(self.day[stat][i], name=stat)
+
+    def save(self, path):
+        '''
+        Write the baselines to an uncompressed .npz (no pickle).
+        '''
+        arrays = {'sites': np.asarray(self.sites, dtype=str), '__params__': np.array(json.dumps(self.params))}
+        for name, group in (('day', self.day), ('season', self.season)):
+            for key, values in group.items():
+                arrays['{}_{}'.format(name, key)] = values
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            params = json.loads(str(data['__params__']))
+            groups = {'day': {}, 'season': {}}
+            for key in data.files:
+                name, _, stat = key.partition('_')
+                if name in groups:
+                    groups[name][stat] = data[key]
+            sites = [str(s) for s in data['sites']]
+        return cls(sites, params, groups['day'], groups['season'])
+
+if __name__ == '__main__':
+    import argparse
+    from data_cleaning import load_swe_df
+    parser = argparse.ArgumentParser(description='Build water-year baselines and score the latest season.')
+    parser.add_argument('--csv', default=None, help='defaults to data_cleaning.DEFAULT_CSV')
+    parser.add_argument('--reference', type=int, nargs=2, default=None, metavar=('FIRST', 'LAST'))
+    parser.add_argument('--column', default='swe')
+    parser.add_argument('--window', type=int, default=15)
+    parser.add_argument('--out', default='climatology.npz')
+    args = parser.parse_args()
+
+    df = load_swe_df(args.csv)
+    clim = Climatology.build(df, column=args.column, reference=args.reference, window=args.window)
+    clim.save(args.out)
+    water_year = date_part(df, 'water_year')
+    latest = df[(water_year == water_year.max()).to_numpy()]
+    print(clim)
+    print(clim.score_seasons(latest).to_string(index=False))
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from aggregation import NUMERIC_COLUMNS, EPOCH, date_part, date_values
+
+CATEGORY_COLUMNS = ['LTER_site', 'local_site', 'samp_loc', 'loc_code']
+DATE_COLUMNS = [('day', np.int32), ('year', np.int16), ('month', np.int8), ('water_year', np.int16)]
+
+def compact_frame(df, float32=True):
+    '''
+    Compact typed copy of a cleaned frame.
+
+    Site and location labels become categoricals (int codes plus one copy of
+    each label), measurements become float32 and the date column is
+    replaced by int32 day numbers since 1970-01-01 with year, month and
+    water_year cached alongside. aggregation.date_values/date_part read
+    either layout, so the aggregation, partitioning and plotting code
+    accepts the result wherever it takes a cleaned frame.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    float32: bool
+        Store the measurement columns as float32. The survey values carry at
+        most four significant digits, well inside float32 precision.
+
+    Returns
+    -------
+    pandas dataframe with a RangeIndex
+    '''
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if col == 'date':
+            dates = values.to_numpy().astype('datetime64[D]')
+            out['day'] = (dates - EPOCH).astype(np.int32)
+        elif col in CATEGORY_COLUMNS:
+            out[col] = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+        elif float32 and col in NUMERIC_COLUMNS:
+            out[col] = values.astype(np.float32)
+        else:
+            out[col] = values
+    compact = pd.DataFrame(out, index=df.index).reset_index(drop=True)
+    if 'day' in compact.columns:
+        for part, dtype in DATE_COLUMNS[1:]:
+            compact[part] = date_part(compact, part).to_numpy().astype(dtype)
+    return compact
+
+def expand_frame(df):
+    '''
+    Back to the cleaned csv layout: datetime64 date column, labels in their
+    original dtype (object strings, int codes) and float64 measurements.
+
+    Parameters
+    ----------
+    df: dataframe (compact_frame output)
+
+    Returns
+    -------
+    pandas dataframe
+    '''
+    out = df.drop(columns=[c for c, _ in DATE_COLUMNS if c in df.columns])
+    if 'day' in df.columns:
+        position = list(df.columns).index('day')
+        out.insert(position, 'date', date_values(df).to_numpy())
+    for col in out.columns:
+        if isinstance(out[col].dtype, pd.CategoricalDtype):
+            # Labels come back in their categories' dtype, e.g. int64 loc_code.
+            out[col] = out[col].to_numpy()
+        elif out[col].dtype == np.float32:
+            out[col] = out[col].astype(np.float64)
+    return out
+
+def memory_usage(df):
+    '''
+    Resident size of df in megabytes, counting the Python strings held by
+    object columns.
+    '''
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -1,11 +1,29 @@
+import os
+import threading
 import numpy as np 
 import pandas as pd 
 import scipy.stats as stats
 import matplotlib.pyplot as plt
-from sample_site_class import SampleSite
+import matplotlib.dates as mdates
+from sample_site_class import build_sample_sites
+from aggregation import aggregate, date_values, mean_series, STATISTICS
+from frame_cache import cached_frame
+from streaming import iter_clean_chunks
+from compact import compact_frame
+from query import SWEIndex
+from validation import filter_valid
+from downsample import connect_zoom
+from instrumentation import stage
+import result_cache
 plt.style.use('ggplot')
 
-def import_csv_pd(filepath='/Users/annierumbles/Desktop/Coding/galvanize/capstone_work/data/latest_knb-lter-nwt.96.16/snowateq.mw.data.16.csv'):
+DEFAULT_CSV = os.environ.get('SWE_CSV', '/Users/annierumbles/Desktop/Coding/galvanize/capstone_work/data/latest_knb-lter-nwt.96.16/snowateq.mw.data.16.csv')
+USE_CACHE = os.environ.get('SWE_CACHE', '1') != '0'
+# Bump when clean_swe_df changes so cached frames are rebuilt.
+CLEANING_VERSION = 2
+
+@stage()
+def import_csv_pd(filepath=DEFAULT_CSV):
     '''
     Import csv to pandas dataframe.
 
@@ -21,46 +39,190 @@ def import_csv_pd(filepath='/Users/annierumbles/Desktop/Coding/galvanize/capston
     df = pd.read_csv(filepath)
     return df
 
-def clean_swe_df(filepath='/Users/annierumbles/Desktop/Coding/galvanize/capstone_work/data/latest_knb-lter-nwt.96.16/snowateq.mw.data.16.csv'):
+def clean_frame(df, subset=('swe',), compact=False, validate=False):
     '''
-    Clean snow water equivalent dataframe, drop nan values in swe column, sort by date then local_site.
+    Clean a raw snow survey dataframe: parse dates, drop nan rows, sort by
+    date then local_site.
 
     Parameters
     ----------
-    filepath: str
+    df: dataframe (import_csv_pd)
+    subset: tuple of str
+        Columns that must be non-null for a row to be kept.
+    compact: bool
+        Return the compact typed layout, see compact.compact_frame.
+    validate: bool
+        Drop rows breaking a rejecting rule in validation.DEFAULT_RULES
+        (implausible ranges, swe not matching depth and density). Use
+        validation.filter_valid directly to keep the quarantined rows.
 
     Returns
     -------
     Cleaned pandas dataframe
     '''
-    df = import_csv_pd(filepath)
     df_swe = df.copy()
     df_swe['date'] = pd.to_datetime(df_swe['date'])
-    df_swe.dropna(axis=0, how='all', inplace=False)
-    df_swe.dropna(axis=0, how='any', subset=['swe'], inplace=True)
+    df_swe.dropna(axis=0, how='all', inplace=True)
+    df_swe.dropna(axis=0, how='any', subset=list(subset), inplace=True)
     df_swe.sort_values(['date', 'local_site'], inplace=True)
     df_swe.reset_index(drop=True, inplace=True)
+    if validate:
+        df_swe = filter_valid(df_swe)[0]
+    if compact:
+        return compact_frame(df_swe)
     return df_swe
 
-def get_names_for_objects(df=clean_swe_df()):
+@stage()
+def clean_swe_df(filepath=DEFAULT_CSV, subset=('swe',), chunksize=None, compact=False, validate=False):
+    '''
+    Clean snow water equivalent dataframe, drop nan values in swe column, sort by date then local_site.
+
+    Parameters
+    ----------
+    filepath: str
+    subset: tuple of str
+        Columns that must be non-null for a row to be kept.
+    chunksize: int or None
+        Read the csv in chunks of this many rows, dropping nan rows from each
+        chunk before they are combined. See streaming.stream_aggregates for
+        summaries that never hold the whole file.
+    compact, validate: bool
+        See clean_frame.
+
+    Returns
+    -------
+    Cleaned pandas dataframe
+    '''
+    if chunksize:
+        chunks = list(iter_clean_chunks(filepath, chunksize, subset))
+        df = pd.concat(chunks, ignore_index=True) if chunks else import_csv_pd(filepath).iloc[:0]
+    else:
+        df = import_csv_pd(filepath)
+    return clean_frame(df, subset, compact, validate)
+
+class SWEDataset(object):
+    '''
+    Cleaned snow water equivalent data for one csv, loaded on first access.
+
+    Use get_dataset rather than constructing this directly so every caller
+    shares one parsed copy. The frame is shared, so treat it as read-only.
+    With use_cache the cleaned frame is also kept on disk by frame_cache and
+    reused until the csv changes.
+    '''
+    def __init__(self, filepath=DEFAULT_CSV, use_cache=USE_CACHE, **options):
+        self.filepath = filepath
+        self.use_cache = use_cache
+        self.options = options
+        self._df = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'SWEDataset({!r}, loaded={})'.format(self.filepath, self.loaded)
+
+    @property
+    def loaded(self):
+        return self._df is not None
+
+    @property
+    def df(self):
+        if self._df is None:
+            with self._lock:
+                if self._df is None:
+                    self._df = self._load()
+        return self._df
+
+    @property
+    def index(self):
+        '''
+        SWEIndex over the frame for date/site range queries, built on first use.
+        '''
+        if self._index is None:
+            df = self.df
+            with self._lock:
+                if self._index is None:
+                    self._index = SWEIndex(df)
+        return self._index
+
+    def _load(self):
+        if not self.use_cache:
+            return clean_swe_df(self.filepath, **self.options)
+        params = dict(self.options, cleaning_version=CLEANING_VERSION)
+        return cached_frame(self.filepath, lambda: clean_swe_df(self.filepath, **self.options), params)
+
+    def reload(self):
+        '''
+        Drop the parsed frame so the next access re-reads the csv, along
+        with its cached query results.
+        '''
+        with self._lock:
+            if self._df is not None:
+                result_cache.invalidate(self._df)
+            self._df = None
+            self._index = None
+
+_DATASETS = {}
+_DATASETS_LOCK = threading.Lock()
+
+def get_dataset(filepath=None, **options):
+    '''
+    Get the shared SWEDataset for a csv and set of cleaning options.
+
+    Parameters
+    ----------
+    filepath: str or None
+        Path to csv file, defaults to DEFAULT_CSV (override with the SWE_CSV
+        environment variable).
+    options:
+        Keyword arguments passed through to clean_swe_df.
+
+    Returns
+    -------
+    SWEDataset, not yet loaded if this is the first request for it
+    '''
+    filepath = os.path.abspath(filepath or DEFAULT_CSV)
+    key = (filepath, tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in options.items())))
+    with _DATASETS_LOCK:
+        if key not in _DATASETS:
+            _DATASETS[key] = SWEDataset(filepath, **options)
+        return _DATASETS[key]
+
+def load_swe_df(filepath=None, **options):
+    '''
+    Cleaned dataframe for a csv, parsed once and reused by every caller.
+
+    Parameters
+    ----------
+    filepath: str or None
+    options:
+        Keyword arguments passed through to clean_swe_df.
+
+    Returns
+    -------
+    Cleaned pandas dataframe
+    '''
+    return get_dataset(filepath, **options).df
+
+def get_names_for_objects(df=None):
     '''
     Make list of local_site names to make objects out of.
 
     Parameters
     ----------
-    df: dataframe (cleaned df_swe)
+    df: dataframe (cleaned df_swe), defaults to the shared DEFAULT_CSV dataset
 
     Returns
     -------
     list of strings
     '''
-    names = list(df['local_site'].unique())
-    names.pop(-1)
-    return names
+    if df is None:
+        df = load_swe_df()
+    return list(df['local_site'].dropna().unique())
 
-def create_object_list(df=clean_swe_df()):
+@stage()
+def create_object_list(df=None):
     '''
-    Create SampleSite objects from local_site name list.
+    Create SampleSite objects for every local_site, see build_sample_sites.
 
     Parameters
     ----------
@@ -70,13 +232,13 @@ def create_object_list(df=clean_swe_df()):
     -------
     List of objects
     '''
-    names = get_names_for_objects(df)
-    # new_names = [x.lower().replace(' ', '_') for x in names]
-    return [SampleSite(i, df) for i in names]
+    if df is None:
+        df = load_swe_df()
+    return build_sample_sites(df)
 
 def get_yearly_means_per_site(sample_object):
     '''
-    Create dictionary of annual means for passed in SampleSite object.
+    Get annual mean swe for passed in SampleSite object.
 
     Parameters
     ----------
@@ -84,21 +246,13 @@ def get_yearly_means_per_site(sample_object):
 
     Returns
     -------
-    Dictionary
-    '''
-    dct = {}
-    years = np.arange(1993, 2021, 1)
-    for i in years:
-        vals = []
-        for j in range(0, len(sample_object.df['date'])):
-            if sample_object.df['date'][j].year == i:
-                vals.append(sample_object.df['swe'][j])
-            dct[str(i)] = np.mean(vals)
-    return dct
+    pandas Series indexed by year
+    '''
+    return mean_series(sample_object.df, by='year')
 
 def get_monthly_means(sample_object):
     '''
-    Create dictionary of monthly means for passed in SampleSite object.
+    Get monthly mean swe for passed in SampleSite object.
 
     Parameters
     ----------
@@ -106,21 +260,13 @@ def get_monthly_means(sample_object):
 
     Returns
     -------
-    Dictionary
+    pandas Series indexed by month (1-12)
     '''
-    dct = {}
-    months = np.arange(1, 13, 1)
-    for mn in months:
-        vals = []
-        for j in range(0, len(sample_object.df['date'])):
-            if sample_object.df['date'][j].month == mn:
-                vals.append(sample_object.df['swe'][j])
-            dct[str(mn)] = np.mean(vals)
-    return dct
+    return mean_series(sample_object.df, by='month')
 
-def get_yearly_means_of_all_sites(df=clean_swe_df()):
+def get_yearly_means_of_all_sites(df=None):
     '''
-    Create dictionary of yearly means for all sites.
+    Get yearly mean swe combined for all sites.
 
     Parameters
     ----------
@@ -128,17 +274,32 @@ def get_yearly_means_of_all_sites(df=clean_swe_df()):
 
     Returns
     -------
-    Dictionary
-    '''
-    dct = {}
-    years = np.arange(1993, 2021, 1)
-    for i in years:
-        vals = []
-        for j in range(0, len(df['date'])):
-            if df['date'][j].year == i:
-                vals.append(df['swe'][j])
-            dct[str(i)] = np.mean(vals)
-    return dct
+    pandas Series indexed by year
+    '''
+    if df is None:
+        df = load_swe_df()
+    return mean_series(df, by='year')
+
+@stage()
+def get_site_summaries(df, by='year', columns=('swe',), stats=STATISTICS):
+    '''
+    Summary statistics for every site at once, see aggregation.aggregate.
+
+    Parameters
+    ----------
+    df: cleaned pandas df
+    by: str
+        'year', 'month' or 'samp_loc'.
+    columns: list of str
+        Numeric columns to summarize.
+    stats: list of str
+        Statistics to compute.
+
+    Returns
+    -------
+    Tidy dataframe, one row per site and group
+    '''
+    return aggregate(df, by=by, columns=columns, stats=stats)
 
 def lin_regress(x, y):
     '''
@@ -148,6 +309,7 @@ def lin_regress(x, y):
     return slope, intercept, r_value, p_value, std_err
 
 ## Plotting functions
+@stage()
 def plot_yearly_mean_swe(mean_dicts):
     labels = ['Saddle','GL4','GL5','Navajo','Martinelli','Arikaree','Subnivean','Albion','GL3','Tower Meadow',
     'Tower Tree Well','C1','Soddie']
@@ -157,13 +319,12 @@ def plot_yearly_mean_swe(mean_dicts):
     ax.tick_params(labelsize='x-large')
     ax.set_prop_cycle('color',['#E24A33', '#348ABD', '#988ED5', '#777777', '#FBC15E', '#8EBA42', '#FFB5B8', '#92C5DE', '#80CDC1', '#5E3C99', '#E66101', '#F4A582', 'B8E186'])
 
-    for i, dct in enumerate(mean_dicts):
-        x = np.arange(1993, 2021, 1)
-        y = [v for v in dct.values()]
-        ax.plot(x, y, marker='o', mew=1, linewidth=.75, label=labels[i])
+    for i, means in enumerate(mean_dicts):
+        ax.plot(means.index, means.values, marker='o', mew=1, linewidth=.75, label=labels[i])
     ax.legend(labels, loc='upper right', bbox_to_anchor=(1.16,1), fontsize='medium')
     return fig
 
+@stage()
 def plot_monthly_mean_swe(month_mean_dicts):
     labels = ['Saddle','GL4','GL5','Navajo','Martinelli','Arikaree','Subnivean','Albion','GL3','Tower Meadow',
     'Tower Tree Well','C1','Soddie']
@@ -176,222 +337,137 @@ def plot_monthly_mean_swe(month_mean_dicts):
     ax.set_xticklabels(x, rotation=45)
     ax.set_prop_cycle('color',['#E24A33', '#348ABD', '#988ED5', '#777777', '#FBC15E', '#8EBA42', '#FFB5B8', '#92C5DE', '#80CDC1', '#5E3C99', '#E66101', '#F4A582', 'B8E186'])
 
-    for i, dct in enumerate(month_mean_dicts):
-        y = [v for v in dct.values()]
-        ax.plot(x, y, marker='o', mew=1, linewidth=.75, label=str(labels[i]))
+    for i, means in enumerate(month_mean_dicts):
+        ax.plot(x, means.values, marker='o', mew=1, linewidth=.75, label=str(labels[i]))
                 
     ax.legend(labels, loc='upper right', bbox_to_anchor=(1.125,.8), ncol=2, fancybox=True, shadow=True)
     return fig
 
-def plot_all_sites(object_list, name_list):
+@stage(rows=lambda fig, args, kwargs: sum(len(obj.df) for obj in args[0]))
+def plot_all_sites(object_list, name_list, max_points=None):
+    '''
+    Plot every swe sample of every site over time.
+
+    Parameters
+    ----------
+    object_list: list of SampleSite
+    name_list: list of str
+    max_points: int or None
+        Point budget per site. Lines are drawn from each site's pyramid
+        (SampleSite.pyramid) and redrawn from it when the x range changes,
+        so the cost follows the budget rather than the sample count. None
+        plots every point.
+
+    Returns
+    -------
+    matplotlib figure
+    '''
     fig, ax = plt.subplots(figsize=(12,6))
     ax.set_title('SWE Across All Sites')
     ax.set_ylabel('meters')
     # ax.legend(loc='best')
-    for i in range(0, len(object_list)):
-        x = object_list[i].df['date']
-        y = object_list[i].df['swe']
-        ax.plot(x,y,label=name_list[i])
+    if max_points is None:
+        for i in range(0, len(object_list)):
+            x = date_values(object_list[i].df)
+            y = object_list[i].df['swe']
+            ax.plot(x,y,label=name_list[i])
+        return fig
+    lines, pyramids, dates = [], [], []
+    for obj, name in zip(object_list, name_list):
+        pyramid = obj.pyramid('swe')
+        x = date_values(obj.df).to_numpy()
+        idx = pyramid.view(max_points=max_points)
+        lines.extend(ax.plot(x[idx], pyramid.y[idx], label=name))
+        pyramids.append(pyramid)
+        dates.append(x)
+    connect_zoom(ax, lines, pyramids, dates, max_points, offset=mdates.date2num(np.datetime64('1970-01-01')))
     return fig
 
-if __name__ == '__main__':
+@stage()
+def plot_combined_yearly_swe(all_means):
+    '''
+    Plot the yearly mean of all sites combined with its linear regression.
 
-    df_swe = clean_swe_df()
-    names = get_names_for_objects()
-    snake_names = [x.lower().replace(' ', '_') for x in names]
-    objects = create_object_list(df_swe)
-    ## Assigning SampleSite objects to values
-    saddle = objects[0] 
-    gl4 = objects[1] 
-    gl5 = objects[2] 
-    navajo = objects[3] 
-    martinelli = objects[4] 
-    arikaree = objects[5] 
-    subnivean = objects[6] 
-    albion = objects[7] 
-    gl3 = objects[8] 
-    tower_meadow = objects[9] 
-    tower_tree_hill = objects[10] 
-    c1 = objects[11] 
-    soddie = objects[12]
-    objects = [saddle, gl4, gl5, navajo, martinelli, arikaree, subnivean, albion, gl3, tower_meadow, tower_tree_hill, c1, soddie]
-    color_dict = {'Saddle':'#E24A33','GL4':'#348ABD','GL5':'#988ED5','Navajo':'#777777','Martinelli':'#FBC15E',
-        'Arikaree':'#8EBA42','Subnivean':'#FFB5B8','Albion':'#92C5DE','GL3':'#80CDC1','Tower Meadow':'#5E3C99',
-        'Tower Tree Well':'#E66101','C1':'#F4A582','Soddie':'#B8E186'}
-
-    # Plot ALL points
-    new_names = [x.lower().replace(' ', '_') for x in names]
-    
-    # plot_all_sites(objects, new_names)
-
-    ## Get every mean per year per site
-    saddle_means = saddle.yearly_mean_swe()
-    gl4_means = gl4.yearly_mean_swe()
-    gl5_means = gl5.yearly_mean_swe()
-    navajo_means = navajo.yearly_mean_swe()
-    martinelli_means = martinelli.yearly_mean_swe()
-    arikaree_means = arikaree.yearly_mean_swe()
-    subnivean_means = subnivean.yearly_mean_swe()
-    albion_means = albion.yearly_mean_swe()
-    gl3_means = gl3.yearly_mean_swe()
-    tower_meadow_means = tower_meadow.yearly_mean_swe()
-    tower_tree_hill_means = tower_tree_hill.yearly_mean_swe()
-    c1_means = c1.yearly_mean_swe()
-    soddie_means = soddie.yearly_mean_swe()
-
-    ## Plot yearly means over all sites
-    list_of_yearly_mean_dicts = [saddle_means, gl4_means, gl5_means, navajo_means, martinelli_means, arikaree_means,
-                 subnivean_means, albion_means, gl3_means, tower_meadow_means, tower_tree_hill_means,
-                 c1_means, soddie_means]
-    fig = plot_yearly_mean_swe(list_of_yearly_mean_dicts)
-    fig.tight_layout(pad=1)
-    fig.savefig('average_yearly_swe_allsites80.png', dpi=80)
-
-    # # Get linear regression for combined site means over all years
-    # all_means = get_yearly_means_of_all_sites(df_swe)
-    # x_all = np.arange(1993, 2020, 1)
-    # y_all = [v for v in all_means.values()]
-    # y_all.pop(-1) 
-    # m, b, r_value, p_value, std_err = lin_regress(x_all, y_all)
-    # ## Plot combined site means over all years
-    # fig, ax = plt.subplots(figsize=(12,6))
-    # ax.set_title('Average Yearly Snow Water Equivalent - Combined for All Sites', pad=15, fontsize=20)
-    # ax.set_ylabel('SWE (m)', fontsize=20)
-
-    # x = np.arange(1993, 2021, 1)
-    # y = [v for v in all_means.values()]
-    # ax.plot(x, y, c= '#3489eb',marker='o', mew=3, linewidth=1, label='Yearly Mean')
-    # ax.plot(x_all, b + m*x_all, color='#E24A33', linewidth=1, label='p-value = .112')
-    # ax.tick_params(labelsize='x-large')
-    # ax.legend(loc='upper center', fancybox=True, shadow=True, fontsize='x-large', bbox_to_anchor=(.7, 1))
-    # # plt.show()
-    # fig.savefig('average_yearly_swe_combined80.png', dpi=80)
-
-    # # Plot number of sample locations per site
-    # capitalize_names = [name.capitalize() for name in names]
-    # local_site_count_dct = {}
-    # for i, obj in enumerate(objects):
-    #     count = len(obj.local_site_names)
-    #     local_site_count_dct[capitalize_names[i]] = count
-    # sorted_dict = {k: v for k, v in sorted(local_site_count_dct.items(), key=lambda item: item[1])}
-    # fig, ax = plt.subplots(figsize=(10,5))
-    # x = [k for k in sorted_dict.keys()]
-    # y = [v for v in sorted_dict.values()]
-    # ax.barh(x, y, color='#3489eb')
-    # ax.yaxis.grid(False)
-    # ax.set_xticks(np.arange(1,22,1))
-    # ax.set_title('Number of Sample Locations')
-
-    # ## Plot monthly site means over all years
-    # saddle_monthly = saddle.monthly_mean_swe()
-    # gl4_monthly = gl4.monthly_mean_swe()
-    # gl5_monthly = gl5.monthly_mean_swe()
-    # navajo_monthly = navajo.monthly_mean_swe()
-    # martinelli_monthly = martinelli.monthly_mean_swe()
-    # arikaree_monthly = arikaree.monthly_mean_swe()
-    # subnivean_monthly = subnivean.monthly_mean_swe()
-    # albion_monthly = albion.monthly_mean_swe()
-    # gl3_monthly = gl3.monthly_mean_swe()
-    # tower_meadow_monthly = tower_meadow.monthly_mean_swe()
-    # tower_tree_hill_monthly = tower_tree_hill.monthly_mean_swe()
-    # c1_monthly = c1.monthly_mean_swe()
-    # soddie_monthly = soddie.monthly_mean_swe()
-    # month_dicts = [saddle_monthly, gl4_monthly, gl5_monthly, navajo_monthly, martinelli_monthly, arikaree_monthly,
-    #              subnivean_monthly, albion_monthly, gl3_monthly, tower_meadow_monthly, tower_tree_hill_monthly,
-    #              c1_monthly, soddie_monthly]
-    # fig = plot_monthly_mean_swe(month_dicts)
-    # fig.savefig('monthly_means80_8by4.png', dpi=80)
-    
+    Parameters
+    ----------
+    all_means: pandas Series indexed by year (get_yearly_means_of_all_sites)
 
-    # # Plot total samples per site
-    # for i, obj in enumerate(objects):
-    #     count = len(obj.df)
-    #     local_site_count_dct[capitalize_names[i]] = count
-    # sorted_totals = {k: v for k, v in sorted(local_site_count_dct.items(), key=lambda item: item[1])}
-    # sorted_totals
-    # fig, ax = plt.subplots(figsize=(10,6))
-    # formal_names = ['Saddle','GL4','GL5','Navajo','Martinelli','Arikaree','Subnivean','Albion','GL3','Tower Meadow',
-    #     'Tower Tree Well','C1','Soddie']
-    # objects
-    # x = [k for k in sorted_totals.keys()]
-    # y = [v for v in sorted_totals.values()]
-    # ax.barh(x, y, color='#3489eb')
-
-    # ax.set_title('Total Samples per Site')
-    # ax.set_xlabel('Number of Samples')
-    # plt.show()
-
-    # ## Plot site makeup (total samples and total sample locations)
-    # fig, ax = plt.subplots(figsize=(8,6))
-    # formal_names = ['Albion','GL3','Tower Tree Well','Tower Meadow','Soddie','Martinelli','Navajo','Arikaree','GL5','GL4',
-    #     'C1','Subnivean','Saddle']
-    # objects
-    # x = [k for k in sorted_totals.keys()]
-    # y = [v for v in sorted_totals.values()]
-    # y_sample_sites = [v for v in sorted_dict.values()]
-    # # ax.set_prop_cycle('color',['#E24A33', '#348ABD', '#988ED5', '#777777', '#FBC15E', '#8EBA42', '#FFB5B8', '#92C5DE', '#80CDC1', '#5E3C99', '#E66101', '#F4A582', 'B8E186'])
-    # # #3489eb
-    # ax.barh(x, y, color='#3489eb', label='Number of \nSamples')
-    # ax.barh(x, y_sample_sites, color='#3fd9d4', label='Number of \nSample Locations')
-    
+    Returns
+    -------
+    matplotlib figure
+    '''
+    fit = all_means.dropna()
+    x_fit = np.asarray(fit.index, dtype=float)
+    m, b, r_value, p_value, std_err = lin_regress(x_fit, fit.values)
+    fig, ax = plt.subplots(figsize=(12,6))
+    ax.set_title('Average Yearly Snow Water Equivalent - Combined for All Sites', pad=15, fontsize=20)
+    ax.set_ylabel('SWE (m)', fontsize=20)
+    ax.plot(all_means.index, all_means.values, c= '#3489eb',marker='o', mew=3, linewidth=1, label='Yearly Mean')
+    ax.plot(x_fit, b + m*x_fit, color='#E24A33', linewidth=1, label='p-value = {}'.format(round(p_value, 3)))
+    ax.tick_params(labelsize='x-large')
+    ax.legend(loc='upper center', fancybox=True, shadow=True, fontsize='x-large', bbox_to_anchor=(.7, 1))
+    return fig
 
-    # ax.set_title('Sample Site Composition', pad=15, fontsize=20)
-    # ax.set_xlabel('Count')
-    # ax.set_yticklabels(formal_names, fontsize=14)
-    # ax.tick_params(labelsize='x-large')
-    # ax.legend(loc='center right', fontsize='x-large')
-    # fig.tight_layout(pad=1)
-    # # fig.savefig('sample_site_composition80_8by6.png', dpi=80)
-
-    # ## Get all linear regressions
-    # top_sites = [saddle_means, subnivean_means, c1_means, gl4_means, gl5_means, arikaree_means, navajo_means]
-    # top_colors = [color_dict['Saddle'], color_dict['Subnivean'], color_dict['C1'], color_dict['GL4'],
-    #           color_dict['GL5'], color_dict['Arikaree'],color_dict['Navajo']]
-    # top_names = ['Saddle', 'Subnivean', 'C1', 'GL4', 'GL5', 'Arikaree', 'Navajo']
-    # x = []
-    # for k, v in top_sites[0].items():
-    #     if str(v) != 'nan':
-    #         x.append(int(k))
-    #     else:
-    #         pass
-    # y = np.array([v for v in top_sites[0].values()])
-    # y = y[~np.isnan(y)]
-    # x = np.array(x)
-    # m, b, r_value, p_value, std_err = lin_regress(x,y)
-    # lin_regresses = [[-0.003906325102151978, 8.349419629869915, 0.5236700119739848], 
-    #              [0.005574586252507653, -10.526383881925533, 0.2772141025494249],
-    #             [0.0077428338572561595, -15.331905622614242, 0.11056127771258156],
-    #             [0.0015959806359015206, -2.444305311472887, 0.6706143053095486],
-    #             [-0.0034535183543882397, 7.72724589938305, 0.3316218041756759],
-    #             [0.0024907513944714384, -4.228435453992933, 0.5281068861253063],
-    #             [-0.0009094397769027527, 2.586988247942623, 0.8616436667990759]]
-    # ## Plotting all linear regressions and averages
-    # ## MAKE FUNCTIONS FOR THIS
-    # fig, axs = plt.subplots(2,3,figsize=(12, 7),sharey=True, sharex=True)
-    # x = np.arange(1993, 2021, 1)
-    # i = 0
-    # fig.suptitle('Average Yearly Snow Water Equivalent - Top 6', fontsize=20)
-
-    # for ax in axs.flatten():
-    #     y = [v for v in top_sites[i].values()]
-    #     x_site = []
-    #     for k, v in top_sites[i].items():
-    #         if str(v) != 'nan':
-    #             x_site.append(int(k))
-    #         else:
-    #             pass
-    #     x_site=np.array(x_site)
-    #     ax.scatter(x, y, color=top_colors[i])
-    #     ax.plot(x_site, lin_regresses[i][1] + x_site*lin_regresses[i][0], c='black',
-    #     label='p-value = {}'.format(str(round(lin_regresses[i][2],2))), linewidth=1)
-    #     ax.set_title('{}'.format(top_names[i]), fontsize=18)
-    #     ax.legend(loc='best', fontsize='medium')
-    #     ax.tick_params(labelsize='large')
-    #     i +=1
-    # fig.text(0.06, 0.5, 'SWE (m)', ha='center', va='center', rotation='vertical', fontsize=18)
-    # # fig.savefig('av?erage_yearly_swe_top6_12by7.png', dpi=80)
+@stage()
+def plot_site_composition(object_list):
+    '''
+    Plot number of samples and number of sample locations for each site.
 
+    Parameters
+    ----------
+    object_list: list of SampleSite objects
+
+    Returns
+    -------
+    matplotlib figure
+    '''
+    ordered = sorted(object_list, key=lambda obj: len(obj.df))
+    names = [obj.site_name for obj in ordered]
+    fig, ax = plt.subplots(figsize=(8,6))
+    ax.barh(names, [len(obj.df) for obj in ordered], color='#3489eb', label='Number of \nSamples')
+    ax.barh(names, [len(obj.local_site_names) for obj in ordered], color='#3fd9d4', label='Number of \nSample Locations')
+    ax.set_title('Sample Site Composition', pad=15, fontsize=20)
+    ax.set_xlabel('Count')
+    ax.tick_params(labelsize='x-large')
+    ax.legend(loc='center right', fontsize='x-large')
+    fig.tight_layout(pad=1)
+    return fig
 
+@stage()
+def plot_top_sites_trends(year_matrix, trend_table, top_names, colors=None):
+    '''
+    Plot yearly means and fitted trend line for up to six sites.
 
+    Parameters
+    ----------
+    year_matrix: pandas DataFrame, sites x years (aggregation.aggregate_matrix)
+    trend_table: pandas DataFrame indexed by site (trends.trend_table)
+    top_names: list of str
+        Sites to plot, in order.
+    colors: list of str or None
 
+    Returns
+    -------
+    matplotlib figure
+    '''
+    fig, axs = plt.subplots(2,3,figsize=(12, 7),sharey=True, sharex=True)
+    fig.suptitle('Average Yearly Snow Water Equivalent - Top 6', fontsize=20)
+    x = np.asarray(year_matrix.columns, dtype=float)
+    for i, (ax, name) in enumerate(zip(axs.flatten(), top_names)):
+        y = year_matrix.loc[name].values
+        x_site = x[~np.isnan(y)]
+        trend = trend_table.loc[name]
+        ax.scatter(x, y, color=None if colors is None else colors[i])
+        ax.plot(x_site, trend['intercept'] + x_site*trend['slope'], c='black',
+        label='p-value = {}'.format(str(round(trend['p_value'],2))), linewidth=1)
+        ax.set_title('{}'.format(name), fontsize=18)
+        ax.legend(loc='best', fontsize='medium')
+        ax.tick_params(labelsize='large')
+    fig.text(0.06, 0.5, 'SWE (m)', ha='center', va='center', rotation='vertical', fontsize=18)
+    return fig
 
+if __name__ == '__main__':
+    # The report figures are stages of the cached pipeline runner, see
+    # python pipeline.py --help
+    import pipeline
+    raise SystemExit(pipeline.main())
@@ -0,0 +1,205 @@
+import numpy as np
+
+def minmax_indices(x, y, n_buckets):
+    '''
+    Indices of the lowest and highest point in each of n_buckets equal
+    width x buckets, plus the first and last point, in x order.
+
+    Keeps every peak and trough a line plot at that width can show.
+
+    Parameters
+    ----------
+    x: sorted float array
+    y: float array without nans
+    n_buckets: int
+
+    Returns
+    -------
+    int array
+    '''
+    n = len(x)
+    if n <= 2 * n_buckets + 2:
+        return np.arange(n)
+    # x is sorted, so each bucket is a contiguous run starting at starts.
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)[1:-1]
+    starts = np.unique(np.r_[0, np.searchsorted(x, edges, 'left')])
+    starts = starts[starts < n]
+    counts = np.diff(np.r_[starts, n])
+    keep = [[0, n - 1]]
+    for reduce in (np.minimum, np.maximum):
+        extreme = np.repeat(reduce.reduceat(y, starts), counts)
+        hits = np.flatnonzero(y == extreme)
+        keep.append(hits[np.searchsorted(hits, starts)])
+    return np.unique(np.concatenate(keep))
+
+def lttb_indices(x, y, n_out):
+    '''
+    Largest-Triangle-Three-Buckets: indices of n_out points keeping the
+    visual shape of the line.
+
+    The next bucket averages come from cumulative sums and each bucket's
+    triangle areas are one vector expression, leaving a loop over the
+    n_out buckets only. The triangle areas can pass over the series' lowest
+    and highest points, so those replace the pick of their bucket (or of a
+    neighbouring one when they share a bucket) afterwards; with n_out >= 4
+    both are always kept.
+
+    Parameters
+    ----------
+    x: sorted float array
+    y: float array without nans
+    n_out: int
+
+    Returns
+    -------
+    int array of length min(n_out, len(x))
+    '''
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    cx, cy = np.r_[0.0, np.cumsum(x)], np.r_[0.0, np.cumsum(y)]
+    sizes = np.diff(edges)
+    mean_x = np.r_[(cx[edges[1:]] - cx[edges[:-1]]) / sizes, x[-1]]
+    mean_y = np.r_[(cy[edges[1:]] - cy[edges[:-1]]) / sizes, y[-1]]
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    extremes = (int(np.argmin(y)), int(np.argmax(y)))
+    used = set(np.flatnonzero(np.isin(out, extremes)).tolist())
+    for e in extremes:
+        if e in out:
+            continue
+        slot = int(np.searchsorted(edges, e, 'right'))
+        if slot in used:
+            slot = slot + 1 if slot + 1 < n_out - 1 else slot - 1
+        if 1 <= slot < n_out - 1 and slot not in used:
+            out[slot] = e
+            used.add(slot)
+    return np.sort(out)
+
+def downsample(x, y, max_points, method='lttb'):
+    '''
+    Indices of at most max_points points of a line to draw in its place.
+
+    Parameters
+    ----------
+    x: sorted float array
+    y: float array without nans
+    max_points: int
+    method: str
+        'lttb' or 'minmax'. LTTB input is first cut to 4 * max_points
+        points with minmax_indices, so its loop stays short on long series.
+
+    Returns
+    -------
+    int array
+    '''
+    if len(x) <= max_points:
+        return np.arange(len(x))
+    if method == 'minmax':
+        keep = minmax_indices(x, y, max(1, (max_points - 2) // 2))
+        return keep if len(keep) <= max_points else keep[np.linspace(0, len(keep) - 1, max_points).astype(int)]
+    if method != 'lttb':
+        raise ValueError("method must be 'lttb' or 'minmax', got {!r}".format(method))
+    pre = minmax_indices(x, y, 2 * max_points) if len(x) > 4 * max_points else np.arange(len(x))
+    return pre[lttb_indices(x[pre], y[pre], max_points)]
+
+class Pyramid(object):
+    '''
+    Multi-resolution copy of one series for plotting at any zoom.
+
+    Level 0 is every point with a value, each further level keeps the
+    first and last points and the minimum and maximum of each run of four
+    points of the level below (half the points), down to about min_points. view() answers a date range and
+    point budget by slicing the finest level that fits, two binary searches
+    per level, so redrawing a zoomed plot costs the budget, not the series.
+    '''
+    def __init__(self, x, y, min_points=256):
+        '''
+        Parameters
+        ----------
+        x: sorted float array, e.g. days since 1970-01-01
+        y: float array, nans are left out
+        min_points: int
+        '''
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        if len(x) > 1 and (np.diff(x) < 0).any():
+            raise ValueError('Pyramid needs x in ascending order')
+        self.x, self.y = x, y
+        self.levels = [np.flatnonzero(~np.isnan(y))]
+        while len(self.levels[-1]) > 2 * min_points:
+            self.levels.append(self._halve(self.levels[-1]))
+
+    def __repr__(self):
+        return 'Pyramid(points={}, levels={})'.format(len(self.levels[0]), [len(l) for l in self.levels])
+
+    def _halve(self, idx):
+        n = len(idx) // 4 * 4
+        groups = idx[:n].reshape(-1, 4)
+        values = self.y[groups]
+        rows = np.arange(len(groups))
+        low, high = groups[rows, values.argmin(axis=1)], groups[rows, values.argmax(axis=1)]
+        return np.unique(np.concatenate([idx[:1], low, high, idx[n:], idx[-1:]]))
+
+    def view(self, start=None, end=None, max_points=2000, method='lttb'):
+        '''
+        Indices of at most max_points points covering x between start and
+        end, including the point just outside either end when there is one,
+        so lines run to the edges.
+
+        Parameters
+        ----------
+        start, end: float or None
+            x range, the whole series when None.
+        max_points: int
+        method: str
+            Downsampler for when even the coarsest level is over budget.
+
+        Returns
+        -------
+        int array into x and y
+        '''
+        for idx in self.levels:
+            xs = self.x[idx]
+            lo = 0 if start is None else max(np.searchsorted(xs, start, 'left') - 1, 0)
+            hi = len(xs) if end is None else min(np.searchsorted(xs, end, 'right') + 1, len(xs))
+            if hi - lo <= max_points:
+                return idx[lo:hi]
+        window = idx[lo:hi]
+        return window[downsample(self.x[window], self.y[window], max_points, method)]
+
+def connect_zoom(ax, lines, pyramids, x_values, max_points=2000, offset=0.0):
+    '''
+    Redraw each line from its pyramid whenever the x limits of ax change,
+    so zooming in an interactive figure shows the detail of the visible
+    range within the same point budget.
+
+    Parameters
+    ----------
+    ax: matplotlib axes
+    lines: list of Line2D
+    pyramids: list of Pyramid, one per line
+    x_values: list of arrays
+        x data to draw for each line, e.g. the datetime values the pyramid
+        x numbers were made from.
+    max_points: int
+    offset: float
+        Axis units at pyramid x = 0, e.g. matplotlib's date number of
+        1970-01-01.
+
+    Returns
+    -------
+    callback id, for ax.callbacks.disconnect
+    '''
+    def redraw(ax):
+        start, end = ax.get_xlim()
+        for line, pyramid, x in zip(lines, pyramids, x_values):
+            idx = pyramid.view(start - offset, end - offset, max_points)
+            line.set_data(x[idx], pyramid.y[idx])
+    return ax.callbacks.connect('xlim_changed', redraw)
@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import data_cleaning
+from aggregation import aggregate_matrix
+from trends import trend_table
+
+DEFAULT_DPIS = (80, 125)
+TOP_SITES = ['SADDLE', 'SUBNIVEAN', 'C1', 'GL4', 'GL5', 'ARIKAREE']
+MANIFEST = '.figures.json'
+
+# builder names a plotting function in data_cleaning, args are its positional
+# arguments and sizes is a list of (width, height) inches, None for the
+# figure's own size.
+FigureJob = namedtuple('FigureJob', ['name', 'builder', 'args', 'sizes'])
+
+def report_jobs(df, top_sites=TOP_SITES):
+    '''
+    Declare the report figures and the aggregates each one is drawn from.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    top_sites: list of str
+        Sites for the top sites trend grid, at most six are drawn.
+
+    Returns
+    -------
+    List of FigureJob
+    '''
+    objects = data_cleaning.create_object_list(df)
+    yearly = [obj.yearly_mean_swe() for obj in objects]
+    monthly = [obj.monthly_mean_swe() for obj in objects]
+    matrix = aggregate_matrix(df, by='year')
+    top = [name for name in top_sites if name in matrix.index][:6]
+    return [
+        FigureJob('average_yearly_swe_allsites', 'plot_yearly_mean_swe', (yearly,), [None]),
+        FigureJob('monthly_means', 'plot_monthly_mean_swe', (monthly,), [None, (8, 4)]),
+        FigureJob('average_yearly_swe_combined', 'plot_combined_yearly_swe',
+                  (data_cleaning.get_yearly_means_of_all_sites(df),), [None, (10, 6)]),
+        FigureJob('sample_site_composition', 'plot_site_composition', (objects,), [None]),
+        FigureJob('average_yearly_swe_top6_', 'plot_top_sites_trends',
+                  (matrix.loc[top], trend_table(matrix.loc[top]), top), [None, (12, 7)]),
+        FigureJob('all_sites', 'plot_all_sites', (objects, [obj.site_name for obj in objects]), [None]),
+    ]
+
+def output_name(job_name, dpi, size):
+    '''
+    File name for one variant, following the images/ naming,
+    e.g. sample_site_composition80.png or monthly_means80_8by4.png.
+    '''
+    if size is None:
+        return '{}{}.png'.format(job_name, dpi)
+    return '{}{}_{}by{}.png'.format(job_name, dpi, size[0], size[1])
+
+def job_digest(job, dpis):
+    '''
+    Content hash of a job's inputs and requested variants.
+    '''
+    payload = pickle.dumps((job.builder, job.args, job.sizes, tuple(dpis)), protocol=4)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def render_job(job, out_dir, dpis):
+    '''
+    Draw one figure and save every size/dpi variant of it.
+
+    Module level so it can run in a worker process.
+
+    Returns
+    -------
+    list of written paths
+    '''
+    fig = getattr(data_cleaning, job.builder)(*job.args)
+    default_size = tuple(fig.get_size_inches())
+    paths = []
+    try:
+        for size in job.sizes:
+            fig.set_size_inches(default_size if size is None else size)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                fig.tight_layout(pad=1)
+            for dpi in dpis:
+                path = os.path.join(out_dir, output_name(job.name, dpi, size))
+                fig.savefig(path, dpi=dpi)
+                paths.append(path)
+    finally:
+        plt.close(fig)
+    return paths
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def export_figures(jobs, out_dir='images', dpis=DEFAULT_DPIS, workers=None, force=False, only=None):
+    '''
+    Render figure jobs in a process pool, skipping jobs whose inputs and
+    variants are unchanged since their files were last written.
+
+    Parameters
+    ----------
+    jobs: list of FigureJob (see report_jobs)
+    out_dir: str
+    dpis: list of int
+    workers: int or None
+        Process count, defaults to os.cpu_count(). 1 renders in this process.
+    force: bool
+        Render every job even if it is up to date.
+    only: list of str or None
+        Job names to consider.
+
+    Returns
+    -------
+    Dictionary of job name -> 'rendered', 'skipped' or an error message
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _load_manifest(out_dir)
+    status = {}
+    pending = []
+    for job in jobs:
+        if only and job.name not in only:
+            continue
+        digest = job_digest(job, dpis)
+        outputs = [os.path.join(out_dir, output_name(job.name, d, s)) for s in job.sizes for d in dpis]
+        if not force and manifest.get(job.name) == digest and all(os.path.exists(p) for p in outputs):
+            status[job.name] = 'skipped'
+        else:
+            pending.append((job, digest))
+
+    if workers == 1 or len(pending) <= 1:
+        results = []
+        for job, _ in pending:
+            try:
+                results.append(render_job(job, out_dir, dpis))
+            except Exception as e:
+                results.append(e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_job, job, out_dir, dpis) for job, _ in pending]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+
+    for (job, digest), result in zip(pending, results):
+        if isinstance(result, Exception):
+            status[job.name] = 'error: {!r}'.format(result)
+            manifest.pop(job.name, None)
+        else:
+            status[job.name] = 'rendered'
+            manifest[job.name] = digest
+    tmp = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return status
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the report figures headlessly.')
+    parser.add_argument('--csv', default=None, help='defaults to data_cleaning.DEFAULT_CSV')
+    parser.add_argument('--out', default='images')
+    parser.add_argument('--dpi', type=int, action='append', help='repeat for several dpis (default 80 and 125)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--only', nargs='*', default=None)
+    args = parser.parse_args()
+
+    jobs = report_jobs(data_cleaning.load_swe_df(args.csv))
+    status = export_figures(jobs, args.out, args.dpi or DEFAULT_DPIS, args.workers, args.force, args.only)
+    for name, state in sorted(status.items()):
+        print('{:32} {}'.format(name, state))
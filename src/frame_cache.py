@@ -0,0 +1,267 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.environ.get('SWE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'niwot_swe'))
+FORMAT_VERSION = 1
+
+def file_fingerprint(filepath, block_size=1 << 20):
+    '''
+    Size, modification time and content hash of a source file.
+
+    Parameters
+    ----------
+    filepath: str
+    block_size: int
+        Bytes read per hashing step.
+
+    Returns
+    -------
+    Dictionary with size, mtime_ns and blake2b keys
+    '''
+    st = os.stat(filepath)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'blake2b': digest.hexdigest()}
+
+def _recorded_fingerprint(filepath, cache_dir):
+    '''
+    Fingerprint of filepath, reusing the hash recorded on an earlier run when
+    size and mtime are unchanged so warm loads don't re-read the source.
+    '''
+    index_path = os.path.join(cache_dir, 'fingerprints.json')
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    key = os.path.abspath(filepath)
+    st = os.stat(filepath)
+    known = index.get(key)
+    if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+        return known
+    index[key] = file_fingerprint(filepath)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = '{}.{}.tmp'.format(index_path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, index_path)
+    except OSError:
+        pass
+    return index[key]
+
+def _source_tag(filepath):
+    return hashlib.blake2b(os.path.abspath(filepath).encode(), digest_size=8).hexdigest()
+
+def cache_path(filepath, params=None, cache_dir=None):
+    '''
+    Location of the cache entry for a source file and its cleaning parameters.
+
+    Parameters
+    ----------
+    filepath: str
+        Source csv.
+    params: dict or None
+        Cleaning parameters, must be json serializable.
+    cache_dir: str or None
+        Defaults to CACHE_DIR (override with SWE_CACHE_DIR).
+
+    Returns
+    -------
+    str
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    fingerprint = _recorded_fingerprint(filepath, cache_dir)
+    key = json.dumps([FORMAT_VERSION, fingerprint, params or {}], sort_keys=True, default=str)
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    # The fingerprint tag lets stale entries be found by name, see _evict_stale.
+    version = json.dumps([FORMAT_VERSION, fingerprint], sort_keys=True)
+    tag = hashlib.blake2b(version.encode(), digest_size=6).hexdigest()
+    return os.path.join(cache_dir, '{}-{}-{}.npz'.format(_source_tag(filepath), tag, digest))
+
+def _evict_stale(path):
+    '''
+    Remove entries for the same source as the entry at path that were built
+    from an older version of it. Entries for other params are kept.
+    '''
+    source, tag = os.path.basename(path).split('-')[:2]
+    for other in glob.glob(os.path.join(os.path.dirname(path), '{}-*.npz'.format(source))):
+        if os.path.basename(other).split('-')[1] != tag:
+            try:
+                os.remove(other)
+            except FileNotFoundError:
+                pass
+
+def write_frame(path, df):
+    '''
+    Write a dataframe to an uncompressed .npz file, one array per column.
+
+    Numeric, boolean and datetime columns are stored as is. String columns are
+    stored as integer codes plus their unique values, and categoricals as
+    codes plus categories, so reading never needs pickle. The index is not
+    stored.
+
+    Parameters
+    ----------
+    path: str
+    df: pandas dataframe
+
+    Returns
+    -------
+    None
+    '''
+    arrays = {}
+    kinds = []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays['c{}_codes'.format(i)] = values.cat.codes.to_numpy()
+            categories = values.cat.categories
+            arrays['c{}_uniques'.format(i)] = np.asarray(categories, dtype=str if categories.dtype == object else None)
+            kinds.append('category')
+        elif values.dtype == object:
+            if not values.map(lambda v: isinstance(v, str), na_action='ignore').all():
+                raise TypeError('column {!r} holds non-string objects'.format(col))
+            codes, uniques = pd.factorize(values)
+            arrays['c{}_codes'.format(i)] = codes.astype(np.int32)
+            arrays['c{}_uniques'.format(i)] = np.asarray(uniques, dtype=str)
+            kinds.append('object')
+        else:
+            arrays['c{}'.format(i)] = values.to_numpy()
+            kinds.append('plain')
+    meta = {'columns': [str(c) for c in df.columns], 'kinds': kinds}
+    arrays['__meta__'] = np.array(json.dumps(meta))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+def read_frame(path):
+    '''
+    Read a dataframe written by write_frame.
+
+    Parameters
+    ----------
+    path: str
+
+    Returns
+    -------
+    pandas dataframe with a fresh RangeIndex
+    '''
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['__meta__']))
+        columns = {}
+        for i, (col, kind) in enumerate(zip(meta['columns'], meta['kinds'])):
+            if kind == 'plain':
+                columns[col] = data['c{}'.format(i)]
+                continue
+            codes = data['c{}_codes'.format(i)]
+            uniques = data['c{}_uniques'.format(i)]
+            if kind == 'category':
+                columns[col] = pd.Categorical.from_codes(codes, uniques)
+            else:
+                lookup = np.append(uniques.astype(object), np.nan)
+                columns[col] = lookup[codes]
+    return pd.DataFrame(columns, columns=meta['columns'])
+
+def cached_frame(filepath, build, params=None, cache_dir=None):
+    '''
+    Load the cached frame for a source file, building and storing it on a miss.
+
+    Entries are keyed on the file's size, mtime and content hash plus params,
+    so editing the source triggers a rebuild. Entries built from an older
+    version of the source are evicted when a new one is written, entries for
+    other params of the current version are kept.
+
+    Parameters
+    ----------
+    filepath: str
+        Source csv.
+    build: callable
+        Called with no arguments to produce the frame on a miss.
+    params: dict or None
+        Parameters that change the result of build.
+    cache_dir: str or None
+
+    Returns
+    -------
+    pandas dataframe
+    '''
+    path = cache_path(filepath, params, cache_dir)
+    if os.path.exists(path):
+        try:
+            return read_frame(path)
+        except (OSError, ValueError, KeyError) as e:
+            warnings.warn('ignoring unreadable cache entry {}: {}'.format(path, e))
+    df = build()
+    try:
+        _evict_stale(path)
+        write_frame(path, df)
+    except (OSError, TypeError) as e:
+        warnings.warn('could not cache {}: {}'.format(filepath, e))
+    return df
+
+def list_cache(cache_dir=None):
+    '''
+    Cache entries on disk.
+
+    Parameters
+    ----------
+    cache_dir: str or None
+
+    Returns
+    -------
+    List of (path, size in bytes) tuples
+    '''
+    paths = sorted(glob.glob(os.path.join(cache_dir or CACHE_DIR, '*.npz')))
+    return [(p, os.path.getsize(p)) for p in paths]
+
+def clear_cache(cache_dir=None, filepath=None):
+    '''
+    Evict cache entries, either all of them or those for one source file.
+    Clearing everything also forgets recorded source fingerprints.
+
+    Parameters
+    ----------
+    cache_dir: str or None
+    filepath: str or None
+        Only evict entries built from this source.
+
+    Returns
+    -------
+    Number of entries removed
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    pattern = '{}-*.npz'.format(_source_tag(filepath)) if filepath else '*.npz'
+    removed = 0
+    if filepath is None and os.path.exists(os.path.join(cache_dir, 'fingerprints.json')):
+        os.remove(os.path.join(cache_dir, 'fingerprints.json'))
+    for path in glob.glob(os.path.join(cache_dir, pattern)):
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect or evict cached SWE frames.')
+    parser.add_argument('command', choices=['list', 'clear'])
+    parser.add_argument('--source', help='only clear entries built from this csv')
+    parser.add_argument('--cache-dir', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for path, size in list_cache(args.cache_dir):
+            print('{}\t{}'.format(size, path))
+    else:
+        print('removed {} entries'.format(clear_cache(args.cache_dir, args.source)))
@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from streaming import iter_clean_chunks
+
+MANIFEST = '.ingest.json'
+CHUNK_SIZE = 1 << 16
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+# status is 'downloaded', 'unchanged' (the server answered 304) or 'error'.
+FetchResult = namedtuple('FetchResult', ['name', 'url', 'path', 'status', 'bytes', 'seconds', 'attempts', 'error'])
+
+class _Retry(Exception):
+    '''
+    A failure worth retrying, with the server's Retry-After if it sent one.
+    '''
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def source_names(urls):
+    '''
+    File names for downloaded urls: the last path segment, with a short
+    hash of the url appended when two urls share it or it is empty.
+    '''
+    bases = [os.path.basename(urllib.parse.urlparse(url).path.rstrip('/')) for url in urls]
+    names = []
+    for url, base in zip(urls, bases):
+        if not base or bases.count(base) > 1:
+            tag = hashlib.blake2b(url.encode(), digest_size=4).hexdigest()
+            stem, ext = os.path.splitext(base)
+            base = '{}-{}{}'.format(stem or 'dataset', tag, ext)
+        names.append(base)
+    return names
+
+def read_sources(path):
+    '''
+    Read a sources file, one url per line optionally followed by a file
+    name, blank lines and # comments ignored.
+
+    Returns
+    -------
+    list of (url, name or None)
+    '''
+    sources = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                parts = line.split()
+                sources.append((parts[0], parts[1] if len(parts) > 1 else None))
+    return sources
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def _download(url, path, validators, timeout, chunk_size):
+    '''
+    One blocking conditional GET, streaming the body to path through a
+    .part file. Runs in a worker thread.
+
+    Returns
+    -------
+    (http status, response headers, bytes written, blake2b hex digest or None)
+    '''
+    headers = {'User-Agent': 'niwot-swe-ingest'}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, e.headers, 0, None
+        if e.code in RETRY_STATUS:
+            raise _Retry('HTTP {}'.format(e.code), _retry_after(e.headers))
+        raise
+    except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+        raise _Retry(repr(e))
+    tmp = '{}.{}.part'.format(path, os.getpid())
+    digest = hashlib.blake2b(digest_size=16)
+    size = 0
+    try:
+        with response, open(tmp, 'wb') as f:
+            while True:
+                block = response.read(chunk_size)
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                size += len(block)
+        expected = response.headers.get('Content-Length')
+        if expected is not None and int(expected) != size:
+            raise _Retry('got {} of {} bytes'.format(size, expected))
+        os.replace(tmp, path)
+    except (HTTPException, socket.timeout, ConnectionError) as e:
+        raise _Retry(repr(e))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return response.status, response.headers, size, digest.hexdigest()
+
+def _load_manifest(dest_dir):
+    try:
+        with open(os.path.join(dest_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(dest_dir, manifest):
+    path = os.path.join(dest_dir, MANIFEST)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+async def _fetch(loop, pool, name, url, dest_dir, entry, retries, backoff, timeout, chunk_size, force):
+    path = os.path.join(dest_dir, name)
+    validators = {} if force or not os.path.exists(path) or entry.get('url') != url else entry
+    start = time.perf_counter()
+    for attempt in range(1, retries + 2):
+        try:
+            status, headers, size, digest = await loop.run_in_executor(
+                pool, _download, url, path, validators, timeout, chunk_size)
+        except _Retry as e:
+            if attempt > retries:
+                return FetchResult(name, url, path, 'error', 0, time.perf_counter() - start, attempt, str(e)), None
+            # Exponential backoff with jitter, or what the server asked for.
+            delay = e.retry_after if e.retry_after is not None else backoff * 2 ** (attempt - 1)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5) if e.retry_after is None else delay)
+            continue
+        except Exception as e:
+            return FetchResult(name, url, path, 'error', 0, time.perf_counter() - start, attempt, repr(e)), None
+        seconds = time.perf_counter() - start
+        if status == 304:
+            return FetchResult(name, url, path, 'unchanged', 0, seconds, attempt, None), None
+        new_entry = {'url': url, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified'),
+                     'bytes': size, 'blake2b': digest}
+        return FetchResult(name, url, path, 'downloaded', size, seconds, attempt, None), new_entry
+
+async def refresh_async(sources, dest_dir, connections=8, retries=3, backoff=0.5, timeout=60,
+                        chunk_size=CHUNK_SIZE, force=False):
+    '''
+    Fetch every source concurrently, downloading only files that changed.
+
+    Requests carry the ETag and Last-Modified of the last download
+    (If-None-Match / If-Modified-Since), so an unchanged file costs one
+    304 response. Bodies stream to disk in chunk_size blocks and replace
+    the old file only once complete. Connection errors, timeouts, short
+    bodies and 408/429/5xx responses are retried with exponential backoff.
+
+    The event loop only schedules the work: each GET is a blocking urllib
+    call in a thread of a connections-sized pool, so the concurrency comes
+    from those threads, and every request opens its own connection (no
+    keep-alive or connection reuse).
+
+    Parameters
+    ----------
+    sources: list of str or (url, name) pairs
+        name None picks one from the url, see source_names.
+    dest_dir: str
+    connections: int
+        Downloads in flight at once.
+    retries: int
+        Retries after the first attempt.
+    backoff: float
+        First retry delay in seconds, doubled for each further retry.
+    timeout: float
+        Socket timeout in seconds.
+    chunk_size: int
+    force: bool
+        Download even if the server says the file is unchanged.
+
+    Returns
+    -------
+    list of FetchResult in sources order
+    '''
+    sources = [(s, None) if isinstance(s, str) else tuple(s) for s in sources]
+    urls = [url for url, _ in sources]
+    names = [name or default for (_, name), default in zip(sources, source_names(urls))]
+    os.makedirs(dest_dir, exist_ok=True)
+    manifest = _load_manifest(dest_dir)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        fetched = await asyncio.gather(*[
+            _fetch(loop, pool, name, url, dest_dir, manifest.get(name, {}), retries, backoff, timeout,
+                   chunk_size, force) for name, url in zip(names, urls)])
+    for result, entry in fetched:
+        if entry is not None:
+            manifest[result.name] = entry
+    _save_manifest(dest_dir, manifest)
+    return [result for result, _ in fetched]
+
+def refresh(sources, dest_dir, **kwargs):
+    '''
+    Blocking refresh_async, for scripts and notebooks without a running
+    event loop.
+    '''
+    return asyncio.run(refresh_async(sources, dest_dir, **kwargs))
+
+def iter_remote_chunks(url, chunksize=100000, subset=('swe',), timeout=60):
+    '''
+    Parse a remote csv as it downloads, without saving it, like
+    streaming.iter_clean_chunks for a local file.
+
+    Returns
+    -------
+    Generator of cleaned (unsorted) dataframes
+    '''
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        yield from iter_clean_chunks(response, chunksize, subset)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Download snow survey csvs from a data portal or mirror, '
+                                                 'skipping files that have not changed.')
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--sources', default=None, help='file with one url (and optional name) per line')
+    parser.add_argument('--dest', default='data')
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--force', action='store_true')
+    args = parser.parse_args()
+
+    sources = [(url, None) for url in args.urls] + (read_sources(args.sources) if args.sources else [])
+    if not sources:
+        parser.error('give urls or --sources')
+    results = refresh(sources, args.dest, connections=args.connections, retries=args.retries,
+                      timeout=args.timeout, force=args.force)
+    for r in results:
+        print('{:40} {:10} {:>12} bytes {:6.2f}s {}'.format(r.name, r.status, r.bytes, r.seconds, r.error or ''))
+    raise SystemExit(1 if any(r.status == 'error' for r in results) else 0)
@@ -0,0 +1,235 @@
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger('swe.instrumentation')
+
+# Module state, shared by every thread. Stages record nothing unless enable()
+# has been called (or SWE_INSTRUMENT=1 is set); a disabled stage costs one
+# flag check before calling straight through.
+_config = {'enabled': False, 'memory': True, 'profile': frozenset(), 'profile_dir': 'profiles'}
+_records = []
+_records_lock = threading.Lock()
+_local = threading.local()
+
+def enable(memory=True, profile=(), profile_dir='profiles'):
+    '''
+    Start recording stage timings.
+
+    Parameters
+    ----------
+    memory: bool
+        Trace allocations to report each stage's peak memory. tracemalloc
+        slows allocation heavy code noticeably, turn it off for pure timings.
+    profile: list of str or True
+        Stage names to run under cProfile, True for every stage. Profiles are
+        dumped to profile_dir as <stage>-<n>.prof for pstats/snakeviz.
+    profile_dir: str
+    '''
+    _config['memory'] = memory
+    _config['profile'] = True if profile is True else frozenset(profile)
+    _config['profile_dir'] = profile_dir
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _config['started_tracing'] = True
+    _config['enabled'] = True
+
+def disable():
+    '''
+    Stop recording. Records collected so far are kept until reset().
+    '''
+    _config['enabled'] = False
+    if _config.pop('started_tracing', False):
+        tracemalloc.stop()
+
+def enabled():
+    return _config['enabled']
+
+def reset():
+    with _records_lock:
+        del _records[:]
+
+def records():
+    '''
+    Copies of every stage record in completion order. Each is a dictionary
+    with stage, parent, wall_s, cpu_s, rows, peak_mb, profile and thread.
+    '''
+    with _records_lock:
+        return [dict(r) for r in _records]
+
+def _count_rows(result, args):
+    for value in (result,) + tuple(args[:1]):
+        shape = getattr(value, 'shape', None)
+        if shape:
+            return int(shape[0])
+        if isinstance(value, (list, tuple)):
+            return len(value)
+    return None
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _profile_this(name):
+    wanted = _config['profile']
+    if not (wanted is True or name in wanted):
+        return False
+    # cProfile can't nest, an enclosing profiled stage already covers this one.
+    return not any(frame['profiling'] for frame in _stack())
+
+@contextmanager
+def timed(name, rows=None):
+    '''
+    Record the enclosed block as a stage. The yielded dictionary is the
+    record, set record['rows'] inside the block when the row count is only
+    known there.
+
+    Parameters
+    ----------
+    name: str
+    rows: int or None
+    '''
+    if not _config['enabled']:
+        yield {}
+        return
+    stack = _stack()
+    record = {'stage': name, 'parent': stack[-1]['record']['stage'] if stack else None, 'rows': rows,
+              'thread': threading.current_thread().name}
+    tracing = _config['memory'] and tracemalloc.is_tracing()
+    frame = {'record': record, 'peak': 0, 'profiling': _profile_this(name)}
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['start_mem'] = current
+    profiler = cProfile.Profile() if frame['profiling'] else None
+    stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record['wall_s'] = time.perf_counter() - wall
+        record['cpu_s'] = time.process_time() - cpu
+        stack.pop()
+        record['peak_mb'] = None
+        if tracing and tracemalloc.is_tracing():
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = (peak - frame['start_mem']) / 1e6
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        record['profile'] = None
+        if profiler is not None:
+            record['profile'] = _dump_profile(profiler, name)
+        with _records_lock:
+            _records.append(record)
+        logger.debug(json.dumps(record))
+
+def _dump_profile(profiler, name):
+    os.makedirs(_config['profile_dir'], exist_ok=True)
+    with _records_lock:
+        n = sum(1 for r in _records if r['stage'] == name)
+    path = os.path.join(_config['profile_dir'], '{}-{}.prof'.format(name.replace('/', '_'), n))
+    profiler.dump_stats(path)
+    return path
+
+def stage(name=None, rows=None):
+    '''
+    Decorator recording each call of a function as a stage, see timed.
+
+    Parameters
+    ----------
+    name: str or None
+        Defaults to the function's qualified name.
+    rows: callable or None
+        rows(result, args, kwargs) -> int. By default the length of a
+        returned frame/array/list, else of the first argument.
+    '''
+    def decorate(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _config['enabled']:
+                return func(*args, **kwargs)
+            with timed(stage_name) as record:
+                result = func(*args, **kwargs)
+                record['rows'] = rows(result, args, kwargs) if rows else _count_rows(result, args)
+            return result
+        return wrapper
+    return decorate
+
+def summary(recs=None):
+    '''
+    Totals per stage: calls, wall and cpu seconds, rows and the largest peak.
+
+    Returns
+    -------
+    List of dictionaries sorted by total wall time, slowest first
+    '''
+    totals = {}
+    for r in records() if recs is None else recs:
+        t = totals.setdefault(r['stage'], {'stage': r['stage'], 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                           'rows': 0, 'peak_mb': None})
+        t['calls'] += 1
+        t['wall_s'] += r['wall_s']
+        t['cpu_s'] += r['cpu_s']
+        t['rows'] += r['rows'] or 0
+        if r['peak_mb'] is not None:
+            t['peak_mb'] = max(t['peak_mb'] or 0.0, r['peak_mb'])
+    return sorted(totals.values(), key=lambda t: -t['wall_s'])
+
+def write_report(path):
+    '''
+    Write every record plus the per-stage summary as JSON.
+    '''
+    recs = records()
+    with open(path, 'w') as f:
+        json.dump({'records': recs, 'summary': summary(recs)}, f, indent=1)
+    return path
+
+def format_summary(recs=None):
+    lines = ['{:32} {:>6} {:>10} {:>10} {:>10} {:>10}'.format('stage', 'calls', 'wall s', 'cpu s', 'rows',
+                                                               'peak MB')]
+    for t in summary(recs):
+        peak = '' if t['peak_mb'] is None else '{:.1f}'.format(t['peak_mb'])
+        lines.append('{:32} {:>6} {:>10.4f} {:>10.4f} {:>10} {:>10}'.format(
+            t['stage'], t['calls'], t['wall_s'], t['cpu_s'], t['rows'], peak))
+    return '\n'.join(lines)
+
+if os.environ.get('SWE_INSTRUMENT', '0') != '0':
+    enable(memory=os.environ.get('SWE_INSTRUMENT_MEMORY', '1') != '0',
+           profile=[s for s in os.environ.get('SWE_PROFILE', '').split(',') if s])
+
+if __name__ == '__main__':
+    import argparse
+    # Use the module the pipeline imported, not this __main__ copy of it.
+    import instrumentation
+    from benchmark import pipeline_stages
+    parser = argparse.ArgumentParser(description='Run the SWE pipeline once with stage instrumentation.')
+    parser.add_argument('csv')
+    parser.add_argument('--report', default='instrumentation.json')
+    parser.add_argument('--profile', nargs='*', default=[], help='stage names to run under cProfile')
+    parser.add_argument('--profile-dir', default='profiles')
+    parser.add_argument('--no-memory', action='store_true')
+    args = parser.parse_args()
+
+    instrumentation.enable(memory=not args.no_memory, profile=args.profile, profile_dir=args.profile_dir)
+    outputs = {}
+    for name, func in pipeline_stages(args.csv):
+        outputs[name] = func(outputs)
+    instrumentation.disable()
+    instrumentation.write_report(args.report)
+    print(instrumentation.format_summary())
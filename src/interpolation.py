@@ -0,0 +1,230 @@
+import math
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from aggregation import DATE_PARTS, aggregate_matrix, date_values
+from site_locations import SITE_LOCATIONS, LTER_BOUNDS, display_name, to_meters
+
+def site_lat_lon(sites):
+    '''
+    (n, 2) array of (lat, lon) for csv labels or SITE_LOCATIONS names.
+    '''
+    lat_lon = []
+    for site in sites:
+        try:
+            lat_lon.append(SITE_LOCATIONS[display_name(site)])
+        except KeyError:
+            raise ValueError('no location for site {!r}, add it to site_locations.SITE_LOCATIONS'.format(site))
+    return np.array(lat_lon, dtype=float).reshape(-1, 2)
+
+def site_points(sites):
+    '''
+    (n, 2) array of site positions in meters, for csv labels or
+    SITE_LOCATIONS names. Raises ValueError for a site without a location.
+    '''
+    lat_lon = site_lat_lon(sites)
+    return np.column_stack(to_meters(lat_lon[:, 0], lat_lon[:, 1]))
+
+class Grid(object):
+    '''
+    Regular lat/lon grid over a bounding box, with cell centers in meters.
+    '''
+    def __init__(self, bounds=LTER_BOUNDS, shape=(90, 200)):
+        '''
+        Parameters
+        ----------
+        bounds: two (lat, lon) corners, defaults to the LTER rectangle
+        shape: (ny, nx)
+        '''
+        lats = sorted(corner[0] for corner in bounds)
+        lons = sorted(corner[1] for corner in bounds)
+        self.shape = tuple(shape)
+        self.lat = np.linspace(lats[1], lats[0], shape[0])
+        self.lon = np.linspace(lons[0], lons[1], shape[1])
+        lon, lat = np.meshgrid(self.lon, self.lat)
+        self.points = np.column_stack([a.ravel() for a in to_meters(lat, lon)])
+
+    def __repr__(self):
+        return 'Grid(shape={}, lat=({:.4f}, {:.4f}), lon=({:.4f}, {:.4f}))'.format(
+            self.shape, self.lat[-1], self.lat[0], self.lon[0], self.lon[-1])
+
+    @property
+    def extent(self):
+        '''
+        (lon_min, lon_max, lat_min, lat_max) for imshow, rows run north to south.
+        '''
+        return (self.lon[0], self.lon[-1], self.lat[-1], self.lat[0])
+
+def site_matrix(df, by='water_year', column='swe', stat='mean'):
+    '''
+    Per-site aggregates for each time step, the input to interpolate.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    by: str
+        A date part ('year', 'water_year', ...) or a pandas frequency such as
+        'D' or 'W' for per-date means.
+    column: str
+    stat: str
+        Statistic for date parts; frequencies always use the mean.
+
+    Returns
+    -------
+    pandas DataFrame, sites x time steps
+    '''
+    if by in DATE_PARTS:
+        return aggregate_matrix(df, by=by, column=column, stat=stat)
+    frame = pd.DataFrame({'site': df['local_site'].astype(object), 'date': date_values(df),
+                          'value': df[column].to_numpy(dtype=float)})
+    frame = frame[frame['site'].notna()]
+    grouped = frame.groupby(['site', pd.Grouper(key='date', freq=by)])['value'].mean()
+    return grouped.unstack('date')
+
+def idw_weights(sites_xy, grid_xy, power=2.0, k=None, max_distance=None):
+    '''
+    Inverse distance weights from every site to every grid point, dense
+    (grid points x sites) with zeros outside each point's k nearest sites.
+
+    Parameters
+    ----------
+    sites_xy: (n, 2) array
+    grid_xy: (g, 2) array
+    power: float
+    k: int or None
+        Nearest sites used per grid point, all by default.
+    max_distance: float or None
+        Ignore sites farther than this many meters.
+
+    Returns
+    -------
+    (g, n) array
+    '''
+    n = len(sites_xy)
+    k = n if k is None else min(k, n)
+    tree = cKDTree(sites_xy)
+    distance, index = tree.query(grid_xy, k=k, distance_upper_bound=np.inf if max_distance is None else max_distance)
+    distance, index = distance.reshape(len(grid_xy), k), index.reshape(len(grid_xy), k)
+    found = index < n
+    # A grid point on top of a site takes that site's value.
+    weights = np.where(found, 1.0 / np.maximum(distance, 1e-6) ** power, 0.0)
+    dense = np.zeros((len(grid_xy), n))
+    rows = np.repeat(np.arange(len(grid_xy)), k)
+    dense[rows[found.ravel()], index.ravel()[found.ravel()]] = weights.ravel()[found.ravel()]
+    return dense
+
+def gp_weights(sites_xy, grid_xy, mask, length_scale=1500.0, nugget=0.05):
+    '''
+    Simple kriging weights with a Gaussian (RBF) covariance for the sites
+    in mask, so prediction = mean + weights @ (values - mean).
+
+    Parameters
+    ----------
+    sites_xy: (n, 2) array
+    grid_xy: (g, 2) array
+    mask: boolean array, sites with data
+    length_scale: float
+        Correlation length in meters.
+    nugget: float
+        Noise variance relative to the signal variance, keeps the solve
+        stable and lets the surface miss noisy sites slightly.
+
+    Returns
+    -------
+    (g, mask.sum()) array
+    '''
+    xy = sites_xy[mask]
+    d_ss = np.linalg.norm(xy[:, None, :] - xy[None, :, :], axis=-1)
+    d_gs = np.linalg.norm(grid_xy[:, None, :] - xy[None, :, :], axis=-1)
+    k_ss = np.exp(-0.5 * (d_ss / length_scale) ** 2) + nugget * np.eye(len(xy))
+    k_gs = np.exp(-0.5 * (d_gs / length_scale) ** 2)
+    return np.linalg.solve(k_ss, k_gs.T).T
+
+def interpolate(matrix, grid=None, method='idw', power=2.0, k=None, max_distance=None, length_scale=1500.0,
+                nugget=0.05):
+    '''
+    Gridded surfaces for every time step of a site x time matrix at once.
+
+    IDW builds one weight matrix from a KD-tree neighbor search and applies
+    it to all time steps with two matrix products, masking sites missing at
+    a step. method='gp' does simple kriging around each step's site mean,
+    solving once per distinct pattern of reporting sites.
+
+    Parameters
+    ----------
+    matrix: pandas DataFrame, sites x time steps (site_matrix)
+    grid: Grid or None
+    method: str
+        'idw' or 'gp'.
+    power, k, max_distance:
+        See idw_weights.
+    length_scale, nugget:
+        See gp_weights.
+
+    Returns
+    -------
+    (time steps, ny, nx) float array, NaN where no site contributes
+    '''
+    grid = grid or Grid()
+    sites_xy = site_points(matrix.index)
+    values = matrix.to_numpy(dtype=float).T
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    if method == 'idw':
+        weights = idw_weights(sites_xy, grid.points, power, k, max_distance)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            surfaces = (filled @ weights.T) / (present.astype(float) @ weights.T)
+    elif method == 'gp':
+        surfaces = np.full((len(values), len(grid.points)), np.nan)
+        patterns, inverse = np.unique(present, axis=0, return_inverse=True)
+        for p, mask in enumerate(patterns):
+            if not mask.any():
+                continue
+            steps = np.flatnonzero(inverse.ravel() == p)
+            w = gp_weights(sites_xy, grid.points, mask, length_scale, nugget)
+            mean = values[np.ix_(steps, mask)].mean(axis=1, keepdims=True)
+            surfaces[steps] = mean + (values[np.ix_(steps, mask)] - mean) @ w.T
+    else:
+        raise ValueError("method must be 'idw' or 'gp', got {!r}".format(method))
+    return surfaces.reshape((len(values),) + grid.shape)
+
+def surface_frames(matrix, surfaces, grid, vmax=None, figsize=(10, 4.5), cmap='Blues'):
+    '''
+    One figure per time step of interpolated surfaces with the sites on top,
+    made lazily for animation.write_animation.
+
+    Returns
+    -------
+    Generator of matplotlib figures
+    '''
+    from matplotlib.figure import Figure
+    sites_lat_lon = site_lat_lon(matrix.index)
+    vmax = np.nanmax(surfaces) if vmax is None else vmax
+    aspect = 1 / math.cos(math.radians(grid.lat.mean()))
+    for step, surface in zip(matrix.columns, surfaces):
+        fig = Figure(figsize=figsize)
+        ax = fig.add_axes([0.02, 0.05, 0.85, 0.85])
+        image = ax.imshow(surface, extent=grid.extent, cmap=cmap, vmin=0, vmax=vmax, aspect=aspect)
+        ax.scatter(sites_lat_lon[:, 1], sites_lat_lon[:, 0], c='black', s=12)
+        ax.set_title('SWE (m) - {}'.format(step), fontsize=16)
+        ax.set_axis_off()
+        fig.colorbar(image, cax=fig.add_axes([0.89, 0.1, 0.02, 0.75]))
+        yield fig
+
+if __name__ == '__main__':
+    import argparse
+    from animation import write_animation
+    from data_cleaning import load_swe_df
+    parser = argparse.ArgumentParser(description='Interpolate site SWE onto a grid and animate it.')
+    parser.add_argument('--csv', default=None, help='defaults to data_cleaning.DEFAULT_CSV')
+    parser.add_argument('--by', default='water_year', help="date part or pandas frequency, e.g. 'W'")
+    parser.add_argument('--method', default='idw', choices=['idw', 'gp'])
+    parser.add_argument('--shape', type=int, nargs=2, default=[90, 200], metavar=('NY', 'NX'))
+    parser.add_argument('--gif', default='images/swe_surface.gif')
+    parser.add_argument('--duration', type=float, default=0.5)
+    args = parser.parse_args()
+
+    matrix = site_matrix(load_swe_df(args.csv), by=args.by)
+    grid = Grid(shape=args.shape)
+    surfaces = interpolate(matrix, grid, method=args.method)
+    write_animation(surface_frames(matrix, surfaces, grid), args.gif, duration=args.duration, dpi=80)
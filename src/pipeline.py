@@ -0,0 +1,379 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import matplotlib
+matplotlib.use('Agg')
+import aggregation
+import data_cleaning
+from aggregation import aggregate_matrix
+from figures import DEFAULT_DPIS, TOP_SITES, FigureJob, render_job
+from frame_cache import CACHE_DIR, _recorded_fingerprint
+from sample_site_class import SampleSite, build_sample_sites
+from site_locations import COLOR_DICT, display_name
+from trends import trend_table
+
+# Bump to invalidate every cached stage output.
+PIPELINE_VERSION = 1
+MANIFEST = 'manifest.json'
+
+# func is called with the outputs of deps (in order) followed by params as
+# keyword arguments. code lists the functions or classes whose source is
+# part of the cache key besides func, e.g. the plotting function a figure
+# stage calls. Stages are pickled to worker processes, so no modules.
+# files stages return a list of written paths that must still exist for a
+# cached result to count.
+Stage = namedtuple('Stage', ['name', 'func', 'deps', 'params', 'code', 'files'])
+
+# What mean_series, aggregate and aggregate_matrix run through.
+AGGREGATION_CODE = [aggregation.date_values, aggregation.date_part, aggregation._group_key, aggregation.aggregate,
+                    aggregation.year_range, aggregation.aggregate_matrix, aggregation.mean_series]
+
+def load_stage(csv):
+    return data_cleaning.import_csv_pd(csv)
+
+def clean_stage(raw, validate=False):
+    return data_cleaning.clean_frame(raw, validate=validate)
+
+def sites_stage(df):
+    return build_sample_sites(df)
+
+def yearly_means_stage(sites):
+    return [obj.yearly_mean_swe() for obj in sites]
+
+def monthly_means_stage(sites):
+    return [obj.monthly_mean_swe() for obj in sites]
+
+def combined_means_stage(df):
+    return data_cleaning.get_yearly_means_of_all_sites(df)
+
+def year_matrix_stage(df):
+    return aggregate_matrix(df, by='year')
+
+def trends_stage(matrix):
+    return trend_table(matrix)
+
+def figure_stage(*inputs, name, builder, sizes, out_dir, dpis):
+    os.makedirs(out_dir, exist_ok=True)
+    return render_job(FigureJob(name, builder, inputs, [None if s is None else tuple(s) for s in sizes]),
+                      out_dir, dpis)
+
+def all_sites_figure_stage(sites, max_points, **kwargs):
+    return figure_stage(sites, [obj.site_name for obj in sites], max_points, **kwargs)
+
+def top_trends_figure_stage(matrix, trends, top_sites, **kwargs):
+    top = [name for name in top_sites if name in matrix.index][:6]
+    colors = [COLOR_DICT[display_name(name)] for name in top]
+    return figure_stage(matrix.loc[top], trends.loc[top], top, colors, **kwargs)
+
+def site_map_stage(path, duration):
+    from animation import write_animation
+    from static_map import highlight_frames
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    write_animation(highlight_frames(workers=1), path, duration=duration, loop=20)
+    return [path]
+
+def season_gif_stage(df, path, duration):
+    from animation import season_frames, write_animation
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    write_animation(season_frames(df), path, duration=duration, dpi=80)
+    return [path]
+
+def report_stages(csv=None, out_dir='images', dpis=DEFAULT_DPIS, validate=False, top_sites=TOP_SITES):
+    '''
+    The report pipeline as a dependency graph:
+    load -> clean -> sites -> means/aggregates -> trends -> figures and gifs.
+
+    Parameters
+    ----------
+    csv: str or None
+        Defaults to data_cleaning.DEFAULT_CSV.
+    out_dir: str
+        Folder for figures and gifs.
+    dpis: list of int
+    validate: bool
+        Drop rows breaking the validation rules while cleaning.
+    top_sites: list of str
+
+    Returns
+    -------
+    List of Stage in dependency order
+    '''
+    from animation import season_frames, write_animation
+    from static_map import highlight_frames
+    csv = os.path.abspath(csv or data_cleaning.DEFAULT_CSV)
+    figure = dict(out_dir=out_dir, dpis=list(dpis))
+    plot = lambda builder: getattr(data_cleaning, builder)
+    return [
+        Stage('load', load_stage, [], dict(csv=csv), [data_cleaning.import_csv_pd], False),
+        Stage('clean', clean_stage, ['load'], dict(validate=validate), [data_cleaning.clean_frame], False),
+        Stage('sites', sites_stage, ['clean'], {}, [build_sample_sites, SampleSite], False),
+        Stage('yearly_means', yearly_means_stage, ['sites'], {}, [SampleSite] + AGGREGATION_CODE, False),
+        Stage('monthly_means', monthly_means_stage, ['sites'], {}, [SampleSite] + AGGREGATION_CODE, False),
+        Stage('combined_means', combined_means_stage, ['clean'], {},
+              [data_cleaning.get_yearly_means_of_all_sites] + AGGREGATION_CODE, False),
+        Stage('year_matrix', year_matrix_stage, ['clean'], {}, AGGREGATION_CODE, False),
+        Stage('trends', trends_stage, ['year_matrix'], {}, [trend_table], False),
+        Stage('fig_yearly', figure_stage, ['yearly_means'],
+              dict(figure, name='average_yearly_swe_allsites', builder='plot_yearly_mean_swe', sizes=[None]),
+              [plot('plot_yearly_mean_swe'), render_job], True),
+        Stage('fig_monthly', figure_stage, ['monthly_means'],
+              dict(figure, name='monthly_means', builder='plot_monthly_mean_swe', sizes=[None, (8, 4)]),
+              [plot('plot_monthly_mean_swe'), render_job], True),
+        Stage('fig_combined', figure_stage, ['combined_means'],
+              dict(figure, name='average_yearly_swe_combined', builder='plot_combined_yearly_swe',
+                   sizes=[None, (10, 6)]),
+              [plot('plot_combined_yearly_swe'), render_job], True),
+        Stage('fig_composition', figure_stage, ['sites'],
+              dict(figure, name='sample_site_composition', builder='plot_site_composition', sizes=[None]),
+              [plot('plot_site_composition'), render_job], True),
+        Stage('fig_top_trends', top_trends_figure_stage, ['year_matrix', 'trends'],
+              dict(figure, top_sites=list(top_sites), name='average_yearly_swe_top6_',
+                   builder='plot_top_sites_trends', sizes=[None, (12, 7)]),
+              [plot('plot_top_sites_trends'), figure_stage, render_job], True),
+        Stage('fig_all_sites', all_sites_figure_stage, ['sites'],
+              dict(figure, max_points=2000, name='all_sites', builder='plot_all_sites', sizes=[None]),
+              [plot('plot_all_sites'), figure_stage, render_job], True),
+        Stage('site_map_gif', site_map_stage, [],
+              dict(path=os.path.join(out_dir, 'sites_black_loop.gif'), duration=1.0),
+              [highlight_frames, write_animation], True),
+        Stage('season_gif', season_gif_stage, ['clean'],
+              dict(path=os.path.join(out_dir, 'season_means.gif'), duration=0.5),
+              [season_frames, write_animation], True),
+    ]
+
+def _source_digest(functions):
+    digest = hashlib.blake2b(digest_size=16)
+    for func in functions:
+        try:
+            digest.update(inspect.getsource(func).encode())
+        except (OSError, TypeError):
+            digest.update(getattr(func, '__qualname__', repr(func)).encode())
+    return digest.hexdigest()
+
+def stage_key(stage, dep_digests):
+    '''
+    Cache key of a stage: its code, parameters and the content digests of
+    its inputs. The load stage also hashes its source file.
+    '''
+    payload = {'version': PIPELINE_VERSION, 'name': stage.name, 'params': stage.params, 'deps': dep_digests,
+               'code': _source_digest([stage.func] + list(stage.code))}
+    if 'csv' in stage.params:
+        payload['source'] = _recorded_fingerprint(stage.params['csv'], CACHE_DIR)['blake2b']
+    blob = json.dumps(payload, sort_keys=True, default=repr).encode()
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+def _output_path(cache_dir, stage, key):
+    return os.path.join(cache_dir, '{}-{}.pkl'.format(stage.name, key))
+
+def _read_output(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def run_stage(stage, key, dep_paths, cache_dir, memo=None):
+    '''
+    Run one stage on its cached inputs and store its output.
+
+    Module level so it can run in a worker process. Inputs are read from
+    the cache files rather than sent from the parent.
+
+    Returns
+    -------
+    (content digest of the output, seconds taken)
+    '''
+    start = time.perf_counter()
+    memo = {} if memo is None else memo
+    inputs = []
+    for path in dep_paths:
+        if path not in memo:
+            memo[path] = _read_output(path)
+        inputs.append(memo[path])
+    result = stage.func(*inputs, **stage.params)
+    blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    path = _output_path(cache_dir, stage, key)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(blob)
+    os.replace(tmp, path)
+    memo[path] = result
+    return hashlib.blake2b(blob, digest_size=16).hexdigest(), time.perf_counter() - start
+
+def _load_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def _cached(stage, key, manifest, cache_dir):
+    entry = manifest.get(stage.name)
+    if not entry or entry['key'] != key or not os.path.exists(_output_path(cache_dir, stage, key)):
+        return False
+    return not stage.files or all(os.path.exists(p) for p in entry.get('files', []))
+
+def select_stages(stages, only=None):
+    '''
+    The named stages and everything they depend on, in dependency order.
+    '''
+    if not only:
+        return list(stages)
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [name for name in only if name not in by_name]
+    if unknown:
+        raise KeyError('unknown stages {}, have {}'.format(unknown, list(by_name)))
+    needed = set()
+    todo = list(only)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].deps)
+    return [stage for stage in stages if stage.name in needed]
+
+def run_pipeline(stages, cache_dir=None, workers=None, only=None, force=(), verbose=False):
+    '''
+    Run a stage graph, reusing stored outputs of stages whose code,
+    parameters and inputs are unchanged.
+
+    Each output is pickled under cache_dir and its content digest, not just
+    its key, feeds the keys of the stages after it, so a stage that re-runs
+    and produces the same result leaves everything downstream cached.
+    Stages whose inputs are ready run concurrently in a process pool.
+
+    Parameters
+    ----------
+    stages: list of Stage (see report_stages)
+    cache_dir: str or None
+        Defaults to frame_cache.CACHE_DIR/pipeline.
+    workers: int or None
+        Process count, defaults to os.cpu_count(). 1 runs every stage in this
+        process, sharing loaded inputs between stages.
+    only: list of str or None
+        Run just these stages and what they depend on.
+    force: list of str or True
+        Stages to re-run even when cached, True for all.
+    verbose: bool
+        Print each stage as it finishes.
+
+    Returns
+    -------
+    Dictionary of stage name -> (state, seconds), state is 'cached', 'ran',
+    'error: ...' or 'skipped' (an input failed)
+    '''
+    cache_dir = cache_dir or os.path.join(CACHE_DIR, 'pipeline')
+    os.makedirs(cache_dir, exist_ok=True)
+    stages = select_stages(stages, only)
+    names = {stage.name for stage in stages}
+    missing = sorted({dep for stage in stages for dep in stage.deps} - names)
+    if missing:
+        raise KeyError('stages depend on undefined stages {}'.format(missing))
+    manifest = _load_manifest(cache_dir)
+    status, digests, paths, keys = {}, {}, {}, {}
+    memo = {}
+    pool = None if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    running = {}
+
+    def finish(stage, state, seconds):
+        status[stage.name] = (state, seconds)
+        if verbose:
+            print('{:20} {:8} {:.3f}s'.format(stage.name, state, seconds))
+
+    def record(stage, result):
+        digest, seconds = result
+        digests[stage.name] = digest
+        paths[stage.name] = _output_path(cache_dir, stage, keys[stage.name])
+        entry = {'key': keys[stage.name], 'digest': digest}
+        if stage.files:
+            entry['files'] = memo[paths[stage.name]] if paths[stage.name] in memo else \
+                _read_output(paths[stage.name])
+        manifest[stage.name] = entry
+        finish(stage, 'ran', seconds)
+
+    try:
+        waiting = list(stages)
+        while waiting or running:
+            for stage in list(waiting):
+                if any(dep in status and status[dep][0] not in ('cached', 'ran') for dep in stage.deps):
+                    waiting.remove(stage)
+                    finish(stage, 'skipped', 0.0)
+                    continue
+                if not all(dep in digests for dep in stage.deps):
+                    continue
+                waiting.remove(stage)
+                start = time.perf_counter()
+                key = keys[stage.name] = stage_key(stage, [digests[dep] for dep in stage.deps])
+                forced = force is True or stage.name in force
+                if not forced and _cached(stage, key, manifest, cache_dir):
+                    digests[stage.name] = manifest[stage.name]['digest']
+                    paths[stage.name] = _output_path(cache_dir, stage, key)
+                    finish(stage, 'cached', time.perf_counter() - start)
+                    continue
+                dep_paths = [paths[dep] for dep in stage.deps]
+                if pool is None:
+                    try:
+                        record(stage, run_stage(stage, key, dep_paths, cache_dir, memo))
+                    except Exception as e:
+                        finish(stage, 'error: {!r}'.format(e), time.perf_counter() - start)
+                else:
+                    running[pool.submit(run_stage, stage, key, dep_paths, cache_dir)] = stage
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        record(stage, future.result())
+                    except Exception as e:
+                        finish(stage, 'error: {!r}'.format(e), 0.0)
+            _save_manifest(cache_dir, manifest)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return status
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the SWE report: clean, aggregate, fit trends and draw '
+                                                 'figures, re-running only stages whose inputs changed.')
+    parser.add_argument('--csv', default=None, help='defaults to data_cleaning.DEFAULT_CSV')
+    parser.add_argument('--out', default='images', help='folder for figures and gifs')
+    parser.add_argument('--dpi', type=int, action='append', help='repeat for several dpis (default 80 and 125)')
+    parser.add_argument('--validate', action='store_true', help='drop rows breaking the validation rules')
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--only', nargs='+', default=None, metavar='STAGE',
+                        help='run these stages and their inputs')
+    parser.add_argument('--force', nargs='*', default=None, metavar='STAGE',
+                        help='re-run these stages even if cached, all stages when none are named')
+    parser.add_argument('--list', action='store_true', help='list the stages and exit')
+    args = parser.parse_args(argv)
+
+    stages = report_stages(args.csv, args.out, args.dpi or DEFAULT_DPIS, args.validate)
+    if args.list:
+        for stage in stages:
+            print('{:20} <- {}'.format(stage.name, ', '.join(stage.deps) or '-'))
+        return 0
+    force = () if args.force is None else (args.force or True)
+    unknown = sorted((set(args.only or []) | set(force if force is not True else [])) - {s.name for s in stages})
+    if unknown:
+        parser.error('unknown stages {}, see --list'.format(', '.join(unknown)))
+    try:
+        status = run_pipeline(stages, args.cache_dir, args.workers, args.only, force, verbose=True)
+    except FileNotFoundError as e:
+        parser.error('cannot read {}: {}'.format(e.filename, e.strerror))
+    failed = [name for name, (state, _) in status.items() if state not in ('cached', 'ran')]
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from aggregation import date_part, date_values
+from sample_site_class import partition_sites
+
+def _day_numbers(df):
+    '''
+    int64 days since 1970-01-01 for every row of df.
+    '''
+    if 'day' in df.columns:
+        return df['day'].to_numpy().astype(np.int64)
+    return date_values(df).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def _to_day(value):
+    if value is None:
+        return None
+    return int(np.datetime64(pd.Timestamp(value), 'D').astype(np.int64))
+
+class SWEIndex(object):
+    '''
+    Date and site index over a cleaned frame sorted by date (clean_swe_df
+    order), answering range queries with binary searches instead of scans.
+
+    The frame is partitioned by site once (partition_sites), and each site's
+    block stays in date order, so "site X between A and B" is two
+    searchsorted calls inside the site's block and a positional slice.
+    Queries without sites search the original frame's date column.
+    '''
+    def __init__(self, df, site_col='local_site'):
+        days = _day_numbers(df)
+        if len(days) and (np.diff(days) < 0).any():
+            raise ValueError('SWEIndex needs a frame sorted by date, see clean_swe_df')
+        self.df = df
+        self.site_col = site_col
+        self.days = days
+        self.parts, names, self.offsets = partition_sites(df, site_col)
+        self.part_days = _day_numbers(self.parts)
+        self.sites = {name: i for i, name in enumerate(names)}
+
+    def __repr__(self):
+        return 'SWEIndex(rows={}, sites={})'.format(len(self.df), len(self.sites))
+
+    def _bounds(self, days, lo, hi, start, end):
+        if start is not None:
+            lo = lo + int(np.searchsorted(days[lo:hi], start, side='left'))
+        if end is not None:
+            hi = lo + int(np.searchsorted(days[lo:hi], end, side='right'))
+        return lo, max(lo, hi)
+
+    def site_range(self, site, start=None, end=None):
+        '''
+        Positional bounds of one site's rows between two dates.
+
+        Parameters
+        ----------
+        site: str
+        start, end: date-like or None
+            Inclusive bounds, open when None.
+
+        Returns
+        -------
+        (lo, hi) so the rows are self.parts.iloc[lo:hi]
+        '''
+        try:
+            i = self.sites[site]
+        except KeyError:
+            raise KeyError('no site {!r}, have {}'.format(site, sorted(self.sites)))
+        return self._bounds(self.part_days, self.offsets[i], self.offsets[i + 1], _to_day(start), _to_day(end))
+
+    def query(self, sites=None, start=None, end=None, months=None, samp_loc=None):
+        '''
+        Rows for some sites between two dates, optionally restricted to
+        months and sample locations.
+
+        A single site, or no sites, with only a date range is a slice of the
+        indexed frame and copies nothing. Several sites are concatenated in
+        the order given. months and samp_loc are applied as masks over the
+        already narrowed rows only.
+
+        Parameters
+        ----------
+        sites: str, list of str or None
+            None for every row, including rows with no site label.
+        start, end: date-like or None
+            Inclusive bounds, e.g. '2005-01-01' or a Timestamp.
+        months: int, list of int or None
+            Calendar months (1-12) to keep.
+        samp_loc: str, list of str or None
+            Sample locations to keep.
+
+        Returns
+        -------
+        pandas dataframe
+        '''
+        start, end = _to_day(start), _to_day(end)
+        if sites is None:
+            lo, hi = self._bounds(self.days, 0, len(self.days), start, end)
+            out = self.df.iloc[lo:hi]
+        else:
+            if isinstance(sites, str):
+                sites = [sites]
+            slices = []
+            for site in sites:
+                lo, hi = self.site_range(site)
+                lo, hi = self._bounds(self.part_days, lo, hi, start, end)
+                slices.append(self.parts.iloc[lo:hi])
+            if not slices:
+                out = self.parts.iloc[:0]
+            else:
+                out = slices[0] if len(slices) == 1 else pd.concat(slices, ignore_index=True)
+        if months is not None:
+            months = [months] if np.isscalar(months) else list(months)
+            out = out[np.isin(date_part(out, 'month').to_numpy(), months)]
+        if samp_loc is not None:
+            samp_loc = [samp_loc] if isinstance(samp_loc, str) else list(samp_loc)
+            out = out[out['samp_loc'].isin(samp_loc).to_numpy()]
+        return out
+
+    def count(self, site=None, start=None, end=None):
+        '''
+        Number of rows for a site (or all rows) between two dates, without
+        touching the frame.
+        '''
+        start, end = _to_day(start), _to_day(end)
+        if site is None:
+            lo, hi = self._bounds(self.days, 0, len(self.days), start, end)
+        else:
+            lo, hi = self.site_range(site)
+            lo, hi = self._bounds(self.part_days, lo, hi, start, end)
+        return hi - lo
@@ -0,0 +1,148 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from aggregation import aggregate_matrix, mean_series
+
+COMBINED = 'ALL SITES'
+
+def _slopes(X, Y):
+    '''
+    OLS slope of each row of Y against the matching row of X.
+    '''
+    dx = X - X.mean(axis=1, keepdims=True)
+    dy = Y - Y.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+def _block_indices(rng, n, size, block_length):
+    '''
+    Moving-block bootstrap indices, shape (size, n).
+    '''
+    block_length = max(1, min(block_length, n))
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n - block_length + 1, size=(size, n_blocks))
+    idx = starts[:, :, None] + np.arange(block_length)
+    return idx.reshape(size, -1)[:, :n]
+
+def _resample_batch(task):
+    '''
+    Slopes for one batch of bootstrap or permutation resamples of one series.
+    Module level so it can be sent to worker processes.
+    '''
+    kind, x, y, size, block_length, seed = task
+    rng = np.random.default_rng(seed)
+    if kind == 'bootstrap':
+        idx = _block_indices(rng, len(y), size, block_length)
+        return _slopes(x[idx], y[idx])
+    shuffled = rng.permuted(np.broadcast_to(y, (size, len(y))), axis=1)
+    return _slopes(np.broadcast_to(x, shuffled.shape), shuffled)
+
+def _batches(n_resamples, batch_size):
+    sizes = [batch_size] * (n_resamples // batch_size)
+    if n_resamples % batch_size:
+        sizes.append(n_resamples % batch_size)
+    return sizes
+
+def resample_trends(series, n_resamples=10000, block_length=3, batch_size=2000, workers=None,
+                    seed=0, alpha=0.05):
+    '''
+    Block-bootstrap confidence intervals and permutation p-values for the
+    OLS trend of several yearly series.
+
+    Resamples are drawn in batches of batch_size as NumPy arrays and the
+    batches are spread over a process pool. Every batch gets its own child of
+    one SeedSequence, so results depend on seed but not on workers or
+    scheduling.
+
+    Parameters
+    ----------
+    series: dict or pandas DataFrame
+        name -> pandas Series indexed by year (nan years are dropped), or a
+        site x year matrix.
+    n_resamples: int
+        Resamples per series for each of the bootstrap and permutation test.
+    block_length: int
+        Consecutive years kept together in each bootstrap block, to respect
+        year-to-year autocorrelation.
+    batch_size: int
+        Resamples generated per task.
+    workers: int or None
+        Process count, defaults to os.cpu_count(). 1 runs in this process.
+    seed: int
+    alpha: float
+        Confidence intervals are (1 - alpha).
+
+    Returns
+    -------
+    pandas DataFrame indexed by series name with n, slope, ci_low, ci_high,
+    p_perm
+    '''
+    if isinstance(series, pd.DataFrame):
+        series = {name: row for name, row in series.iterrows()}
+    prepared = {}
+    for name, s in series.items():
+        s = s.dropna()
+        prepared[name] = (np.asarray(s.index, dtype=float), s.to_numpy(dtype=float))
+
+    sizes = _batches(n_resamples, batch_size)
+    root = np.random.SeedSequence(seed)
+    tasks = []
+    owners = []
+    for name, child in zip(prepared, root.spawn(len(prepared))):
+        x, y = prepared[name]
+        if len(y) < 3:
+            continue
+        seeds = child.spawn(2 * len(sizes))
+        for kind, kind_seeds in (('bootstrap', seeds[:len(sizes)]), ('permutation', seeds[len(sizes):])):
+            for size, s in zip(sizes, kind_seeds):
+                tasks.append((kind, x, y, size, block_length, s))
+                owners.append((name, kind))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        results = [_resample_batch(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_resample_batch, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+
+    draws = {}
+    for owner, slopes in zip(owners, results):
+        draws.setdefault(owner, []).append(slopes)
+
+    rows = {}
+    for name, (x, y) in prepared.items():
+        row = {'n': len(y), 'slope': np.nan, 'ci_low': np.nan, 'ci_high': np.nan, 'p_perm': np.nan}
+        if len(y) >= 3:
+            observed = _slopes(x[None, :], y[None, :])[0]
+            boot = np.concatenate(draws[(name, 'bootstrap')])
+            perm = np.concatenate(draws[(name, 'permutation')])
+            boot = boot[np.isfinite(boot)]
+            row['slope'] = observed
+            row['ci_low'], row['ci_high'] = np.quantile(boot, [alpha / 2, 1 - alpha / 2])
+            row['p_perm'] = (1 + np.sum(np.abs(perm) >= abs(observed))) / (len(perm) + 1)
+        rows[name] = row
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['n', 'slope', 'ci_low', 'ci_high', 'p_perm'])
+
+def site_resampled_trends(df, include_combined=True, **kwargs):
+    '''
+    resample_trends for every site's yearly mean swe, plus the yearly mean of
+    all sites combined (as in get_yearly_means_of_all_sites).
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    include_combined: bool
+        Add a row named COMBINED for the pooled series.
+    kwargs:
+        Passed to resample_trends.
+
+    Returns
+    -------
+    pandas DataFrame indexed by site
+    '''
+    matrix = aggregate_matrix(df, by='year')
+    series = {name: row for name, row in matrix.iterrows()}
+    if include_combined:
+        series[COMBINED] = mean_series(df, by='year')
+    return resample_trends(series, **kwargs)
@@ -0,0 +1,259 @@
+import functools
+import inspect
+import itertools
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_MB = float(os.environ.get('SWE_RESULT_CACHE_MB', 256))
+ENABLED = os.environ.get('SWE_RESULT_CACHE', '1') != '0'
+
+def _nbytes(value):
+    '''
+    Approximate memory held by a cached result.
+    '''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True, index=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+def _copy(value):
+    # Callers get their own copy so editing a result can't change the cache.
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return value.copy()
+    return value
+
+class ResultCache(object):
+    '''
+    Thread safe LRU cache of query results with a memory limit.
+
+    Keys start with a dataset version (see frame_version), so results for a
+    frame that has been reloaded or freed can never be returned; entries of
+    a freed frame are dropped when it is garbage collected.
+    '''
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 2 ** 20):
+        '''
+        Parameters
+        ----------
+        max_bytes: int
+            Memory limit, least recently used entries are evicted past it.
+            Results larger than the limit are not cached.
+        '''
+        self.max_bytes = int(max_bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'ResultCache(entries={}, bytes={}, max_bytes={})'.format(len(self._entries), self.bytes,
+                                                                       self.max_bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    _MISSING = object()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _copy(entry[0])
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (_copy(value), size)
+            self.bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            self._evict()
+
+    def discard_version(self, version):
+        '''
+        Drop every entry of one dataset version.
+        '''
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == version]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        '''
+        Dictionary of hits, misses, evictions, entries, bytes and max_bytes.
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+_cache = ResultCache()
+_versions = {}
+_counter = itertools.count(1)
+_versions_lock = threading.Lock()
+
+def _forget(frame_id, token):
+    with _versions_lock:
+        entry = _versions.get(frame_id)
+        if entry is None or entry[2] != token:
+            return
+        del _versions[frame_id]
+    _cache.discard_version(entry[0])
+
+def _column_data(series):
+    # The memory a column's values live in. numpy columns are compared by
+    # address and layout; the array is kept in the signature so its memory
+    # can't be reused by a later column while the entry exists. Extension
+    # columns (categorical, nullable, tz-aware) are compared by identity.
+    if isinstance(series.dtype, np.dtype):
+        values = series.to_numpy(copy=False)
+        return (values.__array_interface__['data'][0], values.shape, values.strides, values.dtype), values
+    return series.array, None
+
+def _signature(df):
+    '''
+    What a frame's data currently lives in: its index, its column labels
+    and each column's values. Assigning a column (df['swe'] = df['swe'] * 2
+    or df['swe'] *= 2), dropping rows in place or replacing the index
+    changes it; editing values inside an existing array does not.
+    '''
+    if isinstance(df, pd.Series):
+        return [df.index, None, _column_data(df)]
+    return [df.index, df.columns] + [_column_data(df.iloc[:, i]) for i in range(df.shape[1])]
+
+def _same(old, new):
+    if len(old) != len(new) or old[0] is not new[0] or old[1] is not new[1]:
+        return False
+    return all(a[0] is b[0] or (isinstance(a[0], tuple) and a[0] == b[0]) for a, b in zip(old[2:], new[2:]))
+
+def frame_version(df):
+    '''
+    Version number of a dataframe or series for cache keys.
+
+    Every frame object gets its own number, so a reloaded dataset, a new
+    SampleSite or a filtered copy never shares results with another frame.
+    The number also changes when the frame's columns, index or column
+    arrays are replaced, e.g. by df['swe'] = df['swe'] * 2.
+
+    Editing values inside a column (df.loc[i, 'swe'] = x) is not detected:
+    call invalidate(df) afterwards, or edit a copy.
+    '''
+    signature = _signature(df)
+    with _versions_lock:
+        entry = _versions.get(id(df))
+        if entry is not None and _same(entry[1], signature):
+            return entry[0]
+        version = next(_counter)
+        # token tells the finalizer this frame's entry from a later frame
+        # that reuses its id.
+        token = version if entry is None else entry[2]
+        if entry is None:
+            weakref.finalize(df, _forget, id(df), token)
+        _versions[id(df)] = (version, signature, token)
+    if entry is not None:
+        _cache.discard_version(entry[0])
+    return version
+
+def invalidate(df):
+    '''
+    Drop the cached results of a frame whose values were edited in place,
+    so the next query recomputes them.
+    '''
+    with _versions_lock:
+        entry = _versions.get(id(df))
+        if entry is None:
+            return
+        _versions[id(df)] = (next(_counter), _signature(df), entry[2])
+    _cache.discard_version(entry[0])
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, np.ndarray, pd.Index)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    hash(value)
+    return value
+
+def memoize(func):
+    '''
+    Cache func's results in the shared ResultCache.
+
+    func's first argument must be a dataframe (or series). The key is its
+    frame_version plus every other argument after defaults are applied,
+    e.g. (version, 'mean_series', by, column, keys). Calls with unhashable
+    arguments run uncached.
+    '''
+    signature = inspect.signature(func)
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(df, *args, **kwargs):
+        if not ENABLED or not isinstance(df, (pd.DataFrame, pd.Series)):
+            return func(df, *args, **kwargs)
+        bound = signature.bind(df, *args, **kwargs)
+        bound.apply_defaults()
+        try:
+            params = tuple((k, _freeze(v)) for k, v in list(bound.arguments.items())[1:])
+        except TypeError:
+            return func(df, *args, **kwargs)
+        key = (frame_version(df), name, params)
+        result = _cache.get(key, ResultCache._MISSING)
+        if result is ResultCache._MISSING:
+            result = func(df, *args, **kwargs)
+            _cache.put(key, result)
+        return result
+    return wrapper
+
+def stats():
+    '''
+    Counters of the shared cache, see ResultCache.stats.
+    '''
+    return _cache.stats()
+
+def configure(max_mb=None, enabled=None):
+    '''
+    Change the shared cache's memory limit (in MB) or turn caching off.
+    '''
+    global ENABLED
+    if max_mb is not None:
+        _cache.resize(max_mb * 2 ** 20)
+    if enabled is not None:
+        ENABLED = enabled
+        if not enabled:
+            _cache.clear()
+
+def clear():
+    _cache.clear()
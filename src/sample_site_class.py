@@ -1,15 +1,84 @@
 import pandas as pd
 import numpy as np 
+from aggregation import date_values, mean_series
+from downsample import Pyramid
+from instrumentation import stage
+
+def partition_sites(df, site_col='local_site'):
+    '''
+    Group the rows of df by site in one stable sort.
+
+    Sites keep their order of first appearance in df and rows keep their
+    order within each site. Rows with no site label are left out.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    site_col: str
+
+    Returns
+    -------
+    (partitioned dataframe, list of site names, offsets array) where site i
+    occupies rows offsets[i]:offsets[i + 1]
+    '''
+    codes, names = pd.factorize(df[site_col])
+    labelled = np.flatnonzero(codes >= 0)
+    order = labelled[np.argsort(codes[labelled], kind='stable')]
+    counts = np.bincount(codes[labelled], minlength=len(names))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return df.take(order).reset_index(drop=True), list(names), offsets
+
+def _unique_per_site(values, offsets):
+    '''
+    Unique values of each site's block, in order of first appearance.
+    '''
+    site = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    first = ~pd.DataFrame({'site': site, 'value': values}).duplicated().to_numpy()
+    positions = np.flatnonzero(first)
+    bounds = np.searchsorted(positions, offsets)
+    uniques = np.asarray(values)[positions]
+    return [list(uniques[bounds[i]:bounds[i + 1]]) for i in range(len(offsets) - 1)]
+
+@stage()
+def build_sample_sites(df, site_col='local_site'):
+    '''
+    Create a SampleSite for every site in df with a single partitioning pass.
+
+    Each SampleSite.df is a slice of one shared partitioned frame rather than
+    its own masked copy.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    site_col: str
+
+    Returns
+    -------
+    List of SampleSite objects in order of first appearance
+    '''
+    parts, names, offsets = partition_sites(df, site_col)
+    local_names = _unique_per_site(parts['samp_loc'], offsets)
+    local_codes = _unique_per_site(parts['loc_code'], offsets)
+    sites = []
+    for i, name in enumerate(names):
+        start, stop = offsets[i], offsets[i + 1]
+        site_df = parts.iloc[start:stop]
+        site_df.index = pd.RangeIndex(stop - start)
+        sites.append(SampleSite(name, df=site_df, local_site_names=local_names[i],
+                                local_site_codes=local_codes[i]))
+    return sites
 
 class SampleSite(object):
-    def __init__(self, site_name, main_df):
+    __slots__ = ('site_name', 'df', 'local_site_names', 'local_site_codes', 'mean', '_pyramids')
+
+    def __init__(self, site_name, main_df=None, df=None, local_site_names=None, local_site_codes=None):
         self.site_name = site_name
-        self.main_df = main_df
-        self.df = self._make_df()
-        self.local_site_names = self._local_names()
+        self.df = self._make_df(main_df) if df is None else df
+        self.local_site_names = self._local_names() if local_site_names is None else local_site_names
         # self.site_location = site_location
-        self.local_site_codes = self._site_codes()
-        # self.mean = self._swe_mean()
+        self.local_site_codes = self._site_codes() if local_site_codes is None else local_site_codes
+        self.mean = None
+        self._pyramids = {}
 
     # def __repr__(self):
     #     return '{}'.format(self.site_name)
@@ -17,77 +86,40 @@ class SampleSite(object):
     # def __str__(self):
     #     return '{}'.format(self.site_name)
 
-    def _make_df(self): 
-        mask = self.main_df['local_site'] == self.site_name
-        self.df = self.main_df[mask]
-        self.df.reset_index(drop=True, inplace=True)
-        return self.df
+    @stage('SampleSite._make_df')
+    def _make_df(self, main_df):
+        mask = main_df['local_site'] == self.site_name
+        return main_df[mask].reset_index(drop=True)
 
     def _local_names(self):
-        self.local_site_names = list(self.df['samp_loc'].unique())
-        return self.local_site_names 
+        return list(self.df['samp_loc'].unique())
 
     def _site_codes(self):
-        self.local_site_codes = list(self.df['loc_code'].unique())
-        return self.local_site_codes
+        return list(self.df['loc_code'].unique())
 
     def total_mean_swe(self):
-        self.mean = np.mean(self.df['swe'])
+        if self.mean is None:
+            self.mean = np.mean(self.df['swe'])
         return self.mean
 
     def yearly_mean_swe(self):
-        dct = {}
-        years = np.arange(1993, 2021, 1)
-        for i in years:
-            vals = []
-            for j in range(0, len(self.df['date'])):
-                if self.df['date'][j].year == i:
-                    if self.df['swe'][j] == 'nan':
-                        continue
-                    else:
-                        vals.append(self.df['swe'][j])
-                dct[str(i)] = np.mean(vals)
-        return dct
+        return mean_series(self.df, by='year')
 
     def monthly_mean_swe(self):
-        dct = {}
-        months = np.arange(1, 13, 1)
-        for mn in months:
-            vals = []
-            for j in range(0, len(self.df['date'])):
-                if self.df['date'][j].month == mn:
-                    vals.append(self.df['swe'][j])
-                dct[str(mn)] = np.mean(vals)
-        return dct
-
-if __name__ == '__main__':
-    df_swe = pd.read_csv('/Users/annierumbles/Desktop/Coding/galvanize/capstone_work/data/latest_knb-lter-nwt.96.16/snowateq.mw.data.16.csv')
-    df_swe['date'] = pd.to_datetime(df_swe['date'])
-    df_swe.dropna(axis=0, how='all', inplace=False)
-    df_swe.dropna(axis=0, how='any', subset=['swe'], inplace=True)
-    df_swe.sort_values(['date', 'local_site'], inplace=True)
-    df_swe.reset_index(drop=True, inplace=True)
-
-    # Making list of objects
-    names = list(df_swe['local_site'].unique())
-    # lowered = [n.lower() for n in names]
-    objs = [SampleSite(i, df_swe) for i in names]
-    # FIGURE OUT HOW TO AUTOMATE BELOW:
-    saddle =objs[0] 
-    gl4 = objs[1] 
-    gl5 = objs[2] 
-    navajo = objs[3] 
-    martinelli = objs[4] 
-    arikaree = objs[5] 
-    subnivean = objs[6] 
-    albion = objs[7] 
-    gl3 = objs[8] 
-    tower_meadow = objs[9] 
-    tower_tree_hill = objs[10] 
-    c1 = objs[11] 
-    soddie = objs[12] 
-    # obj_names = [saddle, gl4, gl5, navajo, martinelli, arikaree, subnivean, albion, gl3, tower_meadow, tower_tree_hill, c1, soddie, nan]
-
-
+        return mean_series(self.df, by='month')
 
+    def pyramid(self, column='swe'):
+        '''
+        Multi-resolution copy of column over time for plotting (see
+        downsample.Pyramid), x in days since 1970-01-01. Built on first use.
+        '''
+        if column not in self._pyramids:
+            days = date_values(self.df).to_numpy().astype('datetime64[ns]').astype(np.int64) / 86400e9
+            self._pyramids[column] = Pyramid(days, self.df[column].to_numpy(dtype=float))
+        return self._pyramids[column]
 
+if __name__ == '__main__':
+    from data_cleaning import load_swe_df
+    for obj in build_sample_sites(load_swe_df()):
+        print('{:16} {:7} samples {:3} sample locations'.format(obj.site_name, len(obj.df),
+                                                                 len(obj.local_site_names)))
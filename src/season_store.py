@@ -0,0 +1,251 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from aggregation import NUMERIC_COLUMNS, date_part
+from frame_cache import read_frame, write_frame
+from streaming import OnlineAggregates, iter_clean_chunks, KEYS
+
+SORT_KEYS = ['date', 'local_site']
+
+def _clean_rows(rows, subset=('swe',)):
+    '''
+    Clean new survey rows the same way as clean_swe_df and sort them.
+
+    Parameters
+    ----------
+    rows: str or pandas dataframe
+        Path to a csv or raw rows in the csv schema.
+    subset: tuple of str
+
+    Returns
+    -------
+    Cleaned dataframe sorted by date then local_site
+    '''
+    if isinstance(rows, str):
+        chunks = list(iter_clean_chunks(rows, subset=subset))
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    else:
+        df = rows.copy()
+        df['date'] = pd.to_datetime(df['date'])
+        df = df.dropna(axis=0, how='any', subset=list(subset))
+    if len(df):
+        df = df.sort_values(SORT_KEYS, kind='stable').reset_index(drop=True)
+    return df
+
+class SeasonStore(object):
+    '''
+    Cleaned SWE data kept on disk as date-ordered segments, with running
+    per-(site, year, month) aggregates and a site x year mean matrix.
+
+    append adds a new season's rows without touching older segments and
+    updates only the aggregate cells the new rows fall in, so the cost of an
+    update follows the size of the delta rather than the archive.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        with open(self._path('manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.aggregates = OnlineAggregates(self.manifest['columns'])
+        state = read_frame(self._path(self.manifest.get('aggregates', 'aggregates.npz')))
+        if len(state):
+            self.aggregates.state = state.set_index(KEYS)
+        self.aggregates.rows = self.manifest['rows']
+        self._matrix = None
+
+    def __repr__(self):
+        return 'SeasonStore({!r}, segments={}, rows={}, version={})'.format(
+            self.directory, len(self.manifest['segments']), self.manifest['rows'], self.version)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @classmethod
+    def create(cls, directory, df, columns=NUMERIC_COLUMNS):
+        '''
+        Start a store from an already cleaned, sorted frame (e.g. load_swe_df()).
+
+        Parameters
+        ----------
+        directory: str
+            Created if missing, must not already hold a store.
+        df: dataframe (cleaned df_swe)
+        columns: list of str
+            Numeric columns to keep running aggregates for.
+
+        Returns
+        -------
+        SeasonStore
+        '''
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, 'manifest.json')):
+            raise FileExistsError('{} already holds a season store'.format(directory))
+        aggregates = OnlineAggregates(columns).update(df)
+        manifest = {'columns': list(columns), 'rows': 0, 'version': 0, 'segments': [], 'next_segment': 0}
+        store = cls.__new__(cls)
+        store.directory = directory
+        store.manifest = manifest
+        store.aggregates = aggregates
+        store._matrix = None
+        if len(df):
+            manifest['segments'] = store._write_segments([df])
+        manifest['aggregates'] = store._write_aggregates()
+        manifest['rows'] = len(df)
+        store._save_manifest()
+        return store
+
+    def _save_manifest(self):
+        tmp = self._path('manifest.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self._path('manifest.json'))
+
+    def _write_segments(self, frames):
+        '''
+        Write frames as new segment files, named after next_segment so they
+        never replace a file the saved manifest still lists.
+
+        Returns
+        -------
+        list of manifest entries for the new segments
+        '''
+        entries = []
+        for df in frames:
+            name = 'segment_{:05d}.npz'.format(self.manifest['next_segment'])
+            self.manifest['next_segment'] += 1
+            write_frame(self._path(name), df)
+            entries.append({'file': name, 'rows': len(df),
+                            'first': str(df['date'].iloc[0]), 'last': str(df['date'].iloc[-1])})
+        return entries
+
+    def _write_aggregates(self):
+        # Named after the version the manifest will carry, for the same reason.
+        name = 'aggregates_{:05d}.npz'.format(self.manifest['version'])
+        write_frame(self._path(name), self.aggregates.state.reset_index())
+        return name
+
+    def append(self, rows, subset=('swe',)):
+        '''
+        Merge a new batch of survey rows (e.g. the latest water year's csv).
+
+        Rows dated after everything already stored become a new segment.
+        Rows that overlap earlier dates are merged with just the run of
+        segments whose date range they reach, which is rewritten as one
+        segment in (date, local_site) order; later segments are untouched.
+
+        New files are written first and the manifest is replaced last, so
+        a store interrupted mid-append still opens at its previous version.
+        Files the new manifest no longer lists are removed afterwards.
+
+        Parameters
+        ----------
+        rows: str or pandas dataframe
+            Path to a csv or raw rows in the csv schema.
+        subset: tuple of str
+            Columns that must be non-null for a row to be kept.
+
+        Returns
+        -------
+        Number of rows added
+        '''
+        delta = _clean_rows(rows, subset)
+        if not len(delta):
+            return 0
+        first, last = str(delta['date'].iloc[0]), str(delta['date'].iloc[-1])
+        segments = self.manifest['segments']
+        reached = [i for i, seg in enumerate(segments) if seg['last'] >= first and seg['first'] <= last]
+        if reached:
+            # Rows between two reached segments belong to the run as well.
+            start, stop = reached[0], reached[-1] + 1
+        else:
+            # Rows falling in a gap between segments go in before the next one.
+            start = stop = next((i for i, seg in enumerate(segments) if seg['first'] > last), len(segments))
+        touched = segments[start:stop]
+        merged = pd.concat([read_frame(self._path(seg['file'])) for seg in touched] + [delta], ignore_index=True)
+        if touched:
+            merged = merged.sort_values(SORT_KEYS, kind='stable').reset_index(drop=True)
+        old_aggregates = self.manifest.get('aggregates', 'aggregates.npz')
+
+        new_segments = self._write_segments([merged])
+        self.aggregates.update(delta)
+        self.manifest['version'] += 1
+        self.manifest['aggregates'] = self._write_aggregates()
+        self.manifest['segments'] = segments[:start] + new_segments + segments[stop:]
+        self.manifest['rows'] += len(delta)
+        self._save_manifest()
+        for name in [seg['file'] for seg in touched] + [old_aggregates]:
+            os.remove(self._path(name))
+        self._update_matrix(delta)
+        return len(delta)
+
+    def frame(self):
+        '''
+        The full cleaned frame, sorted by date then local_site.
+
+        Returns
+        -------
+        pandas dataframe
+        '''
+        parts = [read_frame(self._path(seg['file'])) for seg in self.manifest['segments']]
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, ignore_index=True)
+
+    def summary(self, by='year', site_col='local_site'):
+        '''
+        Per-site (or pooled) summaries from the running aggregates, see
+        OnlineAggregates.summary.
+        '''
+        return self.aggregates.summary(by=by, site_col=site_col)
+
+    def _year_means(self, keys=None):
+        state = self.aggregates.state
+        if keys is not None:
+            site_year = pd.MultiIndex.from_arrays([state.index.get_level_values(0),
+                                                  state.index.get_level_values(1)])
+            state = state[site_year.isin(keys)]
+        state = state[state.index.get_level_values('local_site').notna()]
+        n = state['swe_count']
+        grouped = pd.DataFrame({'n': n, 'total': state['swe_mean'] * n}).groupby(level=['local_site', 'year']).sum()
+        return grouped['total'] / grouped['n'].where(grouped['n'] > 0)
+
+    def year_matrix(self):
+        '''
+        Site x year matrix of mean swe, the input to trends.trend_table.
+
+        Returns
+        -------
+        pandas DataFrame indexed by site, years as columns
+        '''
+        if self._matrix is None:
+            means = self._year_means()
+            matrix = means.unstack('year')
+            if len(matrix.columns):
+                matrix = matrix.reindex(columns=np.arange(matrix.columns.min(), matrix.columns.max() + 1))
+            self._matrix = matrix
+        return self._matrix
+
+    def _update_matrix(self, delta):
+        '''
+        Refresh only the site/year cells of the cached matrix that delta touches.
+        '''
+        if self._matrix is None:
+            return
+        delta = delta[delta['local_site'].notna()]
+        keys = pd.MultiIndex.from_arrays([delta['local_site'], date_part(delta, 'year')]).unique()
+        means = self._year_means(keys)
+        matrix = self._matrix
+        new_sites = means.index.get_level_values(0).unique().difference(matrix.index)
+        if len(new_sites):
+            matrix = matrix.reindex(matrix.index.union(new_sites))
+        years = means.index.get_level_values(1)
+        if len(years) and (years.max() > matrix.columns.max() or years.min() < matrix.columns.min()):
+            matrix = matrix.reindex(columns=np.arange(min(years.min(), matrix.columns.min()),
+                                                      max(years.max(), matrix.columns.max()) + 1))
+        for (site, year), value in means.items():
+            matrix.at[site, year] = value
+        self._matrix = matrix
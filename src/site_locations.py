@@ -0,0 +1,55 @@
+# Sample site coordinates (latitude, longitude) and plot colors, shared by the
+# folium maps in map_plotting and the static renderer in static_map.
+import math
+import numpy as np
+
+SITE_LOCATIONS = {
+    'Saddle': (40.05, -105.59),
+    'Albion': (40.047388, -105.599580),
+    'GL4': (40.0558068932155, -105.61717784273749),
+    'GL5': (40.0508, -105.630),
+    'Navajo': (40.052108, -105.635561),
+    'Martinelli': (40.05315986684726, -105.59667627824962),
+    'Arikaree': (40.050791, -105.641416),
+    'Subnivean': (40.054165, -105.588975),
+    'GL3': (40.0512, -105.6128),
+    'Tower Meadow': (40.052348, -105.583235),
+    'Tower Tree Well': (40.033371, -105.547389),
+    'C1': (40.036162, -105.543529),
+    'Soddie': (40.04, -105.57),
+}
+
+COLOR_DICT = {'Saddle':'#E24A33','GL4':'#348ABD','GL5':'#988ED5','Navajo':'#777777','Martinelli':'#FBC15E',
+        'Arikaree':'#8EBA42','Subnivean':'#FFB5B8','Albion':'#92C5DE','GL3':'#80CDC1','Tower Meadow':'#5E3C99',
+        'Tower Tree Well':'#E66101','C1':'#F4A582','Soddie':'#B8E186'}
+
+# Opposite corners of the Niwot Ridge LTER study area rectangle.
+LTER_BOUNDS = [(40.0595312337778, -105.54), (40.03, -105.645)]
+MAP_CENTER = (40.0443, -105.5920)
+
+METERS_PER_DEGREE_LAT = 110540.0
+METERS_PER_DEGREE_LON = 111320.0
+
+def to_meters(lat, lon, origin=MAP_CENTER):
+    '''
+    Local east/north offsets in meters from origin (equirectangular, fine at
+    the few-kilometer scale of the study area).
+
+    Returns
+    -------
+    (x, y) numpy arrays
+    '''
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    x = (lon - origin[1]) * METERS_PER_DEGREE_LON * math.cos(math.radians(origin[0]))
+    y = (lat - origin[0]) * METERS_PER_DEGREE_LAT
+    return x, y
+
+def display_name(site):
+    '''
+    Map an upper case local_site label from the csv (e.g. 'TOWER TREE WELL')
+    to its key in SITE_LOCATIONS and COLOR_DICT ('Tower Tree Well').
+    '''
+    for name in SITE_LOCATIONS:
+        if name.upper() == str(site).upper():
+            return name
+    raise KeyError('no location for site {!r}'.format(site))
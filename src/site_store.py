@@ -0,0 +1,206 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from aggregation import EPOCH, NUMERIC_COLUMNS, STATISTICS, aggregate, date_values
+from sample_site_class import SampleSite, partition_sites, _unique_per_site
+
+FORMAT_VERSION = 1
+INDEX = 'index.json'
+LABEL_COLUMNS = ['samp_loc', 'loc_code']
+
+class SiteStore(object):
+    '''
+    Cleaned SWE data on disk as one contiguous typed .npy array per column,
+    rows grouped by site (date order within a site), plus an index of site
+    offsets.
+
+    Columns are opened with numpy memmaps, so opening is a json read, a
+    site only pages in its own rows, and processes reading the same store
+    share those pages through the OS cache instead of each holding a copy.
+    Rows with no site label are not stored.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX)) as f:
+            self.index = json.load(f)
+        if self.index['format_version'] != FORMAT_VERSION:
+            raise ValueError('{} was written by an incompatible version'.format(directory))
+        self.sites = self.index['sites']
+        self.offsets = np.asarray(self.index['offsets'])
+        self._positions = {site: i for i, site in enumerate(self.sites)}
+        self._arrays = {}
+
+    def __repr__(self):
+        return 'SiteStore({!r}, sites={}, rows={})'.format(self.directory, len(self.sites), self.index['rows'])
+
+    def __reduce__(self):
+        # Workers reopen the store and map the same files.
+        return (SiteStore, (self.directory,))
+
+    @classmethod
+    def create(cls, directory, df, columns=NUMERIC_COLUMNS, dtype=np.float64, site_col='local_site'):
+        '''
+        Write a store from a cleaned frame (csv or compact layout).
+
+        Parameters
+        ----------
+        directory: str
+            Created if missing, an existing store is replaced.
+        df: dataframe (cleaned df_swe, sorted by date)
+        columns: list of str
+            Measurement columns to store.
+        dtype: numpy dtype
+            Storage type of the measurements, np.float32 halves the size.
+        site_col: str
+
+        Returns
+        -------
+        SiteStore
+        '''
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, INDEX)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        parts, sites, offsets = partition_sites(df, site_col)
+        days = (date_values(parts).to_numpy().astype('datetime64[D]') - EPOCH).astype(np.int32)
+        arrays = {'day': days}
+        for col in columns:
+            arrays[col] = parts[col].to_numpy(dtype=dtype)
+        labels = {}
+        for col in LABEL_COLUMNS:
+            codes, uniques = pd.factorize(parts[col].astype(object))
+            arrays[col] = codes.astype(np.int32)
+            labels[col] = [_json_value(u) for u in uniques]
+        for name, values in arrays.items():
+            np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(values))
+        index = {'format_version': FORMAT_VERSION, 'sites': [str(s) for s in sites],
+                 'offsets': [int(o) for o in offsets], 'rows': int(offsets[-1]), 'columns': list(columns),
+                 'labels': labels,
+                 'site_labels': {col: [[_json_value(v) for v in vals] for vals in _unique_per_site(parts[col], offsets)]
+                                 for col in LABEL_COLUMNS}}
+        # The index is written last, a store without one is incomplete.
+        tmp = index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, index_path)
+        return cls(directory)
+
+    def array(self, name):
+        '''
+        Memory mapped column, opened on first use.
+        '''
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def site_bounds(self, site):
+        try:
+            i = self._positions[site]
+        except KeyError:
+            raise KeyError('no site {!r}, have {}'.format(site, self.sites))
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def site_frame(self, site, columns=None):
+        '''
+        One site's rows in the compact layout (day numbers, categorical
+        labels), read from the mapped arrays.
+
+        Parameters
+        ----------
+        site: str
+        columns: list of str or None
+            Measurement columns to include, all stored ones by default.
+
+        Returns
+        -------
+        pandas dataframe
+        '''
+        lo, hi = self.site_bounds(site)
+        n = hi - lo
+        data = {'local_site': pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [site])}
+        for col in LABEL_COLUMNS:
+            data[col] = pd.Categorical.from_codes(self.array(col)[lo:hi], self.index['labels'][col])
+        data['day'] = self.array('day')[lo:hi]
+        for col in self.index['columns'] if columns is None else columns:
+            data[col] = self.array(col)[lo:hi]
+        # copy=False keeps the columns as views of the mapped arrays.
+        return pd.DataFrame(data, copy=False)
+
+    def sample_site(self, site):
+        '''
+        SampleSite backed by this store's rows for site.
+        '''
+        i = self._positions[site]
+        labels = self.index['site_labels']
+        return SampleSite(site, df=self.site_frame(site), local_site_names=labels['samp_loc'][i],
+                          local_site_codes=labels['loc_code'][i])
+
+    def sample_sites(self, sites=None):
+        return [self.sample_site(site) for site in (self.sites if sites is None else sites)]
+
+    def aggregate(self, by='year', columns=('swe',), stats=STATISTICS, sites=None):
+        '''
+        aggregation.aggregate over the chosen sites, reading only their rows.
+
+        Returns
+        -------
+        Tidy dataframe, one row per site and group
+        '''
+        frames = [aggregate(self.site_frame(site, list(columns)), by=by, columns=columns, stats=stats)
+                  for site in (self.sites if sites is None else sites)]
+        out = pd.concat(frames, ignore_index=True)
+        out['local_site'] = out['local_site'].astype(object)
+        return out.sort_values(['local_site', by], kind='stable').reset_index(drop=True)
+
+    def map(self, func, sites=None, workers=None):
+        '''
+        Call func(site_frame) for each site in a process pool. Every worker
+        maps the same files, so the archive is never copied per process.
+
+        Parameters
+        ----------
+        func: module level function taking a site dataframe
+        sites: list of str or None
+        workers: int or None
+            Process count, defaults to os.cpu_count(). 1 runs in this process.
+
+        Returns
+        -------
+        Dictionary of site -> result
+        '''
+        sites = self.sites if sites is None else list(sites)
+        if workers == 1:
+            return {site: func(self.site_frame(site)) for site in sites}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_store,
+                                 initargs=(self.directory,)) as pool:
+            results = pool.map(_call_on_site, [func] * len(sites), sites)
+            return dict(zip(sites, results))
+
+def _json_value(value):
+    # Label values as plain json types, missing labels as null.
+    if pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+_worker_store = None
+
+def _open_worker_store(directory):
+    global _worker_store
+    _worker_store = SiteStore(directory)
+
+def _call_on_site(func, site):
+    return func(_worker_store.site_frame(site))
+
+if __name__ == '__main__':
+    import argparse
+    from data_cleaning import load_swe_df
+    parser = argparse.ArgumentParser(description='Write the cleaned SWE data as a memory mapped per-site store.')
+    parser.add_argument('directory')
+    parser.add_argument('--csv', default=None, help='defaults to data_cleaning.DEFAULT_CSV')
+    parser.add_argument('--float32', action='store_true', help='store measurements as float32')
+    args = parser.parse_args()
+
+    store = SiteStore.create(args.directory, load_swe_df(args.csv), dtype=np.float32 if args.float32 else np.float64)
+    print(store)
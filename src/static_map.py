@@ -0,0 +1,169 @@
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from matplotlib.figure import Figure
+from matplotlib.patches import Ellipse, Rectangle
+from animation import figure_to_array, read_image, write_animation
+from site_locations import SITE_LOCATIONS, COLOR_DICT, LTER_BOUNDS, METERS_PER_DEGREE_LAT, METERS_PER_DEGREE_LON
+MARGIN = 0.004
+
+def map_extent(bounds=LTER_BOUNDS, margin=MARGIN):
+    '''
+    (lon_min, lon_max, lat_min, lat_max) of the LTER rectangle plus a margin
+    in degrees.
+    '''
+    lats = [corner[0] for corner in bounds]
+    lons = [corner[1] for corner in bounds]
+    return (min(lons) - margin, max(lons) + margin, min(lats) - margin, max(lats) + margin)
+
+def _circle(lat, lon, radius, **kwargs):
+    # A circle of radius meters on the ground, as an ellipse in degrees.
+    width = 2 * radius / (METERS_PER_DEGREE_LON * math.cos(math.radians(lat)))
+    height = 2 * radius / METERS_PER_DEGREE_LAT
+    return Ellipse((lon, lat), width, height, **kwargs)
+
+def draw_site_map(highlight=None, background=None, extent=None, figsize=(10, 4.5), dpi=100, labels=False):
+    '''
+    Draw the sample sites and LTER rectangle with matplotlib, the offline
+    counterpart of the folium map in map_plotting.
+
+    Every site is a black circle (add_black_site); the highlighted site is
+    drawn in its COLOR_DICT color (add_site) and named.
+
+    Parameters
+    ----------
+    highlight: str or None
+        Site name as in SITE_LOCATIONS, e.g. 'Saddle'.
+    background: numpy array, str or None
+        Local raster (or path to one) drawn under the sites, e.g. an
+        exported terrain or hillshade image covering extent.
+    extent: (lon_min, lon_max, lat_min, lat_max) or None
+        Geographic extent of the map and background, defaults to map_extent().
+    figsize: (float, float)
+    dpi: int
+    labels: bool
+        Name every site, not just the highlighted one.
+
+    Returns
+    -------
+    matplotlib figure (not registered with pyplot)
+    '''
+    fig, ax = _draw_base(background, extent or map_extent(), figsize, dpi, labels)
+    if highlight is not None:
+        _draw_highlight(ax, highlight, labels)
+    return fig
+
+def _draw_base(background, extent, figsize, dpi, labels):
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.add_axes([0, 0, 1, 1])
+    if background is not None:
+        if isinstance(background, (str, os.PathLike)):
+            background = read_image(background)
+        ax.imshow(background, extent=extent, origin='upper', interpolation='bilinear')
+    (top, right), (bottom, left) = LTER_BOUNDS
+    ax.add_patch(Rectangle((left, bottom), right - left, top - bottom, fill=False, edgecolor='black', linewidth=3))
+    for name, (lat, lon) in SITE_LOCATIONS.items():
+        ax.add_patch(_circle(lat, lon, 125, facecolor='none', edgecolor='black', linewidth=2.5, zorder=2))
+        if labels:
+            ax.annotate(name, (lon, lat), xytext=(8, 8), textcoords='offset points', fontsize=12,
+                        fontweight='bold', zorder=4)
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    # Equal ground distances along both axes at this latitude.
+    ax.set_aspect(1 / math.cos(math.radians((extent[2] + extent[3]) / 2)))
+    ax.set_axis_off()
+    return fig, ax
+
+def _draw_highlight(ax, name, labels=False):
+    lat, lon = SITE_LOCATIONS[name]
+    artists = [ax.add_patch(_circle(lat, lon, 150, facecolor=COLOR_DICT[name], edgecolor=COLOR_DICT[name],
+                                    alpha=0.8, linewidth=2, zorder=3))]
+    if not labels:
+        artists.append(ax.annotate(name, (lon, lat), xytext=(8, 8), textcoords='offset points', fontsize=12,
+                                   fontweight='bold', zorder=4))
+    return artists
+
+def render_highlights(sites, background=None, extent=None, figsize=(10, 4.5), dpi=100):
+    '''
+    Render one highlight frame per site, drawing the shared layers once and
+    swapping only the highlighted circle between frames.
+
+    Module level so it can run in a worker process.
+
+    Returns
+    -------
+    List of RGB arrays
+    '''
+    fig, ax = _draw_base(background, extent or map_extent(), figsize, dpi, labels=False)
+    frames = []
+    for name in sites:
+        artists = _draw_highlight(ax, name)
+        frames.append(figure_to_array(fig))
+        for artist in artists:
+            artist.remove()
+    return frames
+
+def highlight_frames(sites=None, background=None, extent=None, figsize=(10, 4.5), dpi=100, workers=None):
+    '''
+    One map per site with that site highlighted, rendered in parallel.
+
+    Parameters
+    ----------
+    sites: list of str or None
+        Defaults to every site in SITE_LOCATIONS order.
+    background: numpy array, str or None
+        Read once here and shared with the workers.
+    extent, figsize, dpi:
+        See draw_site_map.
+    workers: int or None
+        Process count, defaults to os.cpu_count(). Each process renders a
+        contiguous share of the sites. 1 renders in this process.
+
+    Returns
+    -------
+    List of RGB arrays in site order
+    '''
+    sites = list(SITE_LOCATIONS) if sites is None else list(sites)
+    if isinstance(background, (str, os.PathLike)):
+        background = read_image(background)
+    workers = min(workers or os.cpu_count() or 1, len(sites))
+    if workers <= 1:
+        return render_highlights(sites, background, extent, figsize, dpi)
+    chunks = [list(chunk) for chunk in np.array_split(np.array(sites, dtype=object), workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_highlights, chunk, background, extent, figsize, dpi) for chunk in chunks]
+        return [frame for future in futures for frame in future.result()]
+
+def write_site_frames(out_dir, frames, prefix='s'):
+    '''
+    Save frames as <prefix>1.png ... in out_dir (the old screenshot names).
+
+    Returns
+    -------
+    list of written paths
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i, frame in enumerate(frames, 1):
+        path = os.path.join(out_dir, '{}{}.png'.format(prefix, i))
+        Image.fromarray(np.asarray(frame)).save(path)
+        paths.append(path)
+    return paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the site map highlight frames and gif without a browser.')
+    parser.add_argument('--gif', default='images/sites_black_loop.gif')
+    parser.add_argument('--frames', default=None, help='also save each frame as a png in this folder')
+    parser.add_argument('--background', default=None, help='local raster covering the map extent')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=1.0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    frames = highlight_frames(background=args.background, dpi=args.dpi, workers=args.workers)
+    if args.frames:
+        write_site_frames(args.frames, frames)
+    write_animation(frames, args.gif, duration=args.duration, loop=20)
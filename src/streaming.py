@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+from aggregation import NUMERIC_COLUMNS, date_part
+
+KEYS = ['local_site', 'year', 'month']
+MOMENTS = ['count', 'mean', 'm2', 'min', 'max']
+
+def iter_clean_chunks(filepath, chunksize=100000, subset=('swe',)):
+    '''
+    Read a snow survey csv in chunks, parsing dates and dropping empty rows
+    and rows with nan values in subset as each chunk arrives, the same rows
+    clean_frame drops.
+
+    Parameters
+    ----------
+    filepath: str or file-like object, e.g. an open http response
+    chunksize: int
+        Rows read per chunk.
+    subset: tuple of str
+        Columns that must be non-null for a row to be kept.
+
+    Returns
+    -------
+    Generator of cleaned (unsorted) dataframes
+    '''
+    for chunk in pd.read_csv(filepath, chunksize=chunksize):
+        chunk['date'] = pd.to_datetime(chunk['date'])
+        chunk = chunk.dropna(axis=0, how='all').dropna(axis=0, how='any', subset=list(subset))
+        if len(chunk):
+            yield chunk
+
+def _chunk_moments(df, columns):
+    '''
+    count/mean/m2/min/max of columns for each (site, year, month) in df.
+    '''
+    site = df['local_site']
+    if isinstance(site.dtype, pd.CategoricalDtype):
+        # Plain labels so state tables from compact and csv chunks line up.
+        site = site.astype(object)
+    keys = [site, date_part(df, 'year'), date_part(df, 'month')]
+    grouped = df.groupby(keys, dropna=False)[columns].agg(['count', 'mean', 'var', 'min', 'max'])
+    out = {}
+    for col in columns:
+        count = grouped[(col, 'count')]
+        out[col + '_count'] = count
+        out[col + '_mean'] = grouped[(col, 'mean')].fillna(0.0)
+        out[col + '_m2'] = (grouped[(col, 'var')] * (count - 1)).fillna(0.0)
+        out[col + '_min'] = grouped[(col, 'min')]
+        out[col + '_max'] = grouped[(col, 'max')]
+    return pd.DataFrame(out)
+
+def _merge_moments(a, b, columns):
+    '''
+    Combine two moment tables group by group (Chan et al. parallel form of
+    Welford's update), so the result matches one pass over both inputs.
+    '''
+    index = a.index.union(b.index, sort=False)
+    a = a.reindex(index)
+    b = b.reindex(index)
+    out = {}
+    for col in columns:
+        na = a[col + '_count'].fillna(0).to_numpy()
+        nb = b[col + '_count'].fillna(0).to_numpy()
+        ma = a[col + '_mean'].fillna(0.0).to_numpy()
+        mb = b[col + '_mean'].fillna(0.0).to_numpy()
+        n = na + nb
+        safe = np.where(n > 0, n, 1)
+        delta = mb - ma
+        out[col + '_count'] = n.astype(np.int64)
+        out[col + '_mean'] = ma + delta * nb / safe
+        out[col + '_m2'] = (a[col + '_m2'].fillna(0.0).to_numpy() + b[col + '_m2'].fillna(0.0).to_numpy()
+                            + delta ** 2 * na * nb / safe)
+        out[col + '_min'] = np.fmin(a[col + '_min'].to_numpy(), b[col + '_min'].to_numpy())
+        out[col + '_max'] = np.fmax(a[col + '_max'].to_numpy(), b[col + '_max'].to_numpy())
+    return pd.DataFrame(out, index=index)
+
+def _rollup(state, levels, columns):
+    '''
+    Collapse (site, year, month) moments onto a subset of the key levels.
+    '''
+    grouped = state.groupby(level=levels, sort=True)
+    out = {}
+    for col in columns:
+        n = state[col + '_count']
+        weighted = (state[col + '_mean'] * n).groupby(level=levels)
+        total = grouped[col + '_count'].transform('sum')
+        group_mean = weighted.transform('sum') / total.where(total > 0)
+        spread = state[col + '_m2'] + n * (state[col + '_mean'] - group_mean) ** 2
+        count = grouped[col + '_count'].sum()
+        out[col + '_count'] = count
+        out[col + '_mean'] = weighted.sum() / count.where(count > 0)
+        out[col + '_m2'] = spread.groupby(level=levels).sum()
+        out[col + '_min'] = grouped[col + '_min'].min()
+        out[col + '_max'] = grouped[col + '_max'].max()
+    return pd.DataFrame(out)
+
+class OnlineAggregates(object):
+    '''
+    Running count, mean, variance (Welford/Chan), min and max of numeric
+    columns per (local_site, year, month). Rows with no site label are kept
+    for pooled summaries and left out of per-site ones, as in aggregation.
+
+    Feed it chunks with update and read summaries with summary; state size
+    depends on the number of site/year/month groups, not on rows seen.
+    Medians can't be computed this way and are not offered.
+    '''
+    def __init__(self, columns=('swe',)):
+        self.columns = list(columns)
+        self.rows = 0
+        self.state = pd.DataFrame(columns=['{}_{}'.format(c, m) for c in self.columns for m in MOMENTS],
+                                  index=pd.MultiIndex.from_arrays([[], [], []], names=KEYS))
+
+    def update(self, df):
+        '''
+        Fold a cleaned chunk into the running totals.
+
+        Parameters
+        ----------
+        df: dataframe with local_site, date and the tracked columns
+
+        Returns
+        -------
+        self
+        '''
+        if len(df):
+            chunk = _chunk_moments(df, self.columns)
+            self.state = chunk if len(self.state) == 0 else _merge_moments(self.state, chunk, self.columns)
+            self.rows += len(df)
+        return self
+
+    def merge(self, other):
+        '''
+        Fold another OnlineAggregates (e.g. from a different file) into this one.
+        '''
+        if len(other.state):
+            self.state = other.state.copy() if len(self.state) == 0 else _merge_moments(self.state, other.state, self.columns)
+            self.rows += other.rows
+        return self
+
+    def summary(self, by='year', site_col='local_site'):
+        '''
+        Summaries in the same layout as aggregation.aggregate.
+
+        Parameters
+        ----------
+        by: str
+            'year' or 'month'.
+        site_col: str or None
+            None to pool all sites together.
+
+        Returns
+        -------
+        Tidy dataframe with '<column>_<stat>' columns for mean, count, std,
+        min and max
+        '''
+        if by not in ('year', 'month'):
+            raise ValueError("by must be 'year' or 'month' when streaming, got {!r}".format(by))
+        levels = [by] if site_col is None else ['local_site', by]
+        rolled = _rollup(self.state, levels, self.columns)
+        out = pd.DataFrame(index=rolled.index)
+        for col in self.columns:
+            n = rolled[col + '_count']
+            out[col + '_mean'] = rolled[col + '_mean']
+            out[col + '_count'] = n.astype(np.int64)
+            out[col + '_std'] = np.sqrt(rolled[col + '_m2'] / (n - 1).where(n > 1))
+            out[col + '_min'] = rolled[col + '_min']
+            out[col + '_max'] = rolled[col + '_max']
+        out = out.reset_index()
+        if site_col is not None:
+            out = out[out['local_site'].notna()].reset_index(drop=True)
+        if site_col is not None and site_col != 'local_site':
+            out = out.rename(columns={'local_site': site_col})
+        return out
+
+def stream_aggregates(filepath, columns=NUMERIC_COLUMNS, chunksize=100000, subset=('swe',)):
+    '''
+    Aggregate a csv too large to load at once, one chunk at a time.
+
+    Peak memory is bounded by chunksize plus the number of site/year/month
+    groups.
+
+    Parameters
+    ----------
+    filepath: str
+    columns: list of str
+        Numeric columns to track.
+    chunksize: int
+    subset: tuple of str
+        Columns that must be non-null for a row to be kept.
+
+    Returns
+    -------
+    OnlineAggregates
+    '''
+    agg = OnlineAggregates(columns)
+    for chunk in iter_clean_chunks(filepath, chunksize, subset):
+        agg.update(chunk)
+    return agg
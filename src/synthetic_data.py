@@ -0,0 +1,103 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+SITE_NAMES = ['SADDLE', 'GL4', 'GL5', 'NAVAJO', 'MARTINELLI', 'ARIKAREE', 'SUBNIVEAN', 'ALBION', 'GL3',
+              'TOWER MEADOW', 'TOWER TREE WELL', 'C1', 'SODDIE']
+COLUMNS = ['LTER_site', 'local_site', 'samp_loc', 'loc_code', 'date', 'prof_depth', 'mass', 'wted_temp',
+           'density', 'swe']
+
+def _site_names(n_sites):
+    names = list(SITE_NAMES[:n_sites])
+    names += ['SITE{:03d}'.format(i) for i in range(len(names), n_sites)]
+    return names
+
+def generate_swe_df(n_rows=2000, n_sites=13, locs_per_site=5, start_year=1993, n_years=27, nan_rate=0.05,
+                    missing_site_rate=0.01, seed=0):
+    '''
+    Synthetic snow survey rows in the schema of the Niwot Ridge snowateq csv.
+
+    Surveys fall between January and early July. Depth builds to a peak in
+    April and melts through June, and density rises through the season, so
+    swe = prof_depth * density / 1000 and mass = swe * 1000 as in the real
+    data. Mass, density and swe go missing together at nan_rate.
+
+    Parameters
+    ----------
+    n_rows: int
+    n_sites: int
+        The first 13 use the real site names.
+    locs_per_site: int
+        Sample locations per site.
+    start_year: int
+    n_years: int
+    nan_rate: float
+        Share of rows with no mass/density/swe.
+    missing_site_rate: float
+        Share of rows with no local_site.
+    seed: int
+
+    Returns
+    -------
+    Raw (uncleaned) pandas dataframe with string dates, in survey order
+    '''
+    rng = np.random.default_rng(seed)
+    names = np.array(_site_names(n_sites), dtype=object)
+    site = rng.integers(0, n_sites, n_rows)
+    loc = rng.integers(1, locs_per_site + 1, n_rows)
+    year = start_year + rng.integers(0, n_years, n_rows)
+    day = rng.integers(0, 185, n_rows)
+    dates = (pd.to_datetime(year.astype(str), format='%Y') + pd.to_timedelta(day, unit='D'))
+
+    # Seasonal snowpack peaking around day 100 (mid April).
+    season = np.clip(np.sin(np.pi * np.minimum(day, 184) / 200.0) ** 1.5, 0.02, None)
+    site_scale = rng.uniform(0.6, 1.6, n_sites)[site]
+    year_scale = rng.normal(1.0, 0.15, n_years)[year - start_year]
+    depth = np.round(np.clip(2.2 * season * site_scale * year_scale + rng.normal(0, 0.1, n_rows), 0.05, None), 2)
+    density = np.clip(250 + 1.4 * day + rng.normal(0, 30, n_rows), 100, 650)
+    swe = depth * density / 1000.0
+    temp = np.minimum(-9.0 + day / 18.0 + rng.normal(0, 1.5, n_rows), 0.0)
+
+    codes = np.array(['{:03d}'.format(i) for i in range(locs_per_site + 1)], dtype=object)
+    samp_locs = np.array([[n.replace(' ', '')[:3] + '.' + c for c in codes] for n in names], dtype=object)
+    df = pd.DataFrame({
+        'LTER_site': 'NWT',
+        'local_site': names[site],
+        'samp_loc': samp_locs[site, loc],
+        'loc_code': codes[loc],
+        'date': np.datetime_as_string(dates.values, unit='D'),
+        'prof_depth': depth,
+        'mass': swe * 1000.0,
+        'wted_temp': temp,
+        'density': density,
+        'swe': swe,
+    }, columns=COLUMNS)
+    missing = rng.random(n_rows) < nan_rate
+    df.loc[missing, ['mass', 'density', 'swe']] = np.nan
+    df.loc[rng.random(n_rows) < missing_site_rate, 'local_site'] = np.nan
+    return df.iloc[np.argsort(dates.values, kind='stable')].reset_index(drop=True)
+
+def write_swe_csv(path, **kwargs):
+    '''
+    Generate synthetic rows (see generate_swe_df) and write them as a csv.
+
+    Returns
+    -------
+    path
+    '''
+    generate_swe_df(**kwargs).to_csv(path, index=False)
+    return path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic snow survey csv.')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--sites', type=int, default=13)
+    parser.add_argument('--locs', type=int, default=5)
+    parser.add_argument('--years', type=int, default=27)
+    parser.add_argument('--nan-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_swe_csv(args.path, n_rows=args.rows, n_sites=args.sites, locs_per_site=args.locs, n_years=args.years,
+                  nan_rate=args.nan_rate, seed=args.seed)
@@ -0,0 +1,146 @@
+import warnings
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from aggregation import aggregate_matrix
+from instrumentation import stage
+
+def linregress_rows(x, Y):
+    '''
+    Ordinary least squares fit of every row of Y against x at once.
+
+    Matches scipy.stats.linregress row by row, ignoring nan entries of each
+    row. Rows with fewer than 3 valid points get nan results, constant rows
+    a zero slope and nan r_value, p_value and standard errors.
+
+    Parameters
+    ----------
+    x: array of shape (T,)
+        e.g. years.
+    Y: array of shape (S, T)
+        e.g. yearly mean swe, one row per site, nan where missing.
+
+    Returns
+    -------
+    Dictionary of (S,) arrays: n, slope, intercept, r_value, p_value,
+    std_err, intercept_stderr
+    '''
+    x = np.asarray(x, dtype=float)
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    mask = ~np.isnan(Y)
+    X = np.where(mask, x, 0.0)
+    Yz = np.where(mask, Y, 0.0)
+    n = mask.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xmean = X.sum(axis=1) / n
+        ymean = Yz.sum(axis=1) / n
+        dx = np.where(mask, x - xmean[:, None], 0.0)
+        dy = np.where(mask, Y - ymean[:, None], 0.0)
+        ssxm = (dx * dx).sum(axis=1) / n
+        ssym = (dy * dy).sum(axis=1) / n
+        ssxym = (dx * dy).sum(axis=1) / n
+        slope = ssxym / ssxm
+        intercept = ymean - slope * xmean
+        # Like linregress, a constant row has no correlation: nan r, p and
+        # standard errors, slope 0.
+        r = np.where(ssym == 0, np.nan, np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0))
+        df = n - 2
+        t = r * np.sqrt(df / ((1.0 - r + 1e-20) * (1.0 + r + 1e-20)))
+        p = 2 * stats.t.sf(np.abs(t), df)
+        std_err = np.sqrt((1 - r ** 2) * ssym / ssxm / df)
+        intercept_stderr = std_err * np.sqrt(ssxm + xmean ** 2)
+    few = n < 3
+    out = {'n': n, 'slope': slope, 'intercept': intercept, 'r_value': r, 'p_value': p,
+           'std_err': std_err, 'intercept_stderr': intercept_stderr}
+    for key in out:
+        if key != 'n':
+            out[key] = np.where(few, np.nan, out[key])
+    return out
+
+def mann_kendall_rows(x, Y):
+    '''
+    Mann-Kendall trend test and Sen's slope for every row of Y at once.
+
+    The variance of S includes the correction for tied values and z uses the
+    usual continuity correction. Rows with fewer than 3 valid points get nan
+    results.
+
+    Parameters
+    ----------
+    x: array of shape (T,)
+    Y: array of shape (S, T), nan where missing
+
+    Returns
+    -------
+    Dictionary of (S,) arrays: mk_s, mk_var, mk_z, mk_p, sen_slope,
+    sen_intercept
+    '''
+    x = np.asarray(x, dtype=float)
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    mask = ~np.isnan(Y)
+    n = mask.sum(axis=1)
+    upper = np.triu(np.ones((len(x), len(x)), dtype=bool), k=1)
+    pairs = mask[:, :, None] & mask[:, None, :] & upper
+    diff = Y[:, None, :] - Y[:, :, None]
+    s = np.where(pairs, np.sign(diff), 0.0).sum(axis=(1, 2))
+
+    # Each member of a tied group of size t sees t - 1 equal partners, so
+    # summing (c - 1)(2c + 5) over valid points equals sum of t(t - 1)(2t + 5).
+    both = mask[:, :, None] & mask[:, None, :]
+    equal = ((diff == 0) & both).sum(axis=2)
+    ties = np.where(mask, (equal - 1) * (2 * equal + 5), 0).sum(axis=1)
+    var = (n * (n - 1) * (2 * n + 5) - ties) / 18.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(s > 0, (s - 1) / np.sqrt(var), np.where(s < 0, (s + 1) / np.sqrt(var), 0.0))
+        p = 2 * stats.norm.sf(np.abs(z))
+        slopes = np.where(pairs, diff / (x[None, :] - x[:, None]), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        sen = np.nanmedian(slopes.reshape(len(Y), -1), axis=1)
+        xmed = np.nanmedian(np.where(mask, x, np.nan), axis=1)
+        ymed = np.nanmedian(np.where(mask, Y, np.nan), axis=1)
+    out = {'mk_s': s, 'mk_var': var, 'mk_z': z, 'mk_p': p, 'sen_slope': sen,
+           'sen_intercept': ymed - sen * xmed}
+    few = n < 3
+    for key in out:
+        out[key] = np.where(few, np.nan, out[key])
+    return out
+
+def trend_table(matrix):
+    '''
+    OLS and Mann-Kendall/Sen trend statistics for every row of a site x year
+    matrix in one vectorized call.
+
+    Parameters
+    ----------
+    matrix: pandas DataFrame
+        Sites as index, years as columns, e.g. from aggregation.aggregate_matrix.
+
+    Returns
+    -------
+    pandas DataFrame indexed by site
+    '''
+    x = np.asarray(matrix.columns, dtype=float)
+    Y = matrix.to_numpy(dtype=float)
+    results = linregress_rows(x, Y)
+    results.update(mann_kendall_rows(x, Y))
+    return pd.DataFrame(results, index=matrix.index)
+
+@stage()
+def site_trends(df, column='swe', stat='mean'):
+    '''
+    Trend table of yearly site summaries straight from a cleaned frame.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe)
+    column: str
+    stat: str
+        Yearly statistic to fit, e.g. 'mean' or 'max'.
+
+    Returns
+    -------
+    pandas DataFrame indexed by site, see trend_table
+    '''
+    return trend_table(aggregate_matrix(df, by='year', column=column, stat=stat))
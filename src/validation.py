@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+from instrumentation import stage
+
+class Rule(object):
+    '''
+    One data quality check. check(df) returns a boolean array that is True
+    for the rows that break the rule.
+
+    Rules are evaluated as whole-column numpy expressions, so a rule costs
+    a few vector operations however many rows there are. Rows with missing
+    values pass value checks, missing data is a separate rule.
+    '''
+    def __init__(self, name, check, columns, reject=True, description=''):
+        '''
+        Parameters
+        ----------
+        name: str
+        check: function of a dataframe returning a boolean array
+        columns: list of str
+            Columns the check reads, the rule is skipped when any is absent.
+        reject: bool
+            Rows breaking the rule are removed by filter_valid, otherwise they
+            are only flagged.
+        description: str
+        '''
+        self.name = name
+        self.check = check
+        self.columns = list(columns)
+        self.reject = reject
+        self.description = description
+
+    def __repr__(self):
+        return 'Rule({!r}, reject={})'.format(self.name, self.reject)
+
+def _values(df, column):
+    return df[column].to_numpy(dtype=float, na_value=np.nan)
+
+def range_rule(column, low=None, high=None, reject=True):
+    '''
+    Rule flagging values of column below low or above high.
+    '''
+    def check(df):
+        values = _values(df, column)
+        bad = np.zeros(len(values), dtype=bool)
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+        return bad
+    return Rule('{}_range'.format(column), check, [column], reject,
+                '{} outside [{}, {}]'.format(column, low, high))
+
+def relation_rule(name, column, expected, columns, rtol=0.05, atol=0.005, reject=True, description=''):
+    '''
+    Rule flagging rows where column differs from expected(df) by more than
+    atol + rtol * |expected|.
+
+    Parameters
+    ----------
+    name: str
+    column: str
+    expected: function of a dataframe returning a float array
+    columns: list of str
+        Columns expected reads.
+    rtol, atol: float
+    reject: bool
+    description: str
+    '''
+    def check(df):
+        target = expected(df)
+        with np.errstate(invalid='ignore'):
+            return np.abs(_values(df, column) - target) > atol + rtol * np.abs(target)
+    return Rule(name, check, [column] + list(columns), reject, description)
+
+def missing_rule(columns, reject=False):
+    '''
+    Rule flagging rows with a missing value in any of columns.
+    '''
+    def check(df):
+        return np.asarray(df[list(columns)].isna().any(axis=1))
+    return Rule('missing_' + '_'.join(columns), check, columns, reject, 'missing {}'.format(', '.join(columns)))
+
+def _location_codes(df):
+    # Within a site each samp_loc should always carry the same loc_code.
+    # Work on integer codes: find (site, samp_loc) keys seen with more than
+    # one code.
+    site, _ = pd.factorize(df['local_site'])
+    loc, _ = pd.factorize(df['samp_loc'])
+    code, _ = pd.factorize(df['loc_code'])
+    keyed = (site >= 0) & (loc >= 0) & (code >= 0)
+    if not keyed.any():
+        return keyed
+    key = site.astype(np.int64) * (loc.max() + 1) + loc
+    n_codes = np.int64(code.max() + 1)
+    pairs = np.unique(key[keyed] * n_codes + code[keyed])
+    ambiguous = np.bincount(pairs // n_codes, minlength=key.max() + 1) > 1
+    return keyed & ambiguous[np.maximum(key, 0)]
+
+LOCATION_RULE = Rule('location_codes', _location_codes, ['local_site', 'samp_loc', 'loc_code'], reject=False,
+                     description='samp_loc recorded with more than one loc_code at a site')
+
+DEFAULT_RULES = [
+    missing_rule(['local_site'], reject=False),
+    range_rule('swe', 0.0, 5.0),
+    range_rule('prof_depth', 0.0, 10.0),
+    range_rule('density', 20.0, 917.0),
+    range_rule('mass', 0.0, 5000.0),
+    # swe (m) is depth (m) times density (kg/m3) over the density of water.
+    relation_rule('swe_depth_density', 'swe', lambda df: _values(df, 'prof_depth') * _values(df, 'density') / 1000.0,
+                  ['prof_depth', 'density'], description='swe != prof_depth * density / 1000'),
+    # mass is reported per square meter, 1000 kg for every meter of swe.
+    relation_rule('mass_swe', 'mass', lambda df: _values(df, 'swe') * 1000.0, ['swe'],
+                  description='mass != swe * 1000'),
+    # Warm pits are possible during melt, so temperature is a warning only.
+    range_rule('wted_temp', high=0.0, reject=False),
+    LOCATION_RULE,
+]
+
+@stage(rows=lambda flags, args, kwargs: len(flags))
+def validate(df, rules=DEFAULT_RULES):
+    '''
+    Evaluate every rule over df.
+
+    Parameters
+    ----------
+    df: dataframe (cleaned df_swe, csv or compact layout)
+    rules: list of Rule
+        At most 32, rule i sets bit i of the flags.
+
+    Returns
+    -------
+    uint32 numpy array of flag bitmasks, one per row, 0 for clean rows
+    '''
+    if len(rules) > 32:
+        raise ValueError('at most 32 rules fit in the flag bitmask, got {}'.format(len(rules)))
+    flags = np.zeros(len(df), dtype=np.uint32)
+    for bit, rule in enumerate(rules):
+        if all(col in df.columns for col in rule.columns):
+            flags |= np.asarray(rule.check(df), dtype=bool).astype(np.uint32) << np.uint32(bit)
+    return flags
+
+def reject_mask(rules=DEFAULT_RULES):
+    '''
+    Bitmask of the rules whose rows filter_valid removes.
+    '''
+    return np.uint32(sum(1 << bit for bit, rule in enumerate(rules) if rule.reject))
+
+def flag_names(flags, rules=DEFAULT_RULES):
+    '''
+    Names of the rules set in one flag bitmask.
+    '''
+    return [rule.name for bit, rule in enumerate(rules) if int(flags) >> bit & 1]
+
+def site_summary(df, flags, rules=DEFAULT_RULES, site_col='local_site'):
+    '''
+    Per-site counts of flagged rows and of each rule's violations.
+
+    Parameters
+    ----------
+    df: dataframe
+    flags: validate(df, rules)
+    rules: list of Rule
+    site_col: str
+
+    Returns
+    -------
+    pandas DataFrame indexed by site with rows, flagged and rejected columns
+    and one column per rule. Rows without a site are counted under None.
+    '''
+    codes, sites = pd.factorize(df[site_col])
+    n_sites = len(sites)
+    # Unlabelled rows go in an extra last bucket.
+    codes = np.where(codes < 0, n_sites, codes)
+    counts = {'rows': np.bincount(codes, minlength=n_sites + 1),
+              'flagged': np.bincount(codes, weights=flags != 0, minlength=n_sites + 1),
+              'rejected': np.bincount(codes, weights=(flags & reject_mask(rules)) != 0, minlength=n_sites + 1)}
+    for bit, rule in enumerate(rules):
+        counts[rule.name] = np.bincount(codes, weights=(flags >> np.uint32(bit)) & 1, minlength=n_sites + 1)
+    summary = pd.DataFrame(counts, index=pd.Index(list(sites) + [None], name=site_col)).astype(np.int64)
+    if not summary['rows'].iloc[-1]:
+        summary = summary.iloc[:-1]
+    return summary
+
+def filter_valid(df, flags=None, rules=DEFAULT_RULES):
+    '''
+    Split df into the rows to keep and the quarantined rows that break a
+    rejecting rule.
+
+    Parameters
+    ----------
+    df: dataframe
+    flags: array or None
+        validate(df, rules), computed here if None.
+    rules: list of Rule
+
+    Returns
+    -------
+    (kept dataframe, quarantined dataframe). The quarantined rows carry
+    their bitmask in a 'flags' column and the rule names in 'failed'.
+    Indexes are reset on both.
+    '''
+    if flags is None:
+        flags = validate(df, rules)
+    rejected = (flags & reject_mask(rules)) != 0
+    if not rejected.any():
+        return df, df.iloc[:0].assign(flags=np.uint32(0), failed='')
+    kept = df[~rejected].reset_index(drop=True)
+    quarantined = df[rejected].reset_index(drop=True)
+    quarantined['flags'] = flags[rejected]
+    # Few distinct bitmasks, so name each once.
+    unique, inverse = np.unique(flags[rejected], return_inverse=True)
+    names = np.array([','.join(flag_names(f, rules)) for f in unique], dtype=object)
+    quarantined['failed'] = names[inverse.ravel()]
+    return kept, quarantined
+
+if __name__ == '__main__':
+    import argparse
+    from data_cleaning import load_swe_df
+    parser = argparse.ArgumentParser(description='Check the cleaned SWE data against the quality rules.')
+    parser.add_argument('--csv', default=None, help='defaults to data_cleaning.DEFAULT_CSV')
+    parser.add_argument('--quarantine', default=None, help='write the rejected rows to this csv')
+    args = parser.parse_args()
+
+    df_swe = load_swe_df(args.csv)
+    flags = validate(df_swe)
+    print(site_summary(df_swe, flags).to_string())
+    if args.quarantine:
+        kept, quarantined = filter_valid(df_swe, flags)
+        quarantined.to_csv(args.quarantine, index=False)
+        print('{} of {} rows quarantined to {}'.format(len(quarantined), len(df_swe), args.quarantine))
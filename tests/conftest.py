@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+@pytest.fixture
+def swe_csv(tmp_path):
+    '''
+    Small synthetic snow survey csv in the snowateq schema.
+    '''
+    from synthetic_data import write_swe_csv
+    path = str(tmp_path / 'swe.csv')
+    write_swe_csv(path, n_rows=600, seed=1)
+    return path
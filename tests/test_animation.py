@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+from animation import read_image, write_animation
+
+COLORS = [(255, 0, 0), (0, 128, 255), (20, 200, 40)]
+
+def _frames(size=(12, 20)):
+    return [np.full(size + (3,), color, dtype=np.uint8) for color in COLORS]
+
+def _read(path):
+    with Image.open(path) as im:
+        info = dict(im.info)
+        frames = [(frame.info['duration'], np.asarray(frame.convert('RGB'))) for frame in ImageSequence.Iterator(im)]
+    return info, frames
+
+def test_gif_frames_durations_and_loop(tmp_path):
+    path = str(tmp_path / 'anim.gif')
+    assert write_animation(_frames(), path, duration=[0.1, 0.2, 0.3], loop=3) == 3
+    info, frames = _read(path)
+    assert info['loop'] == 3
+    assert [duration for duration, _ in frames] == [100, 200, 300]
+    for (_, pixels), color in zip(frames, COLORS):
+        assert pixels.shape == (12, 20, 3)
+        assert (np.abs(pixels.astype(int) - color) <= 8).all()
+
+def test_gif_loop_forever_or_once(tmp_path):
+    forever, once = str(tmp_path / 'forever.gif'), str(tmp_path / 'once.gif')
+    write_animation(_frames(), forever, duration=0.5, loop=0)
+    write_animation(_frames(), once, duration=0.5, loop=None)
+    info, frames = _read(forever)
+    assert info['loop'] == 0 and [d for d, _ in frames] == [500] * 3
+    assert 'loop' not in _read(once)[0]
+
+def test_gif_frames_must_share_a_size(tmp_path):
+    with pytest.raises(ValueError):
+        write_animation(_frames()[:1] + _frames((10, 20))[1:], str(tmp_path / 'bad.gif'))
+
+def test_read_image(tmp_path):
+    path = str(tmp_path / 'background.png')
+    Image.fromarray(_frames()[1]).save(path)
+    assert (read_image(path) == _frames()[1]).all()
@@ -0,0 +1,23 @@
+import json
+from benchmark import BASELINE, DEFAULT_SIZES, compare, pipeline_stages
+
+def _result(stage, rows, seconds):
+    return {'stage': stage, 'rows': rows, 'seconds': seconds, 'peak_mb': None}
+
+def test_compare_reports_only_slowdowns_over_the_threshold():
+    baseline = [_result('clean', 1000, 1.0), _result('plot', 1000, 0.5), _result('tiny', 1000, 0.001),
+                _result('clean', 2000, 2.0)]
+    results = [_result('clean', 1000, 1.3), _result('plot', 1000, 0.6), _result('tiny', 1000, 0.005),
+               _result('clean', 2000, 1.0), _result('new_stage', 1000, 9.0)]
+    regressions = compare(results, baseline, tolerance=0.25)
+    assert regressions == [{'stage': 'clean', 'rows': 1000, 'baseline': 1.0, 'seconds': 1.3,
+                            'ratio': 1.3}]
+    assert [r['stage'] for r in compare(results, baseline, tolerance=0.1)] == ['clean', 'plot']
+
+def test_baseline_covers_every_stage_and_size():
+    with open(BASELINE) as f:
+        stored = json.load(f)
+    covered = {(r['stage'], r['rows']) for r in stored['results']}
+    stages = [name for name, _ in pipeline_stages('unused.csv')]
+    assert covered == {(stage, rows) for stage in stages for rows in DEFAULT_SIZES}
+    assert compare(stored['results'], stored['results']) == []
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from climatology import Climatology
+
+# One site surveyed on Feb 1 of five water years, swe 1 to 5: mean 3,
+# sample std sqrt(2.5), median 3 and quartiles 2 and 4.
+STD = np.sqrt(2.5)
+
+@pytest.fixture
+def history():
+    dates = pd.to_datetime(['{}-02-01'.format(year) for year in range(2001, 2006)])
+    return pd.DataFrame({'local_site': ['A'] * 5, 'date': dates, 'swe': [1.0, 2.0, 3.0, 4.0, 5.0]})
+
+@pytest.fixture
+def clim(history):
+    return Climatology.build(history)
+
+def test_score_against_day_baselines(clim):
+    new = pd.DataFrame({'local_site': ['A', 'A', 'A', 'B', 'A'],
+                        'date': pd.to_datetime(['2006-02-01', '2006-02-10', '2006-01-25', '2006-02-01', '2006-05-01']),
+                        'swe': [4.0, 0.5, 6.0, 4.0, 4.0]})
+    scores = clim.score(new)
+    np.testing.assert_allclose(scores['clim_mean'][:3], 3.0)
+    np.testing.assert_allclose(scores['anomaly'][:3], [1.0, -2.5, 3.0])
+    np.testing.assert_allclose(scores['z_score'][:3], [1 / STD, -2.5 / STD, 3 / STD])
+    np.testing.assert_allclose(scores['pct_of_median'][:3], [400 / 3, 50 / 3, 200])
+    np.testing.assert_allclose(scores['percentile'][:3], [75.0, 0.0, 100.0])
+    # Unknown site, and a day with no surveys within the window.
+    assert scores.iloc[3:].drop(columns='day_of_water_year').isna().all().all()
+
+def test_score_seasons(clim):
+    new = pd.DataFrame({'local_site': ['A', 'A', 'B'],
+                        'date': pd.to_datetime(['2006-01-15', '2006-03-15', '2006-02-01']), 'swe': [1.0, 3.0, 2.0]})
+    seasons = clim.score_seasons(new).set_index('local_site')
+    a = seasons.loc['A']
+    assert a['water_year'] == 2006 and a['value'] == 2.0
+    assert a['percentile'] == pytest.approx(25.0)
+    assert a['z_score'] == pytest.approx(-1 / STD)
+    assert a['pct_of_median'] == pytest.approx(200 / 3)
+    assert np.isnan(seasons.loc['B', 'percentile'])
+
+def test_save_load_round_trip(clim, history, tmp_path):
+    path = clim.save(str(tmp_path / 'clim' / 'swe.npz'))
+    loaded = Climatology.load(path)
+    assert loaded.sites == clim.sites and loaded.params == clim.params
+    for group in ('day', 'season'):
+        for key, values in getattr(clim, group).items():
+            np.testing.assert_array_equal(getattr(loaded, group)[key], values)
+    pd.testing.assert_frame_equal(loaded.score(history), clim.score(history))
+    pd.testing.assert_frame_equal(loaded.score_seasons(history), clim.score_seasons(history))
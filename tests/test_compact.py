@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aggregation import aggregate, aggregate_matrix, mean_series
+from compact import compact_frame, expand_frame
+from data_cleaning import clean_swe_df
+
+@pytest.fixture
+def df_swe(swe_csv):
+    df = clean_swe_df(swe_csv)
+    df.loc[::7, 'wted_temp'] = np.nan
+    assert df['local_site'].isna().any()
+    return df
+
+def test_expand_round_trips_exactly_without_float32(df_swe):
+    compact = compact_frame(df_swe, float32=False)
+    assert isinstance(compact['local_site'].dtype, pd.CategoricalDtype)
+    assert 'date' not in compact.columns and compact['day'].dtype == np.int32
+    pd.testing.assert_frame_equal(expand_frame(compact), df_swe)
+
+def test_expand_round_trips_float32_within_precision(df_swe):
+    compact = compact_frame(df_swe)
+    assert compact['swe'].dtype == np.float32
+    expanded = expand_frame(compact)
+    assert expanded.dtypes.equals(df_swe.dtypes)
+    assert expanded['wted_temp'].isna().equals(df_swe['wted_temp'].isna())
+    pd.testing.assert_frame_equal(expanded, df_swe, rtol=1e-6)
+
+@pytest.mark.parametrize('by', ['year', 'month', 'water_year', 'samp_loc'])
+def test_aggregates_match_the_csv_layout(df_swe, by):
+    compact = compact_frame(df_swe)
+    expected = aggregate(df_swe, by=by, columns=['swe', 'density'])
+    result = aggregate(compact, by=by, columns=['swe', 'density'])
+    assert len(result) == len(expected)
+    for col in expected.columns:
+        if expected[col].dtype == float:
+            np.testing.assert_allclose(result[col].to_numpy(dtype=float), expected[col].to_numpy(), rtol=1e-5,
+                                       err_msg=col)
+        else:
+            assert result[col].astype(object).tolist() == expected[col].astype(object).tolist(), col
+
+def test_matrix_and_means_match_the_csv_layout(df_swe):
+    compact = compact_frame(df_swe)
+    pd.testing.assert_frame_equal(aggregate_matrix(compact), aggregate_matrix(df_swe), rtol=1e-5,
+                                  check_dtype=False, check_index_type=False, check_names=False)
+    pd.testing.assert_series_equal(mean_series(compact, by='month'), mean_series(df_swe, by='month'), rtol=1e-5,
+                                   check_dtype=False)
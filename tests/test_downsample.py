@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from downsample import Pyramid, downsample, lttb_indices, minmax_indices
+
+def _series(seed, n):
+    rng = np.random.default_rng(seed)
+    x = np.sort(rng.random(n)) * 1000
+    y = rng.normal(size=n) if seed % 2 else rng.normal(size=n).cumsum()
+    return x, y
+
+def _keeps_shape(idx, y):
+    assert (np.diff(idx) > 0).all()
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+    assert y[idx].min() == y.min() and y[idx].max() == y.max()
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('budget', [4, 5, 50, 333])
+def test_lttb_keeps_endpoints_and_extremes(seed, budget):
+    x, y = _series(seed, 5000)
+    idx = lttb_indices(x, y, budget)
+    assert len(idx) == budget
+    _keeps_shape(idx, y)
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('buckets', [1, 7, 100])
+def test_minmax_keeps_endpoints_and_extremes(seed, buckets):
+    x, y = _series(seed, 5000)
+    idx = minmax_indices(x, y, buckets)
+    assert len(idx) <= 2 * buckets + 2
+    _keeps_shape(idx, y)
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+@pytest.mark.parametrize('seed', range(10))
+def test_downsample_stays_within_budget(method, seed):
+    x, y = _series(seed, 20000)
+    idx = downsample(x, y, 500, method)
+    assert len(idx) <= 500
+    _keeps_shape(idx, y)
+    assert (downsample(x[:100], y[:100], 500, method) == np.arange(100)).all()
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pyramid_view_stays_within_budget(seed):
+    x, y = _series(seed, 50000)
+    pyramid = Pyramid(x, y)
+    rng = np.random.default_rng(seed)
+    for _ in range(50):
+        start, end = np.sort(rng.uniform(-10, 1010, 2))
+        budget = int(rng.integers(10, 3000))
+        idx = pyramid.view(start, end, budget)
+        assert 0 < len(idx) <= budget
+        assert (np.diff(idx) > 0).all()
+        # Only the points drawn to reach the edges fall outside the range.
+        inside = x[idx[1:-1]]
+        assert ((inside >= start) & (inside <= end)).all()
+    full = pyramid.view(max_points=2000)
+    assert len(full) <= 2000
+    _keeps_shape(full, y)
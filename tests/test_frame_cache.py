@@ -0,0 +1,32 @@
+import os
+import pandas as pd
+from frame_cache import cached_frame, list_cache
+
+def _build(calls, value):
+    def build():
+        calls.append(value)
+        return pd.DataFrame({'x': [value]})
+    return build
+
+def test_entries_for_other_params_survive(swe_csv, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    calls = []
+    cached_frame(swe_csv, _build(calls, 1), {'compact': False}, cache_dir)
+    cached_frame(swe_csv, _build(calls, 2), {'compact': True}, cache_dir)
+    assert cached_frame(swe_csv, _build(calls, 3), {'compact': False}, cache_dir)['x'][0] == 1
+    assert cached_frame(swe_csv, _build(calls, 4), {'compact': True}, cache_dir)['x'][0] == 2
+    assert calls == [1, 2]
+    assert len(list_cache(cache_dir)) == 2
+
+def test_changed_source_evicts_stale_entries(swe_csv, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cached_frame(swe_csv, _build([], 1), {'compact': False}, cache_dir)
+    cached_frame(swe_csv, _build([], 2), {'compact': True}, cache_dir)
+    with open(swe_csv, 'a') as f:
+        f.write('\n')
+    st = os.stat(swe_csv)
+    os.utime(swe_csv, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    calls = []
+    assert cached_frame(swe_csv, _build(calls, 3), {'compact': False}, cache_dir)['x'][0] == 3
+    assert calls == [3]
+    assert len(list_cache(cache_dir)) == 1
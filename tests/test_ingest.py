@@ -0,0 +1,131 @@
+import asyncio
+import http.server
+import json
+import os
+import pathlib
+import threading
+import pandas as pd
+import pytest
+import ingest
+from ingest import MANIFEST, iter_remote_chunks, refresh
+from streaming import iter_clean_chunks
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    '''
+    Serves server.files, a dict of path -> {'body', 'etag', 'fail'}, where
+    fail is a list of responses to give first: an http status, or
+    'short' for a body cut off before its Content-Length.
+    '''
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        entry = self.server.files.get(self.path)
+        if entry is None:
+            self.send_error(404)
+            return
+        fail = entry['fail'].pop(0) if entry['fail'] else None
+        if fail == 'short':
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(entry['body']) + 100))
+            self.end_headers()
+            self.wfile.write(entry['body'][:5])
+            self.close_connection = True
+            return
+        if fail is not None:
+            self.send_response(fail)
+            if fail == 429:
+                self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == entry['etag']:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', entry['etag'])
+        self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.send_header('Content-Length', str(len(entry['body'])))
+        self.end_headers()
+        self.wfile.write(entry['body'])
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.files, httpd.requests = {}, []
+    httpd.url = 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Record backoff delays instead of waiting them out.
+    delays = []
+    real_sleep = asyncio.sleep
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+    monkeypatch.setattr(ingest.asyncio, 'sleep', sleep)
+    monkeypatch.setattr(ingest.random, 'uniform', lambda low, high: 1.0)
+    return delays
+
+def _serve(server, path, body, etag='"v1"', fail=()):
+    server.files[path] = {'body': body, 'etag': etag, 'fail': list(fail)}
+    return server.url + path
+
+def _manifest(dest):
+    with open(os.path.join(dest, MANIFEST)) as f:
+        return json.load(f)
+
+def test_unchanged_file_is_not_downloaded_again(server, tmp_path):
+    dest = str(tmp_path / 'data')
+    url = _serve(server, '/swe.csv', b'a,b\n1,2\n')
+    assert [r.status for r in refresh([url], dest)] == ['downloaded']
+    assert _manifest(dest)['swe.csv']['etag'] == '"v1"'
+    assert [r.status for r in refresh([url], dest)] == ['unchanged']
+    assert server.requests[-1] == ('/swe.csv', '"v1"')
+
+    _serve(server, '/swe.csv', b'a,b\n3,4\n', etag='"v2"')
+    [result] = refresh([url], dest)
+    assert result.status == 'downloaded' and result.bytes == 8
+    assert _manifest(dest)['swe.csv']['etag'] == '"v2"'
+    assert pathlib.Path(dest, 'swe.csv').read_bytes() == b'a,b\n3,4\n'
+
+def test_retries_with_backoff_and_reports_errors(server, tmp_path, sleeps):
+    urls = [_serve(server, '/flaky.csv', b'x\n1\n', fail=[503, 502]),
+            _serve(server, '/busy.csv', b'x\n2\n', fail=[429]),
+            server.url + '/missing.csv']
+    flaky, busy, missing = refresh(urls, str(tmp_path / 'data'), connections=1, retries=3, backoff=0.25)
+    assert (flaky.status, flaky.attempts) == ('downloaded', 3)
+    assert (busy.status, busy.attempts) == ('downloaded', 2)
+    assert (missing.status, missing.attempts) == ('error', 1) and '404' in missing.error
+    # Exponential backoff for the 5xx responses, Retry-After for the 429.
+    assert sorted(sleeps) == [0, 0.25, 0.5]
+
+def test_short_or_failed_body_keeps_the_existing_file(server, tmp_path, sleeps):
+    dest = str(tmp_path / 'data')
+    url = _serve(server, '/swe.csv', b'a,b\n1,2\n')
+    refresh([url], dest)
+    for fail in (['short', 'short'], [500, 500]):
+        _serve(server, '/swe.csv', b'a,b\n3,4\n', etag='"v2"', fail=fail)
+        [result] = refresh([url], dest, retries=1, backoff=0.01)
+        assert result.status == 'error'
+        assert pathlib.Path(dest, 'swe.csv').read_bytes() == b'a,b\n1,2\n'
+        assert _manifest(dest)['swe.csv']['etag'] == '"v1"'
+    assert sorted(os.listdir(dest)) == [MANIFEST, 'swe.csv']
+
+def test_remote_chunks_match_local_chunks(swe_csv):
+    url = pathlib.Path(swe_csv).as_uri()
+    remote = pd.concat(iter_remote_chunks(url, chunksize=100), ignore_index=True)
+    local = pd.concat(iter_clean_chunks(swe_csv, chunksize=100), ignore_index=True)
+    pd.testing.assert_frame_equal(remote, local)
+
+def test_remote_chunks_over_http(server, swe_csv):
+    url = _serve(server, '/swe.csv', pathlib.Path(swe_csv).read_bytes())
+    remote = pd.concat(iter_remote_chunks(url, chunksize=100), ignore_index=True)
+    pd.testing.assert_frame_equal(remote, pd.concat(iter_clean_chunks(swe_csv, chunksize=100), ignore_index=True))
@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+from interpolation import site_points
+from site_locations import MAP_CENTER, SITE_LOCATIONS
+
+def test_site_points_accepts_csv_labels():
+    points = site_points(['SADDLE', 'Tower Tree Well'])
+    assert points.shape == (2, 2)
+    lat, lon = SITE_LOCATIONS['Saddle']
+    assert np.sign(points[0, 1]) == np.sign(lat - MAP_CENTER[0])
+
+def test_site_points_names_the_missing_site():
+    with pytest.raises(ValueError, match='NOWHERE'):
+        site_points(['SADDLE', 'NOWHERE'])
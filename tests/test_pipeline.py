@@ -0,0 +1,44 @@
+import inspect
+import os
+import pickle
+import pytest
+import aggregation
+import pipeline
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, 'CACHE_DIR', str(tmp_path / 'cache'))
+
+def test_only_runs_named_stage_and_inputs(swe_csv, tmp_path):
+    out = str(tmp_path / 'images')
+    argv = ['--csv', swe_csv, '--out', out, '--cache-dir', str(tmp_path / 'stages'), '--workers', '1',
+            '--dpi', '40', '--only', 'fig_yearly']
+    assert pipeline.main(argv) == 0
+    assert os.listdir(out) == ['average_yearly_swe_allsites40.png']
+
+def test_only_unknown_stage_is_an_error(swe_csv, tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        pipeline.main(['--csv', swe_csv, '--cache-dir', str(tmp_path / 'stages'), '--only', 'nope'])
+    assert exit_info.value.code == 2
+    assert 'unknown stages nope' in capsys.readouterr().err
+
+def test_aggregation_code_is_part_of_the_means_keys(swe_csv, monkeypatch):
+    stages = {stage.name: stage for stage in pipeline.report_stages(swe_csv)}
+    names = ['load', 'yearly_means', 'monthly_means', 'combined_means', 'year_matrix']
+    before = {name: pipeline.stage_key(stages[name], ['x']) for name in names}
+    getsource = inspect.getsource
+    monkeypatch.setattr(inspect, 'getsource', lambda obj: getsource(obj) + ('#' if obj is aggregation.mean_series else ''))
+    after = {name: pipeline.stage_key(stages[name], ['x']) for name in names}
+    assert before['load'] == after['load']
+    assert all(before[name] != after[name] for name in names[1:])
+
+def test_missing_csv_is_an_error(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        pipeline.main(['--csv', str(tmp_path / 'missing.csv'), '--cache-dir', str(tmp_path / 'stages'),
+                       '--workers', '1'])
+    assert exit_info.value.code == 2
+    assert 'cannot read' in capsys.readouterr().err
+
+def test_stages_can_be_sent_to_workers(swe_csv):
+    for stage in pipeline.report_stages(swe_csv):
+        assert pickle.loads(pickle.dumps(stage)).name == stage.name
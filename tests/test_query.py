@@ -0,0 +1,17 @@
+from data_cleaning import load_swe_df
+from query import SWEIndex
+
+def test_query_without_sites_returns_an_empty_frame(swe_csv):
+    df_swe = load_swe_df(swe_csv)
+    index = SWEIndex(df_swe)
+    for out in (index.query(sites=[]), index.query(sites=[], start='2000-01-01', months=[1, 2], samp_loc='a')):
+        assert len(out) == 0
+        assert list(out.columns) == list(df_swe.columns)
+
+def test_query_site_matches_a_scan(swe_csv):
+    df_swe = load_swe_df(swe_csv)
+    site = df_swe['local_site'].dropna().iloc[0]
+    out = SWEIndex(df_swe).query(sites=[site], start='1995-01-01', end='2005-12-31')
+    dates = df_swe['date']
+    expected = df_swe[(df_swe['local_site'] == site) & (dates >= '1995-01-01') & (dates <= '2005-12-31')]
+    assert len(out) == len(expected)
@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+from data_cleaning import clean_swe_df
+from resampling import site_resampled_trends
+
+@pytest.fixture
+def df_swe(swe_csv):
+    return clean_swe_df(swe_csv)
+
+def _trends(df, seed, workers):
+    return site_resampled_trends(df, n_resamples=600, batch_size=100, seed=seed, workers=workers)
+
+def test_results_do_not_depend_on_workers(df_swe):
+    serial = _trends(df_swe, 7, 1)
+    assert serial['ci_low'].notna().any()
+    pd.testing.assert_frame_equal(serial, _trends(df_swe, 7, 4))
+
+def test_seed_changes_the_intervals(df_swe):
+    first, second = _trends(df_swe, 7, 1), _trends(df_swe, 8, 1)
+    pd.testing.assert_series_equal(first['slope'], second['slope'])
+    valid = first['ci_low'].notna()
+    assert (first.loc[valid, ['ci_low', 'ci_high']] != second.loc[valid, ['ci_low', 'ci_high']]).any().all()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import result_cache
+import data_cleaning as dc
+from aggregation import mean_series
+from sample_site_class import build_sample_sites
+
+@pytest.fixture
+def df_swe(swe_csv):
+    result_cache.clear()
+    return dc.clean_swe_df(swe_csv)
+
+def test_reassigned_column_is_not_served_from_cache(df_swe):
+    before = mean_series(df_swe)
+    assert mean_series(df_swe).equals(before)
+    df_swe['swe'] = df_swe['swe'] * 2
+    np.testing.assert_allclose(mean_series(df_swe).to_numpy(), before.to_numpy() * 2)
+    df_swe['swe'] *= 2
+    np.testing.assert_allclose(mean_series(df_swe).to_numpy(), before.to_numpy() * 4)
+
+def test_queried_frame_stays_writable(df_swe):
+    dc.get_site_summaries(df_swe)
+    df_swe.loc[0, 'swe'] = 1.0
+    df_swe['swe'] *= 2
+    assert df_swe.loc[0, 'swe'] == 2.0
+    site = build_sample_sites(df_swe)[0]
+    site.yearly_mean_swe()
+    site.df.loc[0, 'swe'] = 3.0
+    assert site.df.loc[0, 'swe'] == 3.0
+
+def test_in_place_edit_needs_invalidate(df_swe):
+    before = mean_series(df_swe)
+    year = before.first_valid_index()
+    rows = (df_swe['date'].dt.year == year).to_numpy()
+    df_swe.loc[rows, 'swe'] = 10.0
+    # Writes into an existing array are not detected until invalidate.
+    result_cache.invalidate(df_swe)
+    assert mean_series(df_swe)[year] == 10.0
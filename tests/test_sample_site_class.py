@@ -0,0 +1,22 @@
+import pandas as pd
+from data_cleaning import clean_swe_df
+from sample_site_class import SampleSite, build_sample_sites, partition_sites
+
+def test_partition_leaves_out_unlabelled_rows(swe_csv):
+    df_swe = clean_swe_df(swe_csv)
+    assert df_swe['local_site'].isna().any()
+    parts, names, offsets = partition_sites(df_swe)
+    assert parts['local_site'].notna().all()
+    assert offsets[-1] == len(parts) == df_swe['local_site'].notna().sum()
+    assert names == list(df_swe['local_site'].dropna().unique())
+
+def test_sites_match_masked_copies(swe_csv):
+    df_swe = clean_swe_df(swe_csv)
+    sites = build_sample_sites(df_swe)
+    assert [site.site_name for site in sites] == list(df_swe['local_site'].dropna().unique())
+    for site in sites:
+        masked = SampleSite(site.site_name, main_df=df_swe)
+        assert len(site.df) == len(masked.df)
+        pd.testing.assert_frame_equal(site.df, masked.df)
+        assert pd.Index(site.local_site_names).equals(pd.Index(masked.local_site_names))
+        assert pd.Index(site.local_site_codes).equals(pd.Index(masked.local_site_codes))
@@ -0,0 +1,39 @@
+import os
+import pandas as pd
+import pytest
+from data_cleaning import load_swe_df
+from season_store import SeasonStore, SORT_KEYS
+
+def _years(df, *years):
+    return df[df['date'].dt.year.isin(years)]
+
+@pytest.fixture
+def df_swe(swe_csv):
+    return load_swe_df(swe_csv).sort_values(SORT_KEYS, kind='stable').reset_index(drop=True)
+
+def test_overlapping_rows_rewrite_only_the_segments_they_reach(df_swe, tmp_path):
+    years = sorted(df_swe['date'].dt.year.unique())
+    store = SeasonStore.create(str(tmp_path / 'store'), _years(df_swe, *years[:2]))
+    store.append(_years(df_swe, *years[4:6]))
+    store.append(_years(df_swe, *years[8:]))
+    before = [seg['file'] for seg in store.manifest['segments']]
+    store.append(_years(df_swe, years[5]).iloc[:3])
+    after = [seg['file'] for seg in store.manifest['segments']]
+    assert after[0] == before[0] and after[2] == before[2] and after[1] != before[1]
+    assert sorted(os.listdir(store.directory)) == sorted(after + ['manifest.json', store.manifest['aggregates']])
+    expected = pd.concat([_years(df_swe, *years[:2], *years[4:6], *years[8:]), _years(df_swe, years[5]).iloc[:3]])
+    assert len(SeasonStore(store.directory).frame()) == len(expected)
+
+def test_interrupted_append_keeps_the_previous_version(df_swe, tmp_path, monkeypatch):
+    years = sorted(df_swe['date'].dt.year.unique())
+    store = SeasonStore.create(str(tmp_path / 'store'), _years(df_swe, *years[:4]))
+    rows = len(store.frame())
+    def crash(self):
+        raise OSError('disk full')
+    monkeypatch.setattr(SeasonStore, '_save_manifest', crash)
+    with pytest.raises(OSError):
+        store.append(_years(df_swe, years[2]))
+    reopened = SeasonStore(store.directory)
+    assert reopened.version == 0
+    assert len(reopened.frame()) == rows
+    assert reopened.aggregates.rows == rows
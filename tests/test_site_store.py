@@ -0,0 +1,14 @@
+import numpy as np
+from data_cleaning import load_swe_df
+from site_store import SiteStore
+
+def test_site_frame_columns_are_views_of_the_store(swe_csv, tmp_path):
+    store = SiteStore.create(str(tmp_path / 'store'), load_swe_df(swe_csv))
+    site = store.sites[0]
+    frame = store.site_frame(site)
+    lo, hi = store.site_bounds(site)
+    assert len(frame) == hi - lo
+    for col in ['day'] + store.index['columns']:
+        assert np.shares_memory(frame[col].to_numpy(), store.array(col))
+    assert len(store.sample_site(site).df) == hi - lo
+    assert len(store.aggregate())
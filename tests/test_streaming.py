@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aggregation import aggregate
+from data_cleaning import clean_swe_df
+from streaming import iter_clean_chunks, stream_aggregates
+
+STATS = ['mean', 'count', 'std', 'min', 'max']
+COLUMNS = ['swe', 'density']
+
+@pytest.mark.parametrize('by', ['year', 'month'])
+@pytest.mark.parametrize('site_col', ['local_site', None])
+def test_stream_summary_matches_aggregate(swe_csv, by, site_col):
+    streamed = stream_aggregates(swe_csv, columns=COLUMNS, chunksize=37).summary(by=by, site_col=site_col)
+    expected = aggregate(clean_swe_df(swe_csv), by=by, columns=COLUMNS, stats=STATS, site_col=site_col)
+    keys = [by] if site_col is None else [site_col, by]
+    streamed = streamed.sort_values(keys).reset_index(drop=True)
+    expected = expected.sort_values(keys).reset_index(drop=True)
+    assert len(streamed) == len(expected)
+    for col in keys:
+        assert streamed[col].astype(object).tolist() == expected[col].astype(object).tolist()
+    for name in ['{}_{}'.format(c, s) for c in COLUMNS for s in STATS]:
+        np.testing.assert_allclose(streamed[name].to_numpy(dtype=float), expected[name].to_numpy(dtype=float),
+                                   rtol=1e-9, err_msg=name)
+
+def test_chunks_drop_the_rows_clean_swe_df_drops(swe_csv, tmp_path):
+    path = str(tmp_path / 'blank.csv')
+    raw = pd.read_csv(swe_csv)
+    blank = pd.DataFrame([[np.nan] * raw.shape[1]], columns=raw.columns)
+    pd.concat([raw.iloc[:50], blank, raw.iloc[50:]]).to_csv(path, index=False)
+    streamed = pd.concat(iter_clean_chunks(path, chunksize=40, subset=()), ignore_index=True)
+    assert len(streamed) == len(clean_swe_df(path, subset=()))
@@ -0,0 +1,28 @@
+import numpy as np
+import scipy.stats as stats
+from trends import linregress_rows
+
+FIELDS = [('slope', 'slope'), ('intercept', 'intercept'), ('r_value', 'rvalue'), ('p_value', 'pvalue'),
+          ('std_err', 'stderr'), ('intercept_stderr', 'intercept_stderr')]
+
+def test_rows_match_scipy_linregress():
+    rng = np.random.default_rng(0)
+    x = np.arange(1990, 2010, dtype=float)
+    Y = rng.normal(size=(4, len(x))) + 0.05 * x
+    Y[1, ::3] = np.nan
+    Y[2] = 0.7
+    Y[3, 5:] = np.nan
+    Y[3, :5] = 1.5
+    out = linregress_rows(x, Y)
+    for i, row in enumerate(Y):
+        valid = ~np.isnan(row)
+        expected = stats.linregress(x[valid], row[valid])
+        for ours, theirs in FIELDS:
+            np.testing.assert_allclose(out[ours][i], getattr(expected, theirs), rtol=1e-9, atol=1e-12,
+                                       err_msg='row {} {}'.format(i, ours))
+
+def test_constant_row_has_nan_statistics():
+    out = linregress_rows(np.arange(6.0), np.full((1, 6), 2.0))
+    assert out['slope'][0] == 0.0 and out['intercept'][0] == 2.0
+    for key in ('r_value', 'p_value', 'std_err', 'intercept_stderr'):
+        assert np.isnan(out[key][0]), key
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from validation import (DEFAULT_RULES, LOCATION_RULE, filter_valid, flag_names, range_rule, reject_mask,
+                        validate)
+
+RULES = {rule.name: rule for rule in DEFAULT_RULES}
+
+def _rows(**columns):
+    n = len(next(iter(columns.values())))
+    base = {'date': pd.date_range('2000-01-01', periods=n), 'local_site': ['A'] * n, 'samp_loc': ['p1'] * n,
+            'loc_code': ['c1'] * n, 'swe': [0.3] * n, 'prof_depth': [1.0] * n, 'density': [300.0] * n,
+            'mass': [300.0] * n, 'wted_temp': [-2.0] * n}
+    base.update(columns)
+    return pd.DataFrame(base)
+
+def test_range_rule():
+    df = pd.DataFrame({'swe': [-0.1, 0.0, 2.5, 5.0, 5.1, np.nan]})
+    assert range_rule('swe', 0.0, 5.0).check(df).tolist() == [True, False, False, False, True, False]
+    assert range_rule('swe', high=0.0).check(df).tolist() == [False, False, True, True, True, False]
+
+def test_default_ranges():
+    df = _rows(prof_depth=[1.0, -0.5, 11.0], density=[300.0, 10.0, 950.0], mass=[300.0, -1.0, 5001.0])
+    for name in ('prof_depth_range', 'density_range', 'mass_range'):
+        assert RULES[name].check(df).tolist() == [False, True, True], name
+
+def test_swe_matches_depth_times_density():
+    # Expected 0.3, tolerance 0.005 + 0.05 * 0.3 = 0.02.
+    df = _rows(swe=[0.3, 0.31, 0.33, 0.25])
+    assert RULES['swe_depth_density'].check(df).tolist() == [False, False, True, True]
+
+def test_mass_matches_swe():
+    # Expected 300, tolerance 0.005 + 0.05 * 300 = 15.005.
+    df = _rows(mass=[300.0, 315.0, 316.0, 280.0])
+    assert RULES['mass_swe'].check(df).tolist() == [False, False, True, True]
+
+def test_location_codes_are_checked_within_each_site():
+    df = _rows(local_site=['A', 'A', 'B', 'B', 'A'], samp_loc=['p1', 'p1', 'p1', 'p1', 'p2'],
+               loc_code=['c1', 'c2', 'c3', 'c3', 'c9'])
+    assert LOCATION_RULE.check(df).tolist() == [True, True, False, False, False]
+
+def test_flag_bits_follow_rule_order():
+    rules = [range_rule('a', high=1.0), range_rule('b', high=1.0, reject=False), range_rule('c', high=1.0)]
+    df = pd.DataFrame({'a': [2.0, 0.0, 2.0, 0.0], 'b': [0.0, 2.0, 0.0, 0.0], 'c': [0.0, 0.0, 2.0, 0.0]})
+    flags = validate(df, rules)
+    assert flags.dtype == np.uint32
+    assert flags.tolist() == [0b001, 0b010, 0b101, 0]
+    assert flag_names(flags[2], rules) == ['a_range', 'c_range']
+    assert reject_mask(rules) == 0b101
+
+def test_filter_valid_splits_rows():
+    # Row 1 breaks a rejecting rule, row 2 only the warm pit warning.
+    df = _rows(swe=[0.3, 6.0, 0.3], wted_temp=[-2.0, -2.0, 1.0])
+    flags = validate(df)
+    kept, quarantined = filter_valid(df, flags)
+    assert kept['wted_temp'].tolist() == [-2.0, 1.0]
+    assert 'flags' not in kept.columns
+    assert len(quarantined) == 1
+    assert quarantined['flags'].tolist() == [flags[1]]
+    assert quarantined['failed'].iloc[0] == ','.join(flag_names(flags[1]))
+    assert 'swe_range' in quarantined['failed'].iloc[0].split(',')